@@ -0,0 +1,108 @@
+"""Сравнение профилей SQLite под конкурентной записью бронирований.
+
+Запуск из корня проекта:
+    python -m benchmarks.sqlite_profile --writers 8 --bookings 200
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from datetime import date, time as dtime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import select, func
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from config import SQLITE_PRAGMAS
+from database import Base, User, Auto, Booking, BookingStatus, create_db_engine
+
+PROFILES = {
+    "default": None,
+    "tuned": SQLITE_PRAGMAS,
+}
+
+async def _writer(session_factory, writer_id: int, bookings: int, latencies: list, errors: list):
+    """Создаёт записи по одной транзакции на бронирование, как это делают обработчики."""
+    for i in range(bookings):
+        started = time.perf_counter()
+        try:
+            async with session_factory() as session:
+                session.add(Booking(
+                    user_id=1, auto_id=1, service_name="Замена масла в двигателе", service_duration=60,
+                    date=date.today() + timedelta(days=(writer_id * bookings + i) % 30),
+                    time=dtime(hour=9 + i % 8), status=BookingStatus.PENDING
+                ))
+                await session.commit()
+            latencies.append(time.perf_counter() - started)
+        except OperationalError as e:
+            errors.append(str(e.orig))
+
+async def _sweeper(session_factory, stop: asyncio.Event, errors: list):
+    """Имитирует фоновое обновление статусов: чтение и запись параллельно с обработчиками."""
+    while not stop.is_set():
+        try:
+            async with session_factory() as session:
+                await session.scalar(select(func.count(Booking.id)).filter(Booking.status == BookingStatus.PENDING))
+                booking = await session.scalar(select(Booking).filter(Booking.status == BookingStatus.PENDING).limit(1))
+                if booking:
+                    booking.status = BookingStatus.CONFIRMED
+                await session.commit()
+        except OperationalError as e:
+            errors.append(str(e.orig))
+        await asyncio.sleep(0.01)
+
+async def run_profile(name: str, writers: int, bookings: int) -> dict:
+    """Прогоняет нагрузку на отдельной базе с указанным профилем."""
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_db_engine(
+            f"sqlite+aiosqlite:///{os.path.join(tmp, 'bench.db')}",
+            pragmas=PROFILES[name], pool_size=writers, max_overflow=0
+        )
+        session_factory = async_sessionmaker(engine, expire_on_commit=False)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with session_factory() as session:
+            session.add(User(id=1, telegram_id="1", first_name="Bench"))
+            session.add(Auto(id=1, user_id=1, brand="Bench", year=2020, vin="0" * 17, license_plate="A000AA00"))
+            await session.commit()
+
+        latencies, errors = [], []
+        stop = asyncio.Event()
+        sweeper = asyncio.create_task(_sweeper(session_factory, stop, errors))
+        started = time.perf_counter()
+        await asyncio.gather(*(_writer(session_factory, w, bookings, latencies, errors) for w in range(writers)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await sweeper
+        await engine.dispose()
+
+    latencies.sort()
+    return {
+        "profile": name,
+        "commits": len(latencies),
+        "errors": len(errors),
+        "seconds": elapsed,
+        "commits_per_sec": len(latencies) / elapsed if elapsed else 0,
+        "p50_ms": latencies[len(latencies) // 2] * 1000 if latencies else 0,
+        "p95_ms": latencies[int(len(latencies) * 0.95)] * 1000 if latencies else 0,
+    }
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--writers", type=int, default=8, help="число параллельных обработчиков")
+    parser.add_argument("--bookings", type=int, default=200, help="записей на одного обработчика")
+    parser.add_argument("--profile", choices=[*PROFILES, "all"], default="all")
+    args = parser.parse_args()
+
+    names = list(PROFILES) if args.profile == "all" else [args.profile]
+    print(f"{'профиль':<10}{'commits':>9}{'ошибок':>8}{'сек':>8}{'commit/s':>10}{'p50 мс':>9}{'p95 мс':>9}")
+    for name in names:
+        r = await run_profile(name, args.writers, args.bookings)
+        print(f"{r['profile']:<10}{r['commits']:>9}{r['errors']:>8}{r['seconds']:>8.2f}"
+              f"{r['commits_per_sec']:>10.1f}{r['p50_ms']:>9.2f}{r['p95_ms']:>9.2f}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
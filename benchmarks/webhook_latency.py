@@ -0,0 +1,187 @@
+"""Задержка ответа на нажатие кнопки: polling, вебхук с фоновой обработкой и вебхук с ответом в теле.
+
+Telegram заменён поддельной сессией: каждый вызов Bot API занимает --rtt-ms, доставка апдейта
+и ответа вебхука — по половине этого времени. Вебхук поднимается на локальном порту.
+
+Запуск из корня проекта:
+    python -m benchmarks.webhook_latency --updates 400 --concurrency 20 --rtt-ms 60
+"""
+import argparse
+import asyncio
+import datetime as dt
+import itertools
+import os
+import sys
+import time
+from typing import Dict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import aiohttp
+from aiohttp import web
+from aiogram import Bot, Dispatcher, Router, F
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import AnswerCallbackQuery, EditMessageText, GetMe, GetUpdates, SendMessage
+from aiogram.types import CallbackQuery, Chat, Message, Update, User
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler
+from webhook import WebhookRequestHandler, create_webhook_app
+from config import WEBHOOK_PATH, WEBHOOK_SECRET
+
+MODES = ("polling", "background", "inline")
+PORT = 8765
+
+class FakeTelegramSession(BaseSession):
+    """Bot API, который отвечает через rtt секунд и запоминает, когда пришёл ответ на каждый callback."""
+
+    def __init__(self, rtt: float):
+        super().__init__()
+        self.rtt = rtt
+        self.calls = 0
+        self.answered: Dict[str, float] = {}
+        self.updates: asyncio.Queue = asyncio.Queue()
+        self._message_ids = itertools.count(1)
+
+    async def make_request(self, bot, method, timeout=None):
+        if isinstance(method, GetUpdates):
+            return await self._get_updates(bot, method)
+        self.calls += 1
+        await asyncio.sleep(self.rtt)
+        if isinstance(method, AnswerCallbackQuery):
+            self.answered[method.callback_query_id] = time.perf_counter()
+        if isinstance(method, GetMe):
+            return User(id=42, is_bot=True, first_name="bench", username="bench_bot")
+        if isinstance(method, (SendMessage, EditMessageText)):
+            return Message(message_id=next(self._message_ids), date=dt.datetime.now(),
+                           chat=Chat(id=int(method.chat_id or 1), type="private"), text=method.text)
+        return True
+
+    async def _get_updates(self, bot, method):
+        """Long polling: ответ уходит, как только появился апдейт, и идёт до бота rtt/2."""
+        try:
+            first = await asyncio.wait_for(self.updates.get(), timeout=method.timeout or 1)
+        except asyncio.TimeoutError:
+            return []
+        batch = [first]
+        while not self.updates.empty() and len(batch) < (method.limit or 100):
+            batch.append(self.updates.get_nowait())
+        await asyncio.sleep(self.rtt / 2)
+        return [Update.model_validate(raw, context={"bot": bot}) for raw in batch]
+
+    async def stream_content(self, *args, **kwargs):
+        yield b""
+
+    async def close(self):
+        pass
+
+def create_dispatcher() -> Dispatcher:
+    """Обработчик как у кнопок бота: правит сообщение и отвечает на callback."""
+    router = Router()
+
+    @router.callback_query(F.data == "bench")
+    async def on_button(callback: CallbackQuery):
+        await callback.message.edit_text("Выбрано ✅")
+        await callback.answer()
+
+    dp = Dispatcher()
+    dp.include_router(router)
+    return dp
+
+def callback_update(update_id: int, user_id: int) -> dict:
+    return {
+        "update_id": update_id,
+        "callback_query": {
+            "id": f"cb{update_id}",
+            "chat_instance": "bench",
+            "data": "bench",
+            "from": {"id": user_id, "is_bot": False, "first_name": "Bench"},
+            "message": {"message_id": update_id, "date": int(time.time()), "text": "Выберите",
+                        "chat": {"id": user_id, "type": "private"}},
+        },
+    }
+
+async def run_mode(mode: str, updates: int, concurrency: int, rtt: float) -> dict:
+    session = FakeTelegramSession(rtt)
+    bot = Bot(token="42:BENCH", session=session)
+    dp = create_dispatcher()
+    runner = handler = polling = None
+    if mode == "polling":
+        polling = asyncio.create_task(dp.start_polling(bot, handle_signals=False, polling_timeout=1))
+    else:
+        if mode == "inline":
+            app, handler = create_webhook_app(dp, bot)
+        else:
+            handler = SimpleRequestHandler(dp, bot, handle_in_background=True, secret_token=WEBHOOK_SECRET)
+            app = web.Application()
+            handler.register(app, path=WEBHOOK_PATH)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", PORT).start()
+
+    sent: Dict[str, float] = {}
+    ids = itertools.count(1)
+    inline_answered: Dict[str, float] = {}
+
+    async def sender(client: aiohttp.ClientSession, worker: int):
+        for _ in range(updates // concurrency):
+            update_id = next(ids)
+            raw = callback_update(update_id, user_id=1000 + worker)
+            callback_id = raw["callback_query"]["id"]
+            sent[callback_id] = time.perf_counter()
+            if mode == "polling":
+                await session.updates.put(raw)
+                # Следующее нажатие пользователь делает после ответа на предыдущее
+                while callback_id not in session.answered:
+                    await asyncio.sleep(0.001)
+                continue
+            await asyncio.sleep(rtt / 2)
+            async with client.post(f"http://127.0.0.1:{PORT}{WEBHOOK_PATH}", json=raw,
+                                   headers={"X-Telegram-Bot-Api-Secret-Token": WEBHOOK_SECRET}) as response:
+                body = await response.read()
+            if b"answerCallbackQuery" in body and callback_id.encode() in body:
+                await asyncio.sleep(rtt / 2)
+                inline_answered[callback_id] = time.perf_counter()
+            while callback_id not in session.answered and callback_id not in inline_answered:
+                await asyncio.sleep(0.001)
+
+    started = time.perf_counter()
+    async with aiohttp.ClientSession() as client:
+        await asyncio.gather(*(sender(client, w) for w in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    if polling:
+        await dp.stop_polling()
+        await polling
+    if runner:
+        if isinstance(handler, WebhookRequestHandler):
+            await handler.drain()
+        await runner.cleanup()
+
+    answered = {**session.answered, **inline_answered}
+    latencies = sorted(answered[key] - sent[key] for key in sent if key in answered)
+    return {
+        "mode": mode,
+        "updates": len(sent),
+        "api_calls": session.calls,
+        "inline": len(inline_answered),
+        "seconds": elapsed,
+        "p50_ms": latencies[len(latencies) // 2] * 1000 if latencies else 0,
+        "p95_ms": latencies[int(len(latencies) * 0.95)] * 1000 if latencies else 0,
+    }
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--updates", type=int, default=400, help="нажатий кнопок всего")
+    parser.add_argument("--concurrency", type=int, default=20, help="пользователей одновременно")
+    parser.add_argument("--rtt-ms", type=float, default=60, help="время одного вызова Bot API")
+    parser.add_argument("--mode", choices=[*MODES, "all"], default="all")
+    args = parser.parse_args()
+
+    names = list(MODES) if args.mode == "all" else [args.mode]
+    print(f"{'режим':<12}{'апдейтов':>9}{'API':>7}{'в ответе':>10}{'сек':>8}{'p50 мс':>9}{'p95 мс':>9}")
+    for name in names:
+        r = await run_mode(name, args.updates, args.concurrency, args.rtt_ms / 1000)
+        print(f"{r['mode']:<12}{r['updates']:>9}{r['api_calls']:>7}{r['inline']:>10}{r['seconds']:>8.2f}"
+              f"{r['p50_ms']:>9.2f}{r['p95_ms']:>9.2f}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
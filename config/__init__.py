@@ -1,9 +1,38 @@
-from .settings import BOT_TOKEN, YANDEX_API_KEY, YANDEX_FOLDER_ID, ADMIN_ID, PHOTO_DIR, get_photo_path, UPLOAD_USER_DIR
+from .settings import (BOT_TOKEN, YANDEX_API_KEY, YANDEX_FOLDER_ID, ADMIN_ID, PHOTO_DIR, get_photo_path, UPLOAD_USER_DIR,
+                       BLOB_SPOOL_DIR, DATABASE_URL, SQLITE_PRAGMAS, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE,
+                       OUTBOUND_GLOBAL_RATE, OUTBOUND_CHAT_RATE, OUTBOUND_CHAT_BURST, OUTBOUND_GROUP_RATE_PER_MINUTE,
+                       OUTBOUND_MAX_RETRIES, HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT, HTTP_WRITE_TIMEOUT, HTTP_POOL_TIMEOUT,
+                       HTTP_MAX_CONNECTIONS, HTTP_MAX_KEEPALIVE_CONNECTIONS, HTTP_KEEPALIVE_EXPIRY, HTTP2_ENABLED,
+                       YANDEX_GPT_DEADLINE, YANDEX_VISION_DEADLINE, YANDEX_MAX_RETRIES, YANDEX_RETRY_BACKOFF,
+                       YANDEX_GPT_HEDGE_AFTER, YANDEX_VISION_HEDGE_AFTER, BREAKER_FAILURE_THRESHOLD,
+                       BREAKER_RESET_TIMEOUT, FSM_STORAGE, FSM_FLUSH_INTERVAL, FSM_REDIS_URL, FSM_STATE_TTL,
+                       FSM_LOCK_TIMEOUT, FSM_IDLE_MINUTES, FSM_IDLE_DEFAULT_MINUTES, BOT_MODE, WEBHOOK_URL,
+                       WEBHOOK_PATH, WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_SECRET, WEBHOOK_MAX_CONNECTIONS,
+                       WEBHOOK_REPLY_TIMEOUT, WEBHOOK_DRAIN_TIMEOUT)
 from .messages import MESSAGES, AI_PROMPT, AI_PROMPT_STR
-from .constants import WORKING_HOURS, REMINDER_TIME_MINUTES, SERVICES
+from .constants import (WORKING_HOURS, REMINDER_TIME_MINUTES, REMINDER_RESYNC_MINUTES, SERVICES, SLOT_STEP_MINUTES, SLOT_CACHE_TTL_SECONDS,
+                        VISION_MAX_CONCURRENCY,
+                        VISION_MAX_SIDE, VISION_JPEG_QUALITY, IMAGE_POOL_WORKERS, GPT_STREAM_EDIT_INTERVAL,
+                        BLOB_SPOOL_TTL_HOURS, DIAGNOSTIC_CACHE_TTL_HOURS, DIAGNOSTIC_CACHE_MAX_ROWS, DIAGNOSTIC_CACHE_MEMORY_SIZE,
+                        DIAGNOSTIC_PHASH_MAX_DISTANCE, DIAGNOSTIC_WORKERS, DIAGNOSTIC_PER_USER_LIMIT,
+                        DIAGNOSTIC_QUEUE_MAX_SIZE, STATE_REAPER_INTERVAL_MINUTES)
 
 __all__ = [
     'BOT_TOKEN', 'YANDEX_API_KEY', 'YANDEX_FOLDER_ID', 'ADMIN_ID', 'PHOTO_DIR', 'get_photo_path',
-    'MESSAGES', 'AI_PROMPT', 'AI_PROMPT_STR', 'UPLOAD_USER_DIR',
-    'WORKING_HOURS', 'REMINDER_TIME_MINUTES', 'SERVICES'
+    'MESSAGES', 'AI_PROMPT', 'AI_PROMPT_STR', 'UPLOAD_USER_DIR', 'BLOB_SPOOL_DIR',
+    'WORKING_HOURS', 'REMINDER_TIME_MINUTES', 'REMINDER_RESYNC_MINUTES', 'SERVICES', 'SLOT_STEP_MINUTES', 'SLOT_CACHE_TTL_SECONDS',
+    'VISION_MAX_CONCURRENCY',
+    'VISION_MAX_SIDE', 'VISION_JPEG_QUALITY', 'IMAGE_POOL_WORKERS', 'GPT_STREAM_EDIT_INTERVAL', 'BLOB_SPOOL_TTL_HOURS',
+    'DIAGNOSTIC_CACHE_TTL_HOURS', 'DIAGNOSTIC_CACHE_MAX_ROWS', 'DIAGNOSTIC_CACHE_MEMORY_SIZE', 'DIAGNOSTIC_PHASH_MAX_DISTANCE',
+    'DIAGNOSTIC_WORKERS', 'DIAGNOSTIC_PER_USER_LIMIT', 'DIAGNOSTIC_QUEUE_MAX_SIZE', 'STATE_REAPER_INTERVAL_MINUTES',
+    'DATABASE_URL', 'SQLITE_PRAGMAS', 'DB_POOL_SIZE', 'DB_MAX_OVERFLOW', 'DB_POOL_TIMEOUT', 'DB_POOL_RECYCLE',
+    'OUTBOUND_GLOBAL_RATE', 'OUTBOUND_CHAT_RATE', 'OUTBOUND_CHAT_BURST', 'OUTBOUND_GROUP_RATE_PER_MINUTE',
+    'OUTBOUND_MAX_RETRIES', 'HTTP_CONNECT_TIMEOUT', 'HTTP_READ_TIMEOUT', 'HTTP_WRITE_TIMEOUT', 'HTTP_POOL_TIMEOUT',
+    'HTTP_MAX_CONNECTIONS', 'HTTP_MAX_KEEPALIVE_CONNECTIONS', 'HTTP_KEEPALIVE_EXPIRY', 'HTTP2_ENABLED',
+    'YANDEX_GPT_DEADLINE', 'YANDEX_VISION_DEADLINE', 'YANDEX_MAX_RETRIES', 'YANDEX_RETRY_BACKOFF',
+    'YANDEX_GPT_HEDGE_AFTER', 'YANDEX_VISION_HEDGE_AFTER', 'BREAKER_FAILURE_THRESHOLD', 'BREAKER_RESET_TIMEOUT',
+    'FSM_STORAGE', 'FSM_FLUSH_INTERVAL', 'FSM_REDIS_URL', 'FSM_STATE_TTL', 'FSM_LOCK_TIMEOUT',
+    'FSM_IDLE_MINUTES', 'FSM_IDLE_DEFAULT_MINUTES',
+    'BOT_MODE', 'WEBHOOK_URL', 'WEBHOOK_PATH', 'WEBHOOK_HOST', 'WEBHOOK_PORT', 'WEBHOOK_SECRET',
+    'WEBHOOK_MAX_CONNECTIONS', 'WEBHOOK_REPLY_TIMEOUT', 'WEBHOOK_DRAIN_TIMEOUT'
 ]
\ No newline at end of file
@@ -5,6 +5,34 @@ WORKING_HOURS = {
 }
 
 REMINDER_TIME_MINUTES = 60
+REMINDER_RESYNC_MINUTES = 5  # Как часто сверять очередь напоминаний с БД
+
+# Шаг сетки слотов записи, минут
+SLOT_STEP_MINUTES = 30
+# Сколько живёт кэш свободных слотов недели: другие процессы бота его не сбрасывают
+SLOT_CACHE_TTL_SECONDS = 60
+
+# Сколько изображений диагностики распознаётся Yandex Vision одновременно
+VISION_MAX_CONCURRENCY = 4
+# Подготовка фото перед распознаванием: длинная сторона и качество JPEG, достаточные для OCR
+VISION_MAX_SIDE = 1600
+VISION_JPEG_QUALITY = 85
+IMAGE_POOL_WORKERS = 2  # Потоков для обработки изображений
+BLOB_SPOOL_TTL_HOURS = 6  # Сколько хранятся загруженные для диагностики фото
+STATE_REAPER_INTERVAL_MINUTES = 10  # Как часто искать брошенные диалоги
+# Как часто (секунд) обновлять сообщение с ответом GPT во время генерации
+GPT_STREAM_EDIT_INTERVAL = 1.5
+
+# Кэш результатов диагностики
+DIAGNOSTIC_CACHE_TTL_HOURS = 24 * 7  # Срок жизни результата
+DIAGNOSTIC_CACHE_MAX_ROWS = 5000  # Сколько результатов хранится в БД
+DIAGNOSTIC_CACHE_MEMORY_SIZE = 256  # Сколько результатов держится в памяти
+DIAGNOSTIC_PHASH_MAX_DISTANCE = 6  # Порог расстояния Хэмминга (из 64 бит) для «того же» фото
+
+# Очередь диагностик
+DIAGNOSTIC_WORKERS = 3  # Сколько диагностик выполняется одновременно
+DIAGNOSTIC_PER_USER_LIMIT = 1  # Сколько незавершённых диагностик может быть у пользователя
+DIAGNOSTIC_QUEUE_MAX_SIZE = 100  # Сколько заданий может ждать в очереди
 
 SERVICES = [
     {"name": "Диагностика электроники", "duration_minutes": 60, "price": 1500},
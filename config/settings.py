@@ -1,3 +1,4 @@
+import hashlib
 import os
 from dotenv import load_dotenv
 
@@ -8,7 +9,75 @@ YANDEX_API_KEY = os.getenv("YANDEX_API_KEY")
 YANDEX_FOLDER_ID = os.getenv("YANDEX_FOLDER_ID")
 ADMIN_ID = os.getenv("ADMIN_ID")
 PHOTO_DIR = "photos"
+
+# База данных
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///RemDiesel.db")
+# PRAGMA, выполняемые на каждом новом соединении SQLite
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(128 * 1024 * 1024))),
+    "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", "-32000")),  # Отрицательное значение — размер в КиБ
+    "temp_store": os.getenv("SQLITE_TEMP_STORE", "MEMORY"),
+}
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "5"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "3600"))
+# Лимиты исходящих сообщений Telegram
+OUTBOUND_GLOBAL_RATE = float(os.getenv("OUTBOUND_GLOBAL_RATE", "30"))  # Сообщений в секунду на бота
+OUTBOUND_CHAT_RATE = float(os.getenv("OUTBOUND_CHAT_RATE", "1"))  # Сообщений в секунду в личный чат
+OUTBOUND_CHAT_BURST = float(os.getenv("OUTBOUND_CHAT_BURST", "1"))  # Сообщений подряд в личный чат без паузы
+OUTBOUND_GROUP_RATE_PER_MINUTE = float(os.getenv("OUTBOUND_GROUP_RATE_PER_MINUTE", "20"))
+OUTBOUND_MAX_RETRIES = int(os.getenv("OUTBOUND_MAX_RETRIES", "3"))  # Повторов после retry_after
+# HTTP-клиент для Yandex API
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "30"))
+HTTP_WRITE_TIMEOUT = float(os.getenv("HTTP_WRITE_TIMEOUT", "30"))
+HTTP_POOL_TIMEOUT = float(os.getenv("HTTP_POOL_TIMEOUT", "5"))  # Ожидание свободного соединения из пула
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "20"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "10"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "1") == "1"  # Работает при установленном пакете h2
+# Сроки, повторы и предохранитель для Yandex API
+YANDEX_GPT_DEADLINE = float(os.getenv("YANDEX_GPT_DEADLINE", "45"))  # Секунд на запрос вместе с повторами
+YANDEX_VISION_DEADLINE = float(os.getenv("YANDEX_VISION_DEADLINE", "20"))
+YANDEX_MAX_RETRIES = int(os.getenv("YANDEX_MAX_RETRIES", "2"))  # Повторов после 429/5xx и сетевых ошибок
+YANDEX_RETRY_BACKOFF = float(os.getenv("YANDEX_RETRY_BACKOFF", "0.5"))  # Базовая пауза, удваивается с каждым повтором
+# Через сколько секунд без ответа отправлять копию запроса (0 — не отправлять)
+YANDEX_GPT_HEDGE_AFTER = float(os.getenv("YANDEX_GPT_HEDGE_AFTER", "0"))
+YANDEX_VISION_HEDGE_AFTER = float(os.getenv("YANDEX_VISION_HEDGE_AFTER", "0"))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))  # Ошибок подряд до размыкания
+BREAKER_RESET_TIMEOUT = float(os.getenv("BREAKER_RESET_TIMEOUT", "30"))  # Секунд до пробного запроса
+# Хранилище состояний FSM: sqlite (переживает перезапуск), redis или memory
+FSM_STORAGE = os.getenv("FSM_STORAGE", "sqlite")
+FSM_FLUSH_INTERVAL = float(os.getenv("FSM_FLUSH_INTERVAL", "1"))  # Секунд между записями изменённых состояний
+# FSM_STORAGE=redis: общее хранилище для нескольких процессов бота (нужен пакет redis)
+FSM_REDIS_URL = os.getenv("FSM_REDIS_URL", "redis://localhost:6379/0")
+FSM_STATE_TTL = int(os.getenv("FSM_STATE_TTL", str(24 * 3600)))  # Секунд до удаления брошенного диалога (0 — не удалять)
+FSM_LOCK_TIMEOUT = int(os.getenv("FSM_LOCK_TIMEOUT", "60"))  # Максимальное время блокировки апдейтов одного пользователя
+# Минут бездействия, после которых брошенный диалог очищается (0 — не очищать); для sqlite и memory
+FSM_IDLE_MINUTES = {
+    "ProfileStates": int(os.getenv("FSM_IDLE_PROFILE_MINUTES", "180")),
+    "DiagnosticStates": int(os.getenv("FSM_IDLE_DIAGNOSTIC_MINUTES", "60")),
+    "ServiceBookingStates": int(os.getenv("FSM_IDLE_BOOKING_MINUTES", str(24 * 60))),
+    "RepairBookingStates": int(os.getenv("FSM_IDLE_BOOKING_MINUTES", str(24 * 60))),
+}
+FSM_IDLE_DEFAULT_MINUTES = int(os.getenv("FSM_IDLE_DEFAULT_MINUTES", str(24 * 60)))  # Остальные состояния
+# Приём апдейтов: polling или webhook (встроенный HTTP-сервер aiohttp)
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")  # Публичный адрес, например https://bot.example.com; без него не регистрируется
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+# Значение заголовка X-Telegram-Bot-Api-Secret-Token; по умолчанию одно и то же для всех процессов с этим токеном
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET") or hashlib.sha256(f"webhook:{BOT_TOKEN}".encode()).hexdigest()
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))  # Параллельных запросов от Telegram
+WEBHOOK_REPLY_TIMEOUT = float(os.getenv("WEBHOOK_REPLY_TIMEOUT", "1"))  # Сколько ждать ответа на callback для тела ответа
+WEBHOOK_DRAIN_TIMEOUT = float(os.getenv("WEBHOOK_DRAIN_TIMEOUT", "30"))  # Сколько ждать принятые апдейты при остановке
 UPLOAD_USER_DIR = "media/user_images"
+BLOB_SPOOL_DIR = os.getenv("BLOB_SPOOL_DIR", "media/spool")  # Временные фото диагностики
 
 # Создаем директорию, если она не существует
 if not os.path.exists(PHOTO_DIR):
@@ -1,7 +1,12 @@
-from datetime import datetime
-from sqlalchemy import Column, Integer, String, ForeignKey, Date, Time, Enum, create_engine, Text, Float
+from datetime import datetime, timedelta
+from sqlalchemy import (Column, Integer, String, ForeignKey, Date, Time, DateTime, Enum, Text, Float, Index,
+                        UniqueConstraint, event, inspect, select, update, bindparam)
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncEngine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.orm import relationship
+from config import (SERVICES, DATABASE_URL, SQLITE_PRAGMAS, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT,
+                    DB_POOL_RECYCLE)
 import enum
 
 Base = declarative_base()
@@ -51,12 +56,53 @@ class Booking(Base):
     service_duration = Column(Integer, nullable=True)  # Добавлено
     date = Column(Date, nullable=False)
     time = Column(Time, nullable=False)
+    end_at = Column(DateTime, nullable=True)  # Время окончания работ, заполняется автоматически
     status = Column(Enum(BookingStatus), default=BookingStatus.PENDING, nullable=False)
     rejection_reason = Column(String, nullable=True)
     user = relationship("User", back_populates="bookings")
     auto = relationship("Auto", back_populates="bookings")
     review = relationship("Review", back_populates="booking", uselist=False)
 
+    __table_args__ = (
+        Index("ix_bookings_date_status", "date", "status"),
+        Index("ix_bookings_user_id_status", "user_id", "status"),
+        Index("ix_bookings_status_end_at", "status", "end_at"),
+    )
+
+class Reminder(Base):
+    __tablename__ = "reminders"
+    id = Column(Integer, primary_key=True)
+    booking_id = Column(Integer, ForeignKey("bookings.id"), nullable=False)
+    recipient = Column(String, nullable=False)  # chat_id получателя
+    kind = Column(String, nullable=False)  # "master" или "user"
+    send_at = Column(DateTime, nullable=False)  # Время отправки (MSK)
+    sent_at = Column(DateTime, nullable=True)  # Заполняется, когда напоминание обработано
+    booking = relationship("Booking")
+
+    __table_args__ = (
+        UniqueConstraint("booking_id", "recipient", "kind", name="uq_reminders_booking_recipient_kind"),
+        Index("ix_reminders_sent_at_send_at", "sent_at", "send_at"),
+    )
+
+def get_booking_duration(service_name: str, service_duration: int = None) -> int:
+    """Возвращает длительность записи в минутах (по умолчанию 60 минут для "Ремонт")."""
+    if service_duration:
+        return service_duration
+    service = next((s for s in SERVICES if s["name"] == service_name), None)
+    return service["duration_minutes"] if service else 60
+
+def calculate_end_at(booking_date, booking_time, service_name: str, service_duration: int = None) -> datetime:
+    """Вычисляет время окончания записи."""
+    duration = get_booking_duration(service_name, service_duration)
+    return datetime.combine(booking_date, booking_time) + timedelta(minutes=duration)
+
+@event.listens_for(Booking, "before_insert")
+@event.listens_for(Booking, "before_update")
+def _set_booking_end_at(mapper, connection, target: Booking):
+    """Пересчитывает end_at при создании и изменении записи."""
+    if target.date and target.time:
+        target.end_at = calculate_end_at(target.date, target.time, target.service_name, target.service_duration)
+
 class Review(Base):
     __tablename__ = "reviews"
     id = Column(Integer, primary_key=True)
@@ -72,9 +118,100 @@ class Review(Base):
     user = relationship("User", back_populates="reviews")
     booking = relationship("Booking", back_populates="review")
 
-engine = create_engine("sqlite:///RemDiesel.db")
-Base.metadata.create_all(engine)
-Session = sessionmaker(bind=engine)
+class DiagnosticCacheEntry(Base):
+    __tablename__ = "diagnostic_cache"
+    key = Column(String, primary_key=True)  # "img:<md5 изображения>" или "txt:<sha256 описания>"
+    result = Column(Text, nullable=False)
+    phash = Column(String(16), nullable=True)  # dHash изображения (hex) для поиска похожих фото
+    created_at = Column(DateTime, nullable=False, default=datetime.now)
+
+    __table_args__ = (
+        Index("ix_diagnostic_cache_created_at", "created_at"),
+    )
+
+class TelegramFile(Base):
+    __tablename__ = "telegram_files"
+    path = Column(String, primary_key=True)  # Путь к файлу относительно корня проекта
+    fingerprint = Column(String, nullable=False)  # SHA-1 содержимого на момент загрузки
+    file_id = Column(String, nullable=False)  # file_id, выданный Telegram после первой загрузки
+    updated_at = Column(DateTime, nullable=False, default=datetime.now)
+
+class FSMRecord(Base):
+    __tablename__ = "fsm_states"
+    key = Column(String, primary_key=True)  # Ключ StorageKey в виде строки
+    state = Column(String, nullable=True)
+    data = Column(Text, nullable=False, default="{}")  # JSON данных состояния
+    updated_at = Column(DateTime, nullable=False, default=datetime.now)
+
+def create_db_engine(
+    url: str = DATABASE_URL,
+    pragmas: dict = None,
+    pool_size: int = DB_POOL_SIZE,
+    max_overflow: int = DB_MAX_OVERFLOW,
+    pool_timeout: int = DB_POOL_TIMEOUT,
+    pool_recycle: int = DB_POOL_RECYCLE
+) -> AsyncEngine:
+    """Создаёт движок БД; для SQLite на каждом соединении выполняются PRAGMA из профиля."""
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "sqlite" and (
+        parsed.database in (None, "", ":memory:") or parsed.query.get("mode") == "memory"
+    ):
+        # База в памяти использует StaticPool, который не принимает параметры пула
+        engine = create_async_engine(url)
+    else:
+        engine = create_async_engine(
+            url,
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_timeout=pool_timeout,
+            pool_recycle=pool_recycle
+        )
+    if engine.dialect.name == "sqlite" and pragmas:
+        @event.listens_for(engine.sync_engine, "connect")
+        def _set_sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+            cursor.close()
+    return engine
+
+async_engine = create_db_engine(pragmas=SQLITE_PRAGMAS)
+# expire_on_commit=False: объекты остаются доступны после commit без повторного запроса к БД
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
+
+def _upgrade_schema(conn):
+    """Добавляет в существующие таблицы недостающие столбцы и индексы без потери данных."""
+    inspector = inspect(conn)
+    for table in Base.metadata.sorted_tables:
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                column_type = column.type.compile(dialect=conn.dialect)
+                conn.exec_driver_sql(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}')
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+    # Заполняем end_at для записей, созданных до появления столбца
+    bookings = Booking.__table__
+    rows = conn.execute(
+        select(bookings.c.id, bookings.c.date, bookings.c.time, bookings.c.service_name, bookings.c.service_duration)
+        .where(bookings.c.end_at.is_(None))
+    ).all()
+    if rows:
+        conn.execute(
+            update(bookings).where(bookings.c.id == bindparam("booking_id")),
+            [
+                {"booking_id": row.id, "end_at": calculate_end_at(row.date, row.time, row.service_name, row.service_duration)}
+                for row in rows
+            ]
+        )
+
+async def init_db():
+    """Создаёт таблицы базы данных, если их нет, и обновляет схему существующей."""
+    async with async_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(_upgrade_schema)
 
-def init_db():
-    Base.metadata.create_all(engine)
\ No newline at end of file
+async def close_db():
+    """Закрывает соединения с базой данных."""
+    await async_engine.dispose()
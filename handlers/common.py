@@ -1,6 +1,6 @@
 from aiogram import Router, F
 from aiogram.filters import Command
-from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, FSInputFile
+from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton, FSInputFile
 from config import get_photo_path, MESSAGES
 from keyboards.main_kb import Keyboards
 from utils.service_utils import send_message, setup_logger
@@ -90,4 +90,9 @@ async def cmd_about_master(message: Message):
                 [InlineKeyboardButton(text="⬅ Назад в меню", callback_data="back_to_main")]
             ]
         )
-    )
\ No newline at end of file
+    )
+
+@common_router.callback_query(F.data.startswith("full_"))
+async def full_day_selected(callback: CallbackQuery):
+    """Сообщает, что на выбранный день нет свободного времени."""
+    await callback.answer("На этот день свободного времени нет. Выберите другую дату. 📅", show_alert=True)
@@ -1,13 +1,18 @@
 from aiogram import Router, F, Bot
-from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery, FSInputFile
+from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-import hashlib
+import asyncio
 import os
-from PIL import Image
-from io import BytesIO
+from typing import List, Optional
 from config import get_photo_path
 from utils import setup_logger, analyze_text_description, analyze_images, delete_previous_message
+from utils.media_cache import media_cache
+from utils.blob_spool import blob_spool, BlobMissingError
+from utils.diagnostic_queue import diagnostic_queue, DiagnosticQueueError
+from utils.image_pipeline import image_pipeline, InvalidImageError
+from utils.progressive_message import ProgressiveMessage
+from utils.resilience import UpstreamUnavailable
 from keyboards.main_kb import Keyboards
 
 photo_diagnostic_router = Router()
@@ -34,39 +39,6 @@ def validate_photo_size(photo) -> bool:
     """Проверяет минимальное разрешение фото (640x480)."""
     return photo.width >= 640 and photo.height >= 480
 
-def validate_photo_format(image_data: bytes) -> bool:
-    """Проверяет формат изображения (JPEG/PNG)."""
-    try:
-        img = Image.open(BytesIO(image_data))
-        return img.format in ["JPEG", "PNG"]
-    except:
-        return False
-
-def get_image_hash(image_data: bytes) -> str:
-    """Вычисляет MD5-хеш изображения."""
-    return hashlib.md5(image_data).hexdigest()
-
-async def get_cached_result(image_hash: str) -> str:
-    """Проверяет кэш в файле."""
-    cache_file = os.path.join(MEDIA_DIR, "cache.txt")
-    try:
-        with open(cache_file, "r", encoding="utf-8") as f:
-            for line in f:
-                if line.startswith(image_hash):
-                    return line.split(":", 1)[1].strip()
-    except:
-        return None
-    return None
-
-async def cache_result(image_hash: str, result: str):
-    """Сохраняет результат в кэш."""
-    cache_file = os.path.join(MEDIA_DIR, "cache.txt")
-    try:
-        with open(cache_file, "a", encoding="utf-8") as f:
-            f.write(f"{image_hash}:{result}\n")
-    except Exception as e:
-        logger.error(f"Ошибка кэширования: {str(e)}")
-
 @photo_diagnostic_router.message(F.text == "Быстрый ответ - Диагностика по фото")
 async def start_diagnostic(message: Message, state: FSMContext, bot: Bot):
     """Запускает процесс диагностики, предлагая выбор варианта."""
@@ -75,10 +47,11 @@ async def start_diagnostic(message: Message, state: FSMContext, bot: Bot):
         await delete_previous_message(bot, message.chat.id, (await state.get_data()).get("last_message_id"))
         photo_path = get_photo_path("photo_diagnostic")
         sent_message = await message.answer_photo(
-            photo=FSInputFile(photo_path),
+            photo=media_cache.input_file(photo_path),
             caption="Выберите способ диагностики:",
             reply_markup=Keyboards.diagnostic_choice_kb()
         )
+        media_cache.remember(photo_path, sent_message)
         await state.update_data(last_message_id=sent_message.message_id)
     except (FileNotFoundError, ValueError) as e:
         logger.error(f"Ошибка загрузки фото для диагностики: {str(e)}")
@@ -114,7 +87,7 @@ async def handle_diagnostic_choice(callback: CallbackQuery, state: FSMContext, b
             )
             await state.update_data(last_message_id=sent_message.message_id)
             await state.set_state(DiagnosticStates.AwaitingPhoto)
-            await state.update_data(photos=[])
+            await state.update_data(photo_refs=[], photo_hashes=[])
         await callback.answer()
     except Exception as e:
         logger.error(f"Ошибка обработки callback {callback.data}: {str(e)}")
@@ -124,6 +97,102 @@ async def handle_diagnostic_choice(callback: CallbackQuery, state: FSMContext, b
         await state.clear()
         await callback.answer()
 
+async def _send_diagnostic_result(message: Message, state: FSMContext, bot: Bot, analysis: str, description: str):
+    """Отправляет карточку с результатом диагностики."""
+    text = (
+        f"🔧 Диагностика:\n"
+        f"Анализ:\n{analysis}\n"
+        f"Описание проблемы: {description}\n\n"
+        "📋 Рекомендуется очный осмотр для подтверждения."
+    )
+    try:
+        await delete_previous_message(bot, message.chat.id, (await state.get_data()).get("last_message_id"))
+        photo_path = get_photo_path("photo_result_diagnostic")
+        sent_message = await message.answer_photo(
+            photo=media_cache.input_file(photo_path),
+            caption=text,
+            reply_markup=Keyboards.main_menu_kb()
+        )
+        media_cache.remember(photo_path, sent_message)
+        await state.update_data(last_message_id=sent_message.message_id)
+    except (FileNotFoundError, ValueError) as e:
+        logger.error(f"Ошибка отправки фото результата: {str(e)}")
+        await delete_previous_message(bot, message.chat.id, (await state.get_data()).get("last_message_id"))
+        sent_message = await message.answer(text, reply_markup=Keyboards.main_menu_kb())
+        await state.update_data(last_message_id=sent_message.message_id)
+
+async def _run_diagnostic(message: Message, state: FSMContext, bot: Bot, description: str,
+                          photo_refs: List[str], photo_hashes: List[Optional[int]]):
+    """Задание очереди: анализ фото и/или описания и отправка результата."""
+    try:
+        await delete_previous_message(bot, message.chat.id, (await state.get_data()).get("last_message_id"))
+        if photo_refs:
+            logger.info(f"Processing {len(photo_refs)} photos with description: {description[:50]}... for user {message.from_user.id}")
+            # Байты фото читаются из спула только на время анализа
+            photos = await blob_spool.get_many(photo_refs)
+            progress = await ProgressiveMessage.send(bot, message.chat.id, "🔧 Диагностика:", "Распознаю фото… ⏳")
+            await state.update_data(last_message_id=progress.message_id)
+            analysis = await analyze_images(photos, description, on_partial=progress.update, phashes=photo_hashes)
+        else:
+            logger.info(f"Processing description without photos: {description[:50]}... for user {message.from_user.id}")
+            progress = await ProgressiveMessage.send(bot, message.chat.id, "🔧 Диагностика:", "Анализирую описание… ⏳")
+            await state.update_data(last_message_id=progress.message_id)
+            analysis = await analyze_text_description(description, on_partial=progress.update)
+        await _send_diagnostic_result(message, state, bot, analysis, description)
+    except BlobMissingError:
+        logger.warning(f"Фото пользователя {message.from_user.id} удалены из спула до анализа")
+        await delete_previous_message(bot, message.chat.id, (await state.get_data()).get("last_message_id"))
+        sent_message = await message.answer(
+            "Загруженные фото устарели. Начните диагностику заново и отправьте их ещё раз. 📸",
+            reply_markup=Keyboards.main_menu_kb()
+        )
+        await state.update_data(last_message_id=sent_message.message_id)
+    except UpstreamUnavailable as e:
+        logger.warning(f"Диагностика для пользователя {message.from_user.id} недоступна: {str(e)}")
+        await delete_previous_message(bot, message.chat.id, (await state.get_data()).get("last_message_id"))
+        sent_message = await message.answer(
+            "😔 Сервис диагностики сейчас недоступен. Попробуйте через несколько минут "
+            "или запишитесь на очный осмотр.",
+            reply_markup=Keyboards.main_menu_kb()
+        )
+        await state.update_data(last_message_id=sent_message.message_id)
+        raise
+    except Exception as e:
+        logger.error(f"Ошибка диагностики для пользователя {message.from_user.id}: {str(e)}")
+        await delete_previous_message(bot, message.chat.id, (await state.get_data()).get("last_message_id"))
+        sent_message = await message.answer("Ошибка. Начните диагностику заново.", reply_markup=Keyboards.main_menu_kb())
+        await state.update_data(last_message_id=sent_message.message_id)
+        raise
+
+async def _enqueue_diagnostic(message: Message, state: FSMContext, bot: Bot, description: str,
+                              photo_refs: Optional[List[str]] = None, photo_hashes: Optional[List[Optional[int]]] = None):
+    """Ставит диагностику в очередь и сразу сообщает пользователю его место."""
+    await state.clear()
+    logger.debug(f"Cleared state for user {message.from_user.id}")
+    acknowledged = asyncio.Event()
+
+    async def job():
+        # Сообщение о постановке в очередь должно уйти раньше, чем заглушка с ответом
+        await acknowledged.wait()
+        await _run_diagnostic(message, state, bot, description, photo_refs or [], photo_hashes or [])
+
+    try:
+        await delete_previous_message(bot, message.chat.id, (await state.get_data()).get("last_message_id"))
+        try:
+            position = diagnostic_queue.submit(message.from_user.id, job)
+        except DiagnosticQueueError as e:
+            sent_message = await message.answer(str(e), reply_markup=Keyboards.main_menu_kb())
+            await state.update_data(last_message_id=sent_message.message_id)
+            return
+        status = f"Место в очереди: {position}." if position else "Начинаю анализ."
+        sent_message = await message.answer(
+            f"⏳ Запрос на диагностику принят. {status}\nРезультат придёт в этот чат.",
+            reply_markup=Keyboards.main_menu_kb()
+        )
+        await state.update_data(last_message_id=sent_message.message_id)
+    finally:
+        acknowledged.set()
+
 @photo_diagnostic_router.message(DiagnosticStates.AwaitingTextDescription, F.text)
 async def handle_text_description(message: Message, state: FSMContext, bot: Bot):
     """Обрабатывает текстовое описание проблемы."""
@@ -134,33 +203,8 @@ async def handle_text_description(message: Message, state: FSMContext, bot: Bot)
             sent_message = await message.answer("Описание слишком короткое. Пожалуйста, опишите подробнее.", reply_markup=Keyboards.main_menu_kb())
             await state.update_data(last_message_id=sent_message.message_id)
             return
-        logger.info(f"Processing text description: {description[:50]}... for user {message.from_user.id}")
-        analysis = await analyze_text_description(description)
-        try:
-            await delete_previous_message(bot, message.chat.id, (await state.get_data()).get("last_message_id"))
-            photo_path = get_photo_path("photo_result_diagnostic")
-            sent_message = await message.answer_photo(
-                photo=FSInputFile(photo_path),
-                caption=f"🔧 Диагностика:\n"
-                        f"Анализ:\n{analysis}\n"
-                        f"Описание проблемы: {description}\n\n"
-                        "📋 Рекомендуется очный осмотр для подтверждения.",
-                reply_markup=Keyboards.main_menu_kb()
-            )
-            await state.update_data(last_message_id=sent_message.message_id)
-        except (FileNotFoundError, ValueError) as e:
-            logger.error(f"Ошибка отправки фото результата: {str(e)}")
-            await delete_previous_message(bot, message.chat.id, (await state.get_data()).get("last_message_id"))
-            sent_message = await message.answer(
-                f"🔧 Диагностика:\n"
-                f"Анализ:\n{analysis}\n"
-                f"Описание проблемы: {description}\n\n"
-                "📋 Рекомендуется очный осмотр для подтверждения.",
-                reply_markup=Keyboards.main_menu_kb()
-            )
-            await state.update_data(last_message_id=sent_message.message_id)
-        await state.clear()
-        logger.debug(f"Cleared state for user {message.from_user.id}")
+        logger.info(f"Queueing text description: {description[:50]}... for user {message.from_user.id}")
+        await _enqueue_diagnostic(message, state, bot, description)
     except Exception as e:
         logger.error(f"Ошибка обработки текстового описания: {str(e)}")
         await delete_previous_message(bot, message.chat.id, (await state.get_data()).get("last_message_id"))
@@ -188,16 +232,22 @@ async def handle_photo(message: Message, state: FSMContext, bot: Bot):
         photo_bytes = await message.bot.download_file(file.file_path)
         image_data = photo_bytes.read()
 
-        if not validate_photo_format(image_data):
+        try:
+            prepared = await image_pipeline.prepare(image_data)
+        except InvalidImageError:
             await delete_previous_message(bot, message.chat.id, (await state.get_data()).get("last_message_id"))
             sent_message = await message.answer("Ошибка: поддерживаются только JPEG и PNG.", reply_markup=Keyboards.main_menu_kb())
             await state.update_data(last_message_id=sent_message.message_id)
             return
 
+        # Уменьшенная копия уходит в спул, в состоянии остаётся только ссылка на неё
+        ref = await blob_spool.put(prepared.data)
         data = await state.get_data()
-        photos = data.get("photos", [])
-        photos.append(image_data)
-        await state.update_data(photos=photos)
+        photos = data.get("photo_refs", [])
+        photo_hashes = data.get("photo_hashes", [])
+        photos.append(ref)
+        photo_hashes.append(prepared.phash)
+        await state.update_data(photo_refs=photos, photo_hashes=photo_hashes)
 
         logger.debug(f"Photo uploaded, total: {len(photos)} for user {message.from_user.id}")
         if len(photos) < 3:
@@ -232,8 +282,8 @@ async def handle_photo(message: Message, state: FSMContext, bot: Bot):
 async def process_photos(callback: CallbackQuery, state: FSMContext, bot: Bot):
     """Обрабатывает все загруженные фото и запрашивает описание."""
     data = await state.get_data()
-    photos = data.get("photos", [])
-    if not photos:
+    photo_refs = data.get("photo_refs", [])
+    if not photo_refs:
         await delete_previous_message(bot, callback.message.chat.id, (await state.get_data()).get("last_message_id"))
         sent_message = await callback.message.answer("Фото не загружены. Отправьте фото снова.", reply_markup=Keyboards.main_menu_kb())
         await state.update_data(last_message_id=sent_message.message_id)
@@ -242,18 +292,6 @@ async def process_photos(callback: CallbackQuery, state: FSMContext, bot: Bot):
         return
 
     try:
-        image_hashes = [get_image_hash(photo) for photo in photos]
-        cached_results = []
-        for image_hash in image_hashes:
-            cached = await get_cached_result(image_hash)
-            if cached:
-                cached_results.append(cached)
-        if len(cached_results) == len(photos):
-            analysis = "\n".join(cached_results)
-            await state.update_data(analysis=analysis)
-        else:
-            await state.update_data(photos=photos)
-
         await delete_previous_message(bot, callback.message.chat.id, (await state.get_data()).get("last_message_id"))
         sent_message = await callback.message.answer(
             "Опишите проблему с автомобилем текстом (например, 'горит чек, код P0420').",
@@ -271,7 +309,7 @@ async def process_photos(callback: CallbackQuery, state: FSMContext, bot: Bot):
         await state.clear()
         await callback.answer()
     finally:
-        for i in range(len(photos)):
+        for i in range(len(photo_refs)):
             file_path = os.path.join(MEDIA_DIR, f"{callback.from_user.id}_{i}.jpg")
             if os.path.exists(file_path):
                 os.remove(file_path)
@@ -287,41 +325,9 @@ async def handle_photo_description(message: Message, state: FSMContext, bot: Bot
             await state.update_data(last_message_id=sent_message.message_id)
             return
         data = await state.get_data()
-        photos = data.get("photos", [])
-        if photos:
-            logger.info(f"Processing {len(photos)} photos with description: {description[:50]}... for user {message.from_user.id}")
-            analysis = await analyze_images(photos, description)
-            image_hashes = [get_image_hash(photo) for photo in photos]
-            for image_hash in image_hashes:
-                await cache_result(image_hash, analysis)
-        else:
-            logger.info(f"Processing description without photos: {description[:50]}... for user {message.from_user.id}")
-            analysis = await analyze_text_description(description)
-        try:
-            await delete_previous_message(bot, message.chat.id, (await state.get_data()).get("last_message_id"))
-            photo_path = get_photo_path("photo_result_diagnostic")
-            sent_message = await message.answer_photo(
-                photo=FSInputFile(photo_path),
-                caption=f"🔧 Диагностика:\n"
-                        f"Анализ:\n{analysis}\n"
-                        f"Описание проблемы: {description}\n\n"
-                        "📋 Рекомендуется очный осмотр для подтверждения.",
-                reply_markup=Keyboards.main_menu_kb()
-            )
-            await state.update_data(last_message_id=sent_message.message_id)
-        except (FileNotFoundError, ValueError) as e:
-            logger.error(f"Ошибка отправки фото результата: {str(e)}")
-            await delete_previous_message(bot, message.chat.id, (await state.get_data()).get("last_message_id"))
-            sent_message = await message.answer(
-                f"🔧 Диагностика:\n"
-                f"Анализ:\n{analysis}\n"
-                f"Описание проблемы: {description}\n\n"
-                "📋 Рекомендуется очный осмотр для подтверждения.",
-                reply_markup=Keyboards.main_menu_kb()
-            )
-            await state.update_data(last_message_id=sent_message.message_id)
-        await state.clear()
-        logger.debug(f"Cleared state for user {message.from_user.id}")
+        photo_refs = data.get("photo_refs", [])
+        logger.info(f"Queueing diagnostic with {len(photo_refs)} photos: {description[:50]}... for user {message.from_user.id}")
+        await _enqueue_diagnostic(message, state, bot, description, photo_refs, data.get("photo_hashes"))
     except Exception as e:
         logger.error(f"Ошибка обработки описания: {str(e)}")
         await delete_previous_message(bot, message.chat.id, (await state.get_data()).get("last_message_id"))
@@ -333,7 +339,7 @@ async def handle_photo_description(message: Message, state: FSMContext, bot: Bot
 async def invalid_photo_input(message: Message, state: FSMContext, bot: Bot):
     """Обрабатывает некорректный ввод в состоянии ожидания фото."""
     data = await state.get_data()
-    photos = data.get("photos", [])
+    photos = data.get("photo_refs", [])
     await delete_previous_message(bot, message.chat.id, (await state.get_data()).get("last_message_id"))
     sent_message = await message.answer(
         f"📸 Пожалуйста, нажмите на скрепку 📎 или перетащите фото.\n"
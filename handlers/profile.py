@@ -7,7 +7,11 @@ from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from pydantic import ValidationError
 from keyboards.main_kb import Keyboards
-from database import User, Auto, Booking, BookingStatus, Session, Review
+from sqlalchemy import select, delete
+from sqlalchemy.orm import joinedload
+from database import User, Auto, Booking, BookingStatus, Review
+from repository import get_user_bookings, get_booking_details, ACTIVE_STATUSES, HISTORY_STATUSES
+from sqlalchemy.ext.asyncio import AsyncSession
 from utils import (send_message, handle_error, get_progress_bar,
                    send_booking_notification, setup_logger, UserInput, AutoInput)
 from config import get_photo_path, ADMIN_ID, UPLOAD_USER_DIR
@@ -51,65 +55,64 @@ PROFILE_PROGRESS_STEPS = {
 }
 
 @profile_router.message(F.text == "Личный кабинет 👤")
-async def enter_profile(message: Message, state: FSMContext, bot: Bot):
+async def enter_profile(message: Message, state: FSMContext, bot: Bot, session: AsyncSession):
     """Вход в личный кабинет или начало регистрации."""
     logger.info(f"Пользователь {message.from_user.id} вошёл в личный кабинет")
     try:
-        with Session() as session:
-            user = session.query(User).filter_by(telegram_id=str(message.from_user.id)).first()
-            if user:
-                response = (
-                    f"<b>Личный кабинет</b> 👤\n"
-                    f"Имя: {user.first_name}\n"
-                    f"Фамилия: {user.last_name or 'Не указано'}\n"
-                    f"Телефон: {user.phone or 'Не указано'}\n"
-                    f"Имя пользователя: {user.username or 'Не указано'}\n"
-                    f"Дата рождения: {user.birth_date or 'Не указано'}\n"
-                )
-                try:
-                    photo_path = get_photo_path("profile")
-                    sent_message = await send_message(
-                        bot, str(message.chat.id), "photo",
-                        response,
-                        photo=photo_path,
-                        reply_markup=Keyboards.profile_menu_kb()
-                    )
-                except FileNotFoundError as e:
-                    logger.warning(f"Не удалось отправить фото профиля для {message.from_user.id}: {str(e)}")
-                    sent_message = await send_message(
-                        bot, str(message.chat.id), "text",
-                        response,
-                        reply_markup=Keyboards.profile_menu_kb()
-                    )
-                if sent_message:
-                    logger.debug(f"Сообщение личного кабинета отправлено для {message.from_user.id}")
-                    await state.update_data(last_message_id=sent_message.message_id)
-                    await state.set_state(ProfileStates.MainMenu)
-                return
-
-            user_data = {
-                "telegram_id": str(message.from_user.id),
-                "first_name": message.from_user.first_name,
-                "last_name": message.from_user.last_name,
-                "username": message.from_user.username,
-                "phone": None,
-                "birth_date": None
-            }
-            await state.update_data(user_data=user_data)
-
-            keyboard = ReplyKeyboardMarkup(
-                keyboard=[[KeyboardButton(text="Отправить контакт", request_contact=True)]],
-                resize_keyboard=True,
-                one_time_keyboard=True
-            )
-            sent_message = await send_message(
-                bot, str(message.chat.id), "text",
-                "Пожалуйста, отправьте ваш номер телефона, нажав на кнопку ниже: 📞",
-                reply_markup=keyboard
+        user = await session.scalar(select(User).filter_by(telegram_id=str(message.from_user.id)))
+        if user:
+            response = (
+                f"<b>Личный кабинет</b> 👤\n"
+                f"Имя: {user.first_name}\n"
+                f"Фамилия: {user.last_name or 'Не указано'}\n"
+                f"Телефон: {user.phone or 'Не указано'}\n"
+                f"Имя пользователя: {user.username or 'Не указано'}\n"
+                f"Дата рождения: {user.birth_date or 'Не указано'}\n"
             )
+            try:
+                photo_path = get_photo_path("profile")
+                sent_message = await send_message(
+                    bot, str(message.chat.id), "photo",
+                    response,
+                    photo=photo_path,
+                    reply_markup=Keyboards.profile_menu_kb()
+                )
+            except FileNotFoundError as e:
+                logger.warning(f"Не удалось отправить фото профиля для {message.from_user.id}: {str(e)}")
+                sent_message = await send_message(
+                    bot, str(message.chat.id), "text",
+                    response,
+                    reply_markup=Keyboards.profile_menu_kb()
+                )
             if sent_message:
+                logger.debug(f"Сообщение личного кабинета отправлено для {message.from_user.id}")
                 await state.update_data(last_message_id=sent_message.message_id)
-                await state.set_state(ProfileStates.RegisterAwaitingPhone)
+                await state.set_state(ProfileStates.MainMenu)
+            return
+
+        user_data = {
+            "telegram_id": str(message.from_user.id),
+            "first_name": message.from_user.first_name,
+            "last_name": message.from_user.last_name,
+            "username": message.from_user.username,
+            "phone": None,
+            "birth_date": None
+        }
+        await state.update_data(user_data=user_data)
+
+        keyboard = ReplyKeyboardMarkup(
+            keyboard=[[KeyboardButton(text="Отправить контакт", request_contact=True)]],
+            resize_keyboard=True,
+            one_time_keyboard=True
+        )
+        sent_message = await send_message(
+            bot, str(message.chat.id), "text",
+            "Пожалуйста, отправьте ваш номер телефона, нажав на кнопку ниже: 📞",
+            reply_markup=keyboard
+        )
+        if sent_message:
+            await state.update_data(last_message_id=sent_message.message_id)
+            await state.set_state(ProfileStates.RegisterAwaitingPhone)
     except Exception as e:
         logger.error(f"Ошибка входа в личный кабинет для {message.from_user.id}: {str(e)}")
         await handle_error(message, state, bot, "Ошибка. Попробуйте снова. 😔", "Ошибка входа в личный кабинет", e)
@@ -173,7 +176,7 @@ async def show_user_data(message: Message, state: FSMContext, bot: Bot):
         await state.set_state(ProfileStates.RegisterConfirm)
 
 @profile_router.callback_query(ProfileStates.RegisterConfirm, F.data == "confirm_register")
-async def confirm_register(callback: CallbackQuery, state: FSMContext, bot: Bot):
+async def confirm_register(callback: CallbackQuery, state: FSMContext, bot: Bot, session: AsyncSession):
     """Подтверждение регистрации и сохранение данных."""
     logger.info(f"Пользователь {callback.from_user.id} подтвердил регистрацию")
     try:
@@ -184,35 +187,34 @@ async def confirm_register(callback: CallbackQuery, state: FSMContext, bot: Bot)
             last_name=user_data["last_name"],
             phone=user_data["phone"]
         )
-        with Session() as session:
-            user = User(
-                telegram_id=user_data["telegram_id"],
-                first_name=user_input.first_name,
-                last_name=user_input.last_name,
-                phone=user_input.phone,
-                username=user_data["username"],
-                birth_date=user_data["birth_date"]
-            )
-            session.add(user)
-            session.commit()
-            logger.info(f"Пользователь {callback.from_user.id} зарегистрирован")
-            response = (
-                f"<b>Регистрация завершена</b> ✅\n"
-                f"Имя: {user.first_name}\n"
-                f"Фамилия: {user.last_name or 'Не указано'}\n"
-                f"Телефон: {user.phone or 'Не указано'}\n"
-                f"Имя пользователя: {user.username or 'Не указано'}\n"
-                f"Дата рождения: {user.birth_date or 'Не указано'}\n"
-            )
-            sent_message = await send_message(
-                bot, str(callback.message.chat.id), "text",
-                response,
-                reply_markup=Keyboards.profile_menu_kb()
-            )
-            if sent_message:
-                await state.update_data(last_message_id=sent_message.message_id)
-                await state.set_state(ProfileStates.MainMenu)
-            await callback.answer()
+        user = User(
+            telegram_id=user_data["telegram_id"],
+            first_name=user_input.first_name,
+            last_name=user_input.last_name,
+            phone=user_input.phone,
+            username=user_data["username"],
+            birth_date=user_data["birth_date"]
+        )
+        session.add(user)
+        await session.flush()
+        logger.info(f"Пользователь {callback.from_user.id} зарегистрирован")
+        response = (
+            f"<b>Регистрация завершена</b> ✅\n"
+            f"Имя: {user.first_name}\n"
+            f"Фамилия: {user.last_name or 'Не указано'}\n"
+            f"Телефон: {user.phone or 'Не указано'}\n"
+            f"Имя пользователя: {user.username or 'Не указано'}\n"
+            f"Дата рождения: {user.birth_date or 'Не указано'}\n"
+        )
+        sent_message = await send_message(
+            bot, str(callback.message.chat.id), "text",
+            response,
+            reply_markup=Keyboards.profile_menu_kb()
+        )
+        if sent_message:
+            await state.update_data(last_message_id=sent_message.message_id)
+            await state.set_state(ProfileStates.MainMenu)
+        await callback.answer()
     except Exception as e:
         logger.error(f"Ошибка регистрации для {callback.from_user.id}: {str(e)}")
         await handle_error(callback, state, bot, "Ошибка регистрации. Попробуйте снова. 😔", "Ошибка регистрации", e)
@@ -278,7 +280,7 @@ async def process_last_name(message: Message, state: FSMContext, bot: Bot):
     )
 
 @profile_router.message(ProfileStates.AwaitingPhone, F.text)
-async def process_phone(message: Message, state: FSMContext, bot: Bot):
+async def process_phone(message: Message, state: FSMContext, bot: Bot, session: AsyncSession):
     """Обработка телефона и сохранение данных."""
     logger.info(f"Пользователь {message.from_user.id} ввёл телефон")
     try:
@@ -292,39 +294,38 @@ async def process_phone(message: Message, state: FSMContext, bot: Bot):
             last_name=data.get("last_name"),
             phone=validated_phone
         )
-        with Session() as session:
-            user = session.query(User).filter_by(telegram_id=str(message.from_user.id)).first()
-            user.first_name = user_input.first_name
-            user.last_name = user_input.last_name
-            user.phone = user_input.phone
-            session.commit()
-            logger.info(f"Пользователь {message.from_user.id} обновил данные")
-            response = (
-                f"<b>Данные обновлены</b> ✅\n"
-                f"Имя: {user.first_name}\n"
-                f"Фамилия: {user.last_name or 'Не указано'}\n"
-                f"Телефон: {user.phone or 'Не указано'}\n"
-                f"Имя пользователя: {user.username or 'Не указано'}\n"
-                f"Дата рождения: {user.birth_date or 'Не указано'}\n"
+        user = await session.scalar(select(User).filter_by(telegram_id=str(message.from_user.id)))
+        user.first_name = user_input.first_name
+        user.last_name = user_input.last_name
+        user.phone = user_input.phone
+        await session.flush()
+        logger.info(f"Пользователь {message.from_user.id} обновил данные")
+        response = (
+            f"<b>Данные обновлены</b> ✅\n"
+            f"Имя: {user.first_name}\n"
+            f"Фамилия: {user.last_name or 'Не указано'}\n"
+            f"Телефон: {user.phone or 'Не указано'}\n"
+            f"Имя пользователя: {user.username or 'Не указано'}\n"
+            f"Дата рождения: {user.birth_date or 'Не указано'}\n"
+        )
+        try:
+            photo_path = get_photo_path("profile_edit")
+            sent_message = await send_message(
+                bot, str(message.chat.id), "photo",
+                response,
+                photo=photo_path,
+                reply_markup=Keyboards.profile_menu_kb()
             )
-            try:
-                photo_path = get_photo_path("profile_edit")
-                sent_message = await send_message(
-                    bot, str(message.chat.id), "photo",
-                    response,
-                    photo=photo_path,
-                    reply_markup=Keyboards.profile_menu_kb()
-                )
-            except FileNotFoundError as e:
-                logger.warning(f"Не удалось отправить фото profile_edit для {message.from_user.id}: {str(e)}")
-                sent_message = await send_message(
-                    bot, str(message.chat.id), "text",
-                    response,
-                    reply_markup=Keyboards.profile_menu_kb()
-                )
-            if sent_message:
-                await state.update_data(last_message_id=sent_message.message_id)
-                await state.set_state(ProfileStates.MainMenu)
+        except FileNotFoundError as e:
+            logger.warning(f"Не удалось отправить фото profile_edit для {message.from_user.id}: {str(e)}")
+            sent_message = await send_message(
+                bot, str(message.chat.id), "text",
+                response,
+                reply_markup=Keyboards.profile_menu_kb()
+            )
+        if sent_message:
+            await state.update_data(last_message_id=sent_message.message_id)
+            await state.set_state(ProfileStates.MainMenu)
     except ValidationError as e:
         logger.error(f"Ошибка валидации телефона для {message.from_user.id}: {str(e)}")
         sent_message = await send_message(
@@ -340,51 +341,50 @@ async def process_phone(message: Message, state: FSMContext, bot: Bot):
         await handle_error(message, state, bot, "Ошибка. Попробуйте снова. 😔", "Ошибка обновления данных", e)
 
 @profile_router.callback_query(ProfileStates.MainMenu, F.data == "manage_autos")
-async def manage_autos(callback: CallbackQuery, state: FSMContext, bot: Bot):
+async def manage_autos(callback: CallbackQuery, state: FSMContext, bot: Bot, session: AsyncSession):
     """Управление автомобилями."""
     logger.info(f"Пользователь {callback.from_user.id} запросил управление автомобилями")
     try:
-        with Session() as session:
-            user = session.query(User).filter_by(telegram_id=str(callback.from_user.id)).first()
-            autos = session.query(Auto).filter_by(user_id=user.id).all()
-            if not autos:
-                sent_message = await send_message(
-                    bot, str(callback.message.chat.id), "text",
-                    "У вас нет автомобилей. Введите <b>марку</b> автомобиля (например, <b>Toyota</b>): 🚗",
-                    reply_markup=Keyboards.cancel_kb()
-                )
-                if sent_message:
-                    await state.update_data(last_message_id=sent_message.message_id)
-                    await state.set_state(ProfileStates.AwaitingAutoBrand)
-                await callback.answer()
-                return
-            response = "<b>Ваши автомобили</b> 🚗\n\n"
-            for auto in autos:
-                response += (
-                    f"ID: {auto.id}\n"
-                    f"Марка: {auto.brand}\n"
-                    f"Год: {auto.year}\n"
-                    f"Госномер: {auto.license_plate}\n\n"
-                )
-            try:
-                photo_path = get_photo_path("profile_list_auto")
-                sent_message = await send_message(
-                    bot, str(callback.message.chat.id), "photo",
-                    response,
-                    photo=photo_path,
-                    reply_markup=Keyboards.auto_management_kb(autos)
-                )
-            except FileNotFoundError as e:
-                logger.warning(f"Не удалось отправить фото profile_list_auto для {callback.from_user.id}: {str(e)}")
-                sent_message = await send_message(
-                    bot, str(callback.message.chat.id), "text",
-                    response,
-                    reply_markup=Keyboards.auto_management_kb(autos)
-                )
+        user = await session.scalar(select(User).filter_by(telegram_id=str(callback.from_user.id)))
+        autos = (await session.scalars(select(Auto).filter_by(user_id=user.id))).all()
+        if not autos:
+            sent_message = await send_message(
+                bot, str(callback.message.chat.id), "text",
+                "У вас нет автомобилей. Введите <b>марку</b> автомобиля (например, <b>Toyota</b>): 🚗",
+                reply_markup=Keyboards.cancel_kb()
+            )
             if sent_message:
                 await state.update_data(last_message_id=sent_message.message_id)
-                await state.set_state(ProfileStates.ManagingAutos)
+                await state.set_state(ProfileStates.AwaitingAutoBrand)
             await callback.answer()
+            return
+        response = "<b>Ваши автомобили</b> 🚗\n\n"
+        for auto in autos:
+            response += (
+                f"ID: {auto.id}\n"
+                f"Марка: {auto.brand}\n"
+                f"Год: {auto.year}\n"
+                f"Госномер: {auto.license_plate}\n\n"
+            )
+        try:
+            photo_path = get_photo_path("profile_list_auto")
+            sent_message = await send_message(
+                bot, str(callback.message.chat.id), "photo",
+                response,
+                photo=photo_path,
+                reply_markup=Keyboards.auto_management_kb(autos)
+            )
+        except FileNotFoundError as e:
+            logger.warning(f"Не удалось отправить фото profile_list_auto для {callback.from_user.id}: {str(e)}")
+            sent_message = await send_message(
+                bot, str(callback.message.chat.id), "text",
+                response,
+                reply_markup=Keyboards.auto_management_kb(autos)
+            )
+        if sent_message:
+            await state.update_data(last_message_id=sent_message.message_id)
+            await state.set_state(ProfileStates.ManagingAutos)
+        await callback.answer()
     except Exception as e:
         logger.error(f"Ошибка управления автомобилями для {callback.from_user.id}: {str(e)}")
         await handle_error(callback, state, bot, "Ошибка. Попробуйте снова. 😔", "Ошибка управления автомобилями", e)
@@ -465,7 +465,7 @@ async def process_auto_vin(message: Message, state: FSMContext, bot: Bot):
     )
 
 @profile_router.message(ProfileStates.AwaitingAutoLicensePlate, F.text)
-async def process_auto_license_plate(message: Message, state: FSMContext, bot: Bot):
+async def process_auto_license_plate(message: Message, state: FSMContext, bot: Bot, session: AsyncSession):
     """Обработка госномера и сохранение автомобиля."""
     logger.info(f"Пользователь {message.from_user.id} ввёл госномер автомобиля")
     try:
@@ -477,35 +477,34 @@ async def process_auto_license_plate(message: Message, state: FSMContext, bot: B
             vin=data["vin"],
             license_plate=license_plate
         )
-        with Session() as session:
-            user = session.query(User).filter_by(telegram_id=str(message.from_user.id)).first()
-            auto = Auto(
-                user_id=user.id,
-                brand=auto_input.brand,
-                year=auto_input.year,
-                vin=auto_input.vin,
-                license_plate=auto_input.license_plate
-            )
-            session.add(auto)
-            session.commit()
-            logger.info(f"Автомобиль добавлен для пользователя {message.from_user.id}")
-            autos = session.query(Auto).filter_by(user_id=user.id).all()
-            response = "<b>Автомобиль добавлен</b> 🎉\n\n"
-            for auto in autos:
-                response += (
-                    f"ID: {auto.id}\n"
-                    f"Марка: {auto.brand}\n"
-                    f"Год: {auto.year}\n"
-                    f"Госномер: {auto.license_plate}\n\n"
-                )
-            sent_message = await send_message(
-                bot, str(message.chat.id), "text",
-                response,
-                reply_markup=Keyboards.auto_management_kb(autos)
+        user = await session.scalar(select(User).filter_by(telegram_id=str(message.from_user.id)))
+        auto = Auto(
+            user_id=user.id,
+            brand=auto_input.brand,
+            year=auto_input.year,
+            vin=auto_input.vin,
+            license_plate=auto_input.license_plate
+        )
+        session.add(auto)
+        await session.flush()
+        logger.info(f"Автомобиль добавлен для пользователя {message.from_user.id}")
+        autos = (await session.scalars(select(Auto).filter_by(user_id=user.id))).all()
+        response = "<b>Автомобиль добавлен</b> 🎉\n\n"
+        for auto in autos:
+            response += (
+                f"ID: {auto.id}\n"
+                f"Марка: {auto.brand}\n"
+                f"Год: {auto.year}\n"
+                f"Госномер: {auto.license_plate}\n\n"
             )
-            if sent_message:
-                await state.update_data(last_message_id=sent_message.message_id)
-                await state.set_state(ProfileStates.ManagingAutos)
+        sent_message = await send_message(
+            bot, str(message.chat.id), "text",
+            response,
+            reply_markup=Keyboards.auto_management_kb(autos)
+        )
+        if sent_message:
+            await state.update_data(last_message_id=sent_message.message_id)
+            await state.set_state(ProfileStates.ManagingAutos)
     except Exception as e:
         logger.error(f"Ошибка добавления автомобиля для {message.from_user.id}: {str(e)}")
         sent_message = await send_message(
@@ -520,317 +519,303 @@ async def process_auto_license_plate(message: Message, state: FSMContext, bot: B
             await state.update_data(last_message_id=sent_message.message_id)
 
 @profile_router.callback_query(ProfileStates.ManagingAutos, F.data.startswith("delete_auto_"))
-async def delete_auto(callback: CallbackQuery, state: FSMContext, bot: Bot):
+async def delete_auto(callback: CallbackQuery, state: FSMContext, bot: Bot, session: AsyncSession):
     """Удаление автомобиля."""
     logger.info(f"Пользователь {callback.from_user.id} запросил удаление автомобиля")
     auto_id = int(callback.data.replace("delete_auto_", ""))
     try:
-        with Session() as session:
-            auto = session.query(Auto).get(auto_id)
-            if not auto:
-                logger.warning(f"Автомобиль {auto_id} не найден для пользователя {callback.from_user.id}")
-                await handle_error(callback, state, bot, "Автомобиль не найден. 😔", "Автомобиль не найден",
-                                   Exception("Auto not found"))
-                await callback.answer()
-                return
+        auto = await session.get(Auto, auto_id)
+        if not auto:
+            logger.warning(f"Автомобиль {auto_id} не найден для пользователя {callback.from_user.id}")
+            await handle_error(callback, state, bot, "Автомобиль не найден. 😔", "Автомобиль не найден",
+                               Exception("Auto not found"))
+            await callback.answer()
+            return
 
-            active_bookings = session.query(Booking).filter(
-                Booking.auto_id == auto_id,
-                Booking.status.in_([BookingStatus.PENDING, BookingStatus.CONFIRMED])
-            ).all()
-            if active_bookings:
-                logger.warning(f"Невозможно удалить автомобиль {auto_id}: есть активные записи")
-                sent_message = await send_message(
-                    bot, str(callback.message.chat.id), "text",
-                    "Невозможно удалить автомобиль: есть активные записи. Отмените их в 'Мои записи'. 📝",
-                    reply_markup=Keyboards.auto_management_kb(
-                        session.query(Auto).filter_by(user_id=auto.user_id).all()
-                    )
+        active_bookings = (await session.scalars(select(Booking).filter(
+            Booking.auto_id == auto_id,
+            Booking.status.in_([BookingStatus.PENDING, BookingStatus.CONFIRMED])
+        ))).all()
+        if active_bookings:
+            logger.warning(f"Невозможно удалить автомобиль {auto_id}: есть активные записи")
+            sent_message = await send_message(
+                bot, str(callback.message.chat.id), "text",
+                "Невозможно удалить автомобиль: есть активные записи. Отмените их в 'Мои записи'. 📝",
+                reply_markup=Keyboards.auto_management_kb(
+                    (await session.scalars(select(Auto).filter_by(user_id=auto.user_id))).all()
                 )
-                if sent_message:
-                    await state.update_data(last_message_id=sent_message.message_id)
-                await callback.answer()
-                return
-
-            session.query(Booking).filter(
-                Booking.auto_id == auto_id,
-                Booking.status.in_([BookingStatus.REJECTED, BookingStatus.CANCELLED])
-            ).delete()
+            )
+            if sent_message:
+                await state.update_data(last_message_id=sent_message.message_id)
+            await callback.answer()
+            return
 
-            session.delete(auto)
-            session.commit()
-            logger.info(f"Автомобиль {auto_id} удалён для пользователя {callback.from_user.id}")
+        await session.execute(delete(Booking).filter(
+            Booking.auto_id == auto_id,
+            Booking.status.in_([BookingStatus.REJECTED, BookingStatus.CANCELLED])
+        ))
 
-            autos = session.query(Auto).filter_by(user_id=auto.user_id).all()
-            if not autos:
-                response = "У вас больше нет автомобилей. Добавьте новый: 🚗"
-                sent_message = await send_message(
-                    bot, str(callback.message.chat.id), "text",
-                    response,
-                    reply_markup=Keyboards.profile_menu_kb()
-                )
-                if sent_message:
-                    await state.update_data(last_message_id=sent_message.message_id)
-                    await state.set_state(ProfileStates.MainMenu)
-                await callback.answer()
-                return
+        await session.delete(auto)
+        await session.flush()
+        logger.info(f"Автомобиль {auto_id} удалён для пользователя {callback.from_user.id}")
 
-            response = "<b>Автомобиль удалён</b> 🗑\n\n"
-            for auto in autos:
-                response += (
-                    f"ID: {auto.id}\n"
-                    f"Марка: {auto.brand}\n"
-                    f"Год: {auto.year}\n"
-                    f"Госномер: {auto.license_plate}\n\n"
-                )
+        autos = (await session.scalars(select(Auto).filter_by(user_id=auto.user_id))).all()
+        if not autos:
+            response = "У вас больше нет автомобилей. Добавьте новый: 🚗"
             sent_message = await send_message(
                 bot, str(callback.message.chat.id), "text",
                 response,
-                reply_markup=Keyboards.auto_management_kb(autos)
+                reply_markup=Keyboards.profile_menu_kb()
             )
             if sent_message:
                 await state.update_data(last_message_id=sent_message.message_id)
-                await state.set_state(ProfileStates.ManagingAutos)
+                await state.set_state(ProfileStates.MainMenu)
             await callback.answer()
+            return
+
+        response = "<b>Автомобиль удалён</b> 🗑\n\n"
+        for auto in autos:
+            response += (
+                f"ID: {auto.id}\n"
+                f"Марка: {auto.brand}\n"
+                f"Год: {auto.year}\n"
+                f"Госномер: {auto.license_plate}\n\n"
+            )
+        sent_message = await send_message(
+            bot, str(callback.message.chat.id), "text",
+            response,
+            reply_markup=Keyboards.auto_management_kb(autos)
+        )
+        if sent_message:
+            await state.update_data(last_message_id=sent_message.message_id)
+            await state.set_state(ProfileStates.ManagingAutos)
+        await callback.answer()
     except Exception as e:
         logger.error(f"Ошибка удаления автомобиля для {callback.from_user.id}: {str(e)}")
         await handle_error(callback, state, bot, "Ошибка. Попробуйте снова. 😔", "Ошибка удаления автомобиля", e)
         await callback.answer()
 
 @profile_router.callback_query(ProfileStates.ManagingAutos, F.data == "back_to_profile")
-async def back_to_profile(callback: CallbackQuery, state: FSMContext, bot: Bot):
+async def back_to_profile(callback: CallbackQuery, state: FSMContext, bot: Bot, session: AsyncSession):
     """Возврат в меню личного кабинета из управления автомобилями."""
     logger.info(f"Пользователь {callback.from_user.id} вернулся в меню личного кабинета")
     try:
-        with Session() as session:
-            user = session.query(User).filter_by(telegram_id=str(callback.from_user.id)).first()
-            response = (
-                f"<b>Личный кабинет</b> 👤\n"
-                f"Имя: {user.first_name}\n"
-                f"Фамилия: {user.last_name or 'Не указано'}\n"
-                f"Телефон: {user.phone or 'Не указано'}\n"
-                f"Имя пользователя: {user.username or 'Не указано'}\n"
-                f"Дата рождения: {user.birth_date or 'Не указано'}\n"
+        user = await session.scalar(select(User).filter_by(telegram_id=str(callback.from_user.id)))
+        response = (
+            f"<b>Личный кабинет</b> 👤\n"
+            f"Имя: {user.first_name}\n"
+            f"Фамилия: {user.last_name or 'Не указано'}\n"
+            f"Телефон: {user.phone or 'Не указано'}\n"
+            f"Имя пользователя: {user.username or 'Не указано'}\n"
+            f"Дата рождения: {user.birth_date or 'Не указано'}\n"
+        )
+        try:
+            photo_path = get_photo_path("profile")
+            sent_message = await send_message(
+                bot, str(callback.message.chat.id), "photo",
+                response,
+                photo=photo_path,
+                reply_markup=Keyboards.profile_menu_kb()
             )
-            try:
-                photo_path = get_photo_path("profile")
-                sent_message = await send_message(
-                    bot, str(callback.message.chat.id), "photo",
-                    response,
-                    photo=photo_path,
-                    reply_markup=Keyboards.profile_menu_kb()
-                )
-            except FileNotFoundError as e:
-                logger.warning(f"Не удалось отправить фото профиля для {callback.from_user.id}: {str(e)}")
-                sent_message = await send_message(
-                    bot, str(callback.message.chat.id), "text",
-                    response,
-                    reply_markup=Keyboards.profile_menu_kb()
-                )
-            if sent_message:
-                await state.update_data(last_message_id=sent_message.message_id)
-                await state.set_state(ProfileStates.MainMenu)
-            await callback.answer()
+        except FileNotFoundError as e:
+            logger.warning(f"Не удалось отправить фото профиля для {callback.from_user.id}: {str(e)}")
+            sent_message = await send_message(
+                bot, str(callback.message.chat.id), "text",
+                response,
+                reply_markup=Keyboards.profile_menu_kb()
+            )
+        if sent_message:
+            await state.update_data(last_message_id=sent_message.message_id)
+            await state.set_state(ProfileStates.MainMenu)
+        await callback.answer()
     except Exception as e:
         logger.error(f"Ошибка возврата в личный кабинет для {callback.from_user.id}: {str(e)}")
         await handle_error(callback, state, bot, "Ошибка. Попробуйте снова. 😔", "Ошибка возврата в личный кабинет", e)
         await callback.answer()
 
 @profile_router.callback_query(ProfileStates.MainMenu, F.data == "back_to_profile")
-async def back_to_profile_main_menu(callback: CallbackQuery, state: FSMContext, bot: Bot):
+async def back_to_profile_main_menu(callback: CallbackQuery, state: FSMContext, bot: Bot, session: AsyncSession):
     """Возврат в меню личного кабинета из списка записей."""
     logger.info(f"Пользователь {callback.from_user.id} вернулся в меню личного кабинета из списка записей")
     try:
-        with Session() as session:
-            user = session.query(User).filter_by(telegram_id=str(callback.from_user.id)).first()
-            response = (
-                f"<b>Личный кабинет</b> 👤\n"
-                f"Имя: {user.first_name}\n"
-                f"Фамилия: {user.last_name or 'Не указано'}\n"
-                f"Телефон: {user.phone or 'Не указано'}\n"
-                f"Имя пользователя: {user.username or 'Не указано'}\n"
-                f"Дата рождения: {user.birth_date or 'Не указано'}\n"
+        user = await session.scalar(select(User).filter_by(telegram_id=str(callback.from_user.id)))
+        response = (
+            f"<b>Личный кабинет</b> 👤\n"
+            f"Имя: {user.first_name}\n"
+            f"Фамилия: {user.last_name or 'Не указано'}\n"
+            f"Телефон: {user.phone or 'Не указано'}\n"
+            f"Имя пользователя: {user.username or 'Не указано'}\n"
+            f"Дата рождения: {user.birth_date or 'Не указано'}\n"
+        )
+        try:
+            photo_path = get_photo_path("profile")
+            sent_message = await send_message(
+                bot, str(callback.message.chat.id), "photo",
+                response,
+                photo=photo_path,
+                reply_markup=Keyboards.profile_menu_kb()
             )
-            try:
-                photo_path = get_photo_path("profile")
-                sent_message = await send_message(
-                    bot, str(callback.message.chat.id), "photo",
-                    response,
-                    photo=photo_path,
-                    reply_markup=Keyboards.profile_menu_kb()
-                )
-            except FileNotFoundError as e:
-                logger.warning(f"Не удалось отправить фото профиля для {callback.from_user.id}: {str(e)}")
-                sent_message = await send_message(
-                    bot, str(callback.message.chat.id), "text",
-                    response,
-                    reply_markup=Keyboards.profile_menu_kb()
-                )
-            if sent_message:
-                await state.update_data(last_message_id=sent_message.message_id)
-                await state.set_state(ProfileStates.MainMenu)
-            await callback.answer()
+        except FileNotFoundError as e:
+            logger.warning(f"Не удалось отправить фото профиля для {callback.from_user.id}: {str(e)}")
+            sent_message = await send_message(
+                bot, str(callback.message.chat.id), "text",
+                response,
+                reply_markup=Keyboards.profile_menu_kb()
+            )
+        if sent_message:
+            await state.update_data(last_message_id=sent_message.message_id)
+            await state.set_state(ProfileStates.MainMenu)
+        await callback.answer()
     except Exception as e:
         logger.error(f"Ошибка возврата в личный кабинет для {callback.from_user.id}: {str(e)}")
         await handle_error(callback, state, bot, "Ошибка. Попробуйте снова. 😔", "Ошибка возврата в личный кабинет", e)
         await callback.answer()
 
 @profile_router.callback_query(ProfileStates.MainMenu, F.data == "my_bookings")
-async def show_bookings(callback: CallbackQuery, state: FSMContext, bot: Bot):
+async def show_bookings(callback: CallbackQuery, state: FSMContext, bot: Bot, session: AsyncSession):
     """Показ активных записей с возможностью просмотра и отмены."""
     logger.info(f"Пользователь {callback.from_user.id} запросил активные записи")
     try:
-        with Session() as session:
-            user = session.query(User).filter_by(telegram_id=str(callback.from_user.id)).first()
-            bookings = session.query(Booking).filter(
-                Booking.user_id == user.id,
-                Booking.status.in_([BookingStatus.PENDING, BookingStatus.CONFIRMED])
-            ).all()
-            if not bookings:
-                sent_message = await send_message(
-                    bot, str(callback.message.chat.id), "text",
-                    "У вас нет активных записей. 📝",
-                    reply_markup=Keyboards.profile_menu_kb()
-                )
-                if sent_message:
-                    await state.update_data(last_message_id=sent_message.message_id)
-                await state.set_state(ProfileStates.MainMenu)
-                await callback.answer()
-                return
-            response = "<b>Ваши активные записи</b> 📜\nВыберите запись для просмотра или отмены:"
-            try:
-                photo_path = get_photo_path("bookings")
-                sent_message = await send_message(
-                    bot, str(callback.message.chat.id), "photo",
-                    response,
-                    photo=photo_path,
-                    reply_markup=Keyboards.bookings_kb(bookings)
-                )
-            except FileNotFoundError as e:
-                logger.warning(f"Не удалось отправить фото bookings для {callback.from_user.id}: {str(e)}")
-                sent_message = await send_message(
-                    bot, str(callback.message.chat.id), "text",
-                    response,
-                    reply_markup=Keyboards.bookings_kb(bookings)
-                )
+        bookings = await get_user_bookings(session, callback.from_user.id, ACTIVE_STATUSES)
+        if not bookings:
+            sent_message = await send_message(
+                bot, str(callback.message.chat.id), "text",
+                "У вас нет активных записей. 📝",
+                reply_markup=Keyboards.profile_menu_kb()
+            )
             if sent_message:
                 await state.update_data(last_message_id=sent_message.message_id)
-                await state.set_state(ProfileStates.MainMenu)
+            await state.set_state(ProfileStates.MainMenu)
             await callback.answer()
+            return
+        response = "<b>Ваши активные записи</b> 📜\nВыберите запись для просмотра или отмены:"
+        try:
+            photo_path = get_photo_path("bookings")
+            sent_message = await send_message(
+                bot, str(callback.message.chat.id), "photo",
+                response,
+                photo=photo_path,
+                reply_markup=Keyboards.bookings_kb(bookings)
+            )
+        except FileNotFoundError as e:
+            logger.warning(f"Не удалось отправить фото bookings для {callback.from_user.id}: {str(e)}")
+            sent_message = await send_message(
+                bot, str(callback.message.chat.id), "text",
+                response,
+                reply_markup=Keyboards.bookings_kb(bookings)
+            )
+        if sent_message:
+            await state.update_data(last_message_id=sent_message.message_id)
+            await state.set_state(ProfileStates.MainMenu)
+        await callback.answer()
     except Exception as e:
         logger.error(f"Ошибка получения записей для {callback.from_user.id}: {str(e)}")
         await handle_error(callback, state, bot, "Ошибка. Попробуйте снова. 😔", "Ошибка получения записей", e)
         await callback.answer()
 
 @profile_router.callback_query(ProfileStates.ViewingBooking, F.data == "my_bookings")
-async def back_to_bookings(callback: CallbackQuery, state: FSMContext, bot: Bot):
+async def back_to_bookings(callback: CallbackQuery, state: FSMContext, bot: Bot, session: AsyncSession):
     """Возврат к списку активных записей из просмотра записи."""
     logger.info(f"Пользователь {callback.from_user.id} возвращается к списку записей")
     try:
-        with Session() as session:
-            user = session.query(User).filter_by(telegram_id=str(callback.from_user.id)).first()
-            bookings = session.query(Booking).filter(
-                Booking.user_id == user.id,
-                Booking.status.in_([BookingStatus.PENDING, BookingStatus.CONFIRMED])
-            ).all()
-            if not bookings:
-                sent_message = await send_message(
-                    bot, str(callback.message.chat.id), "text",
-                    "У вас нет активных записей. 📝",
-                    reply_markup=Keyboards.profile_menu_kb()
-                )
-                if sent_message:
-                    await state.update_data(last_message_id=sent_message.message_id)
-                await state.set_state(ProfileStates.MainMenu)
-                await callback.answer()
-                return
-            response = "<b>Ваши активные записи</b> 📜\nВыберите запись для просмотра или отмены:"
-            try:
-                photo_path = get_photo_path("bookings")
-                sent_message = await send_message(
-                    bot, str(callback.message.chat.id), "photo",
-                    response,
-                    photo=photo_path,
-                    reply_markup=Keyboards.bookings_kb(bookings)
-                )
-            except FileNotFoundError as e:
-                logger.warning(f"Не удалось отправить фото bookings для {callback.from_user.id}: {str(e)}")
-                sent_message = await send_message(
-                    bot, str(callback.message.chat.id), "text",
-                    response,
-                    reply_markup=Keyboards.bookings_kb(bookings)
-                )
+        bookings = await get_user_bookings(session, callback.from_user.id, ACTIVE_STATUSES)
+        if not bookings:
+            sent_message = await send_message(
+                bot, str(callback.message.chat.id), "text",
+                "У вас нет активных записей. 📝",
+                reply_markup=Keyboards.profile_menu_kb()
+            )
             if sent_message:
                 await state.update_data(last_message_id=sent_message.message_id)
-                await state.set_state(ProfileStates.MainMenu)
+            await state.set_state(ProfileStates.MainMenu)
             await callback.answer()
+            return
+        response = "<b>Ваши активные записи</b> 📜\nВыберите запись для просмотра или отмены:"
+        try:
+            photo_path = get_photo_path("bookings")
+            sent_message = await send_message(
+                bot, str(callback.message.chat.id), "photo",
+                response,
+                photo=photo_path,
+                reply_markup=Keyboards.bookings_kb(bookings)
+            )
+        except FileNotFoundError as e:
+            logger.warning(f"Не удалось отправить фото bookings для {callback.from_user.id}: {str(e)}")
+            sent_message = await send_message(
+                bot, str(callback.message.chat.id), "text",
+                response,
+                reply_markup=Keyboards.bookings_kb(bookings)
+            )
+        if sent_message:
+            await state.update_data(last_message_id=sent_message.message_id)
+            await state.set_state(ProfileStates.MainMenu)
+        await callback.answer()
     except Exception as e:
         logger.error(f"Ошибка возврата к списку записей для {callback.from_user.id}: {str(e)}")
         await handle_error(callback, state, bot, "Ошибка. Попробуйте снова. 😔", "Ошибка возврата к списку записей", e)
         await callback.answer()
 
 @profile_router.callback_query(F.data.startswith("view_booking_"))
-async def view_booking(callback: CallbackQuery, state: FSMContext, bot: Bot):
+async def view_booking(callback: CallbackQuery, state: FSMContext, bot: Bot, session: AsyncSession):
     """Показывает детали выбранной записи."""
     logger.info(f"Пользователь {callback.from_user.id} просматривает запись")
     booking_id = int(callback.data.replace("view_booking_", ""))
     try:
-        with Session() as session:
-            booking = session.query(Booking).get(booking_id)
-            if not booking:
-                sent_message = await send_message(
-                    bot, str(callback.message.chat.id), "text",
-                    "Запись не найдена. 📝",
-                    reply_markup=Keyboards.profile_menu_kb()
-                )
-                if sent_message:
-                    await state.update_data(last_message_id=sent_message.message_id)
-                await state.set_state(ProfileStates.MainMenu)
-                await callback.answer()
-                return
-            if str(callback.from_user.id) != str(booking.user.telegram_id):
-                logger.warning(f"Несанкционированный доступ: user_id={callback.from_user.id} != telegram_id={booking.user.telegram_id}")
-                await callback.answer("Доступ только для владельца записи. 🔒")
-                return
-            auto = session.query(Auto).get(booking.auto_id)
-            status_map = {
-                BookingStatus.PENDING: "Ожидает подтверждения ⏳",
-                BookingStatus.CONFIRMED: "Подтверждено ✅",
-                BookingStatus.REJECTED: "Отклонено ❌",
-                BookingStatus.CANCELLED: "Отменено 🚫"
-            }
-            response = (
-                f"<b>Запись #{booking.id}</b> 📋\n"
-                f"<b>Услуга:</b> {booking.service_name} 🔧\n"
-                f"<b>Дата:</b> {booking.date.strftime('%d.%m.%Y')} 📅\n"
-                f"<b>Время:</b> {booking.time.strftime('%H:%M')} ⏰\n"
-                f"<b>Авто:</b> {auto.brand}, {auto.year}, {auto.license_plate} 🚗\n"
-                f"<b>Статус:</b> {status_map[booking.status]}\n"
+        booking = await get_booking_details(session, booking_id)
+        if not booking:
+            sent_message = await send_message(
+                bot, str(callback.message.chat.id), "text",
+                "Запись не найдена. 📝",
+                reply_markup=Keyboards.profile_menu_kb()
             )
-            keyboard = InlineKeyboardMarkup(inline_keyboard=[
-                [InlineKeyboardButton(text="Назад ⬅", callback_data="my_bookings")]
-            ])
-            if booking.status in [BookingStatus.PENDING, BookingStatus.CONFIRMED]:
-                keyboard.inline_keyboard.insert(0, [InlineKeyboardButton(text="Отменить ❌", callback_data=f"cancel_booking_{booking.id}")])
-            try:
-                photo_path = get_photo_path("booking_details")
-                sent_message = await send_message(
-                    bot, str(callback.message.chat.id), "photo",
-                    response,
-                    photo=photo_path,
-                    reply_markup=keyboard
-                )
-            except FileNotFoundError as e:
-                logger.warning(f"Не удалось отправить фото booking_details для {callback.from_user.id}: {str(e)}")
-                sent_message = await send_message(
-                    bot, str(callback.message.chat.id), "text",
-                    response,
-                    reply_markup=keyboard
-                )
             if sent_message:
                 await state.update_data(last_message_id=sent_message.message_id)
-                await state.set_state(ProfileStates.ViewingBooking)
+            await state.set_state(ProfileStates.MainMenu)
             await callback.answer()
+            return
+        if str(callback.from_user.id) != str(booking.user.telegram_id):
+            logger.warning(f"Несанкционированный доступ: user_id={callback.from_user.id} != telegram_id={booking.user.telegram_id}")
+            await callback.answer("Доступ только для владельца записи. 🔒")
+            return
+        auto = booking.auto
+        status_map = {
+            BookingStatus.PENDING: "Ожидает подтверждения ⏳",
+            BookingStatus.CONFIRMED: "Подтверждено ✅",
+            BookingStatus.REJECTED: "Отклонено ❌",
+            BookingStatus.CANCELLED: "Отменено 🚫"
+        }
+        response = (
+            f"<b>Запись #{booking.id}</b> 📋\n"
+            f"<b>Услуга:</b> {booking.service_name} 🔧\n"
+            f"<b>Дата:</b> {booking.date.strftime('%d.%m.%Y')} 📅\n"
+            f"<b>Время:</b> {booking.time.strftime('%H:%M')} ⏰\n"
+            f"<b>Авто:</b> {auto.brand}, {auto.year}, {auto.license_plate} 🚗\n"
+            f"<b>Статус:</b> {status_map[booking.status]}\n"
+        )
+        keyboard = InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text="Назад ⬅", callback_data="my_bookings")]
+        ])
+        if booking.status in [BookingStatus.PENDING, BookingStatus.CONFIRMED]:
+            keyboard.inline_keyboard.insert(0, [InlineKeyboardButton(text="Отменить ❌", callback_data=f"cancel_booking_{booking.id}")])
+        try:
+            photo_path = get_photo_path("booking_details")
+            sent_message = await send_message(
+                bot, str(callback.message.chat.id), "photo",
+                response,
+                photo=photo_path,
+                reply_markup=keyboard
+            )
+        except FileNotFoundError as e:
+            logger.warning(f"Не удалось отправить фото booking_details для {callback.from_user.id}: {str(e)}")
+            sent_message = await send_message(
+                bot, str(callback.message.chat.id), "text",
+                response,
+                reply_markup=keyboard
+            )
+        if sent_message:
+            await state.update_data(last_message_id=sent_message.message_id)
+            await state.set_state(ProfileStates.ViewingBooking)
+        await callback.answer()
     except Exception as e:
         logger.error(f"Ошибка просмотра записи {booking_id} для {callback.from_user.id}: {str(e)}")
         await handle_error(callback,
@@ -842,47 +827,42 @@ async def view_booking(callback: CallbackQuery, state: FSMContext, bot: Bot):
         await callback.answer()
 
 @profile_router.callback_query(ProfileStates.MainMenu, F.data == "booking_history")
-async def show_booking_history(callback: CallbackQuery, state: FSMContext, bot: Bot):
+async def show_booking_history(callback: CallbackQuery, state: FSMContext, bot: Bot, session: AsyncSession):
     """Показ истории записей с пагинацией."""
     logger.info(f"Пользователь {callback.from_user.id} запросил историю записей")
     try:
-        with Session() as session:
-            user = session.query(User).filter_by(telegram_id=str(callback.from_user.id)).first()
-            bookings = session.query(Booking).filter(
-                Booking.user_id == user.id,
-                Booking.status.in_([BookingStatus.REJECTED, BookingStatus.CANCELLED, BookingStatus.COMPLETED])
-            ).order_by(Booking.date.desc()).all()
-            if not bookings:
-                sent_message = await send_message(
-                    bot, str(callback.message.chat.id), "photo",
-                    "📜 У вас нет завершённых, отменённых или выполненных записей.",
-                    photo=get_photo_path("no_history"),
-                    reply_markup=Keyboards.profile_menu_kb()
-                )
-                if sent_message:
-                    await state.update_data(last_message_id=sent_message.message_id)
-                await state.set_state(ProfileStates.MainMenu)
-                await callback.answer()
-                return
-            response = "📜 <b>История ваших записей</b>\nВыберите запись для просмотра:"
-            try:
-                sent_message = await send_message(
-                    bot, str(callback.message.chat.id), "photo",
-                    response,
-                    photo=get_photo_path("booking_history"),
-                    reply_markup=Keyboards.bookings_history_kb(bookings, page=0)
-                )
-            except FileNotFoundError as e:
-                logger.warning(f"Не удалось отправить фото booking_history: {str(e)}")
-                sent_message = await send_message(
-                    bot, str(callback.message.chat.id), "text",
-                    response,
-                    reply_markup=Keyboards.bookings_history_kb(bookings, page=0)
-                )
+        bookings = await get_user_bookings(session, callback.from_user.id, HISTORY_STATUSES, newest_first=True)
+        if not bookings:
+            sent_message = await send_message(
+                bot, str(callback.message.chat.id), "photo",
+                "📜 У вас нет завершённых, отменённых или выполненных записей.",
+                photo=get_photo_path("no_history"),
+                reply_markup=Keyboards.profile_menu_kb()
+            )
             if sent_message:
                 await state.update_data(last_message_id=sent_message.message_id)
-                await state.set_state(ProfileStates.MainMenu)
+            await state.set_state(ProfileStates.MainMenu)
             await callback.answer()
+            return
+        response = "📜 <b>История ваших записей</b>\nВыберите запись для просмотра:"
+        try:
+            sent_message = await send_message(
+                bot, str(callback.message.chat.id), "photo",
+                response,
+                photo=get_photo_path("booking_history"),
+                reply_markup=Keyboards.bookings_history_kb(bookings, page=0)
+            )
+        except FileNotFoundError as e:
+            logger.warning(f"Не удалось отправить фото booking_history: {str(e)}")
+            sent_message = await send_message(
+                bot, str(callback.message.chat.id), "text",
+                response,
+                reply_markup=Keyboards.bookings_history_kb(bookings, page=0)
+            )
+        if sent_message:
+            await state.update_data(last_message_id=sent_message.message_id)
+            await state.set_state(ProfileStates.MainMenu)
+        await callback.answer()
     except Exception as e:
         logger.error(f"Ошибка получения истории записей для {callback.from_user.id}: {str(e)}")
         await handle_error(callback,
@@ -895,36 +875,31 @@ async def show_booking_history(callback: CallbackQuery, state: FSMContext, bot:
 
 
 @profile_router.callback_query(F.data.startswith("history_page_"))
-async def show_booking_history_page(callback: CallbackQuery, state: FSMContext, bot: Bot):
+async def show_booking_history_page(callback: CallbackQuery, state: FSMContext, bot: Bot, session: AsyncSession):
     """Показ истории записей для выбранной страницы."""
     page = int(callback.data.replace("history_page_", ""))
     logger.info(f"Пользователь {callback.from_user.id} запросил страницу {page} истории записей")
     try:
-        with Session() as session:
-            user = session.query(User).filter_by(telegram_id=str(callback.from_user.id)).first()
-            bookings = session.query(Booking).filter(
-                Booking.user_id == user.id,
-                Booking.status.in_([BookingStatus.REJECTED, BookingStatus.CANCELLED, BookingStatus.COMPLETED])
-            ).order_by(Booking.date.desc()).all()
-            response = "📜 <b>История ваших записей</b>\nВыберите запись для просмотра:"
-            try:
-                sent_message = await send_message(
-                    bot, str(callback.message.chat.id), "photo",
-                    response,
-                    photo=get_photo_path("booking_history"),
-                    reply_markup=Keyboards.bookings_history_kb(bookings, page=page)
-                )
-            except FileNotFoundError as e:
-                logger.warning(f"Не удалось отправить фото booking_history: {str(e)}")
-                sent_message = await send_message(
-                    bot, str(callback.message.chat.id), "text",
-                    response,
-                    reply_markup=Keyboards.bookings_history_kb(bookings, page=page)
-                )
-            if sent_message:
-                await state.update_data(last_message_id=sent_message.message_id)
-                await state.set_state(ProfileStates.MainMenu)
-            await callback.answer()
+        bookings = await get_user_bookings(session, callback.from_user.id, HISTORY_STATUSES, newest_first=True)
+        response = "📜 <b>История ваших записей</b>\nВыберите запись для просмотра:"
+        try:
+            sent_message = await send_message(
+                bot, str(callback.message.chat.id), "photo",
+                response,
+                photo=get_photo_path("booking_history"),
+                reply_markup=Keyboards.bookings_history_kb(bookings, page=page)
+            )
+        except FileNotFoundError as e:
+            logger.warning(f"Не удалось отправить фото booking_history: {str(e)}")
+            sent_message = await send_message(
+                bot, str(callback.message.chat.id), "text",
+                response,
+                reply_markup=Keyboards.bookings_history_kb(bookings, page=page)
+            )
+        if sent_message:
+            await state.update_data(last_message_id=sent_message.message_id)
+            await state.set_state(ProfileStates.MainMenu)
+        await callback.answer()
     except Exception as e:
         logger.error(f"Ошибка получения страницы {page} истории записей для {callback.from_user.id}: {str(e)}")
         await handle_error(callback, state, bot, "Ошибка. Попробуйте снова. 😔", "Ошибка получения страницы истории", e)
@@ -932,56 +907,52 @@ async def show_booking_history_page(callback: CallbackQuery, state: FSMContext,
 
 
 @profile_router.callback_query(F.data.startswith("delete_booking_"))
-async def delete_booking(callback: CallbackQuery, state: FSMContext, bot: Bot):
+async def delete_booking(callback: CallbackQuery, state: FSMContext, bot: Bot, session: AsyncSession):
     """Удаление записи из истории."""
     booking_id = int(callback.data.replace("delete_booking_", ""))
     logger.info(f"Пользователь {callback.from_user.id} запросил удаление записи #{booking_id}")
     try:
-        with Session() as session:
-            booking = session.query(Booking).get(booking_id)
-            if not booking:
-                await handle_error(
-                    callback, state, bot,
-                    "Запись не найдена. 📝", f"Запись #{booking_id} не найдена", Exception("Booking not found")
-                )
-                await callback.answer()
-                return
-            if str(callback.from_user.id) != str(booking.user.telegram_id):
-                logger.warning(
-                    f"Несанкционированный доступ: user_id={callback.from_user.id} != telegram_id={booking.user.telegram_id}")
-                await callback.answer("Доступ только для владельца записи. 🔒")
-                return
-            if booking.status not in [BookingStatus.REJECTED, BookingStatus.CANCELLED]:
-                await callback.answer("Удалить можно только отменённые или отклонённые записи.")
-                return
-            session.delete(booking)
-            session.commit()
-            logger.info(f"Запись #{booking_id} удалена пользователем {callback.from_user.id}")
+        booking = await session.get(Booking, booking_id, options=[joinedload(Booking.user)])
+        if not booking:
+            await handle_error(
+                callback, state, bot,
+                "Запись не найдена. 📝", f"Запись #{booking_id} не найдена", Exception("Booking not found")
+            )
+            await callback.answer()
+            return
+        if str(callback.from_user.id) != str(booking.user.telegram_id):
+            logger.warning(
+                f"Несанкционированный доступ: user_id={callback.from_user.id} != telegram_id={booking.user.telegram_id}")
+            await callback.answer("Доступ только для владельца записи. 🔒")
+            return
+        if booking.status not in [BookingStatus.REJECTED, BookingStatus.CANCELLED]:
+            await callback.answer("Удалить можно только отменённые или отклонённые записи.")
+            return
+        await session.delete(booking)
+        await session.flush()
+        logger.info(f"Запись #{booking_id} удалена пользователем {callback.from_user.id}")
 
-            # Показать обновлённую историю
-            bookings = session.query(Booking).filter(
-                Booking.user_id == booking.user_id,
-                Booking.status.in_([BookingStatus.REJECTED, BookingStatus.CANCELLED, BookingStatus.COMPLETED])
-            ).order_by(Booking.date.desc()).all()
-            response = "📜 <b>История ваших записей</b>\nВыберите запись для просмотра:"
-            try:
-                sent_message = await send_message(
-                    bot, str(callback.message.chat.id), "photo",
-                    response,
-                    photo=get_photo_path("booking_history"),
-                    reply_markup=Keyboards.bookings_history_kb(bookings, page=0)
-                )
-            except FileNotFoundError as e:
-                logger.warning(f"Не удалось отправить фото booking_history: {str(e)}")
-                sent_message = await send_message(
-                    bot, str(callback.message.chat.id), "text",
-                    response,
-                    reply_markup=Keyboards.bookings_history_kb(bookings, page=0)
-                )
-            if sent_message:
-                await state.update_data(last_message_id=sent_message.message_id)
-                await state.set_state(ProfileStates.MainMenu)
-            await callback.answer("Запись удалена 🗑")
+        # Показать обновлённую историю
+        bookings = await get_user_bookings(session, callback.from_user.id, HISTORY_STATUSES, newest_first=True)
+        response = "📜 <b>История ваших записей</b>\nВыберите запись для просмотра:"
+        try:
+            sent_message = await send_message(
+                bot, str(callback.message.chat.id), "photo",
+                response,
+                photo=get_photo_path("booking_history"),
+                reply_markup=Keyboards.bookings_history_kb(bookings, page=0)
+            )
+        except FileNotFoundError as e:
+            logger.warning(f"Не удалось отправить фото booking_history: {str(e)}")
+            sent_message = await send_message(
+                bot, str(callback.message.chat.id), "text",
+                response,
+                reply_markup=Keyboards.bookings_history_kb(bookings, page=0)
+            )
+        if sent_message:
+            await state.update_data(last_message_id=sent_message.message_id)
+            await state.set_state(ProfileStates.MainMenu)
+        await callback.answer("Запись удалена 🗑")
     except Exception as e:
         logger.error(f"Ошибка удаления записи #{booking_id} для {callback.from_user.id}: {str(e)}")
         await handle_error(callback, state, bot, "Ошибка. Попробуйте снова. 😔", f"Ошибка удаления записи #{booking_id}",
@@ -990,43 +961,42 @@ async def delete_booking(callback: CallbackQuery, state: FSMContext, bot: Bot):
 
 
 @profile_router.callback_query(F.data.startswith("leave_review_"))
-async def start_leave_review(callback: CallbackQuery, state: FSMContext, bot: Bot):
+async def start_leave_review(callback: CallbackQuery, state: FSMContext, bot: Bot, session: AsyncSession):
     booking_id = int(callback.data.replace("leave_review_", ""))
     logger.info(f"Пользователь {callback.from_user.id} начал оставление отзыва для записи #{booking_id}")
     try:
-        with Session() as session:
-            booking = session.query(Booking).get(booking_id)
-            if not booking:
-                await handle_error(
-                    callback, state, bot,
-                    "Запись не найдена. 📝", f"Запись #{booking_id} не найдена", Exception("Booking not found")
-                )
-                await callback.answer()
-                return
-            if str(callback.from_user.id) != str(booking.user.telegram_id):
-                logger.warning(
-                    f"Несанкционированный доступ: user_id={callback.from_user.id} != telegram_id={booking.user.telegram_id}")
-                await callback.answer("Доступ только для владельца записи. 🔒")
-                return
-            if booking.status != BookingStatus.COMPLETED or booking.review:
-                await callback.answer("Отзыв можно оставить только для выполненных записей без отзыва.")
-                return
-            await state.update_data(booking_id=booking_id, review_photos=[], review_video=None)
-            sent_message = await send_message(
-                bot, str(callback.message.chat.id), "photo",
-                (await get_progress_bar(ProfileStates.AwaitingReviewRating, PROFILE_PROGRESS_STEPS, style="emoji")).format(
-                    message="⭐ Выберите рейтинг (1–5):"
-                ),
-                photo=get_photo_path("leave_review"),
-                reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-                    [InlineKeyboardButton(text=str(i), callback_data=f"rating_{i}") for i in range(1, 6)],
-                    [InlineKeyboardButton(text="Отмена 🚫", callback_data="cancel_review")]
-                ])
+        booking = await session.get(Booking, booking_id, options=[joinedload(Booking.user), joinedload(Booking.review)])
+        if not booking:
+            await handle_error(
+                callback, state, bot,
+                "Запись не найдена. 📝", f"Запись #{booking_id} не найдена", Exception("Booking not found")
             )
-            if sent_message:
-                await state.update_data(last_message_id=sent_message.message_id)
-            await state.set_state(ProfileStates.AwaitingReviewRating)
             await callback.answer()
+            return
+        if str(callback.from_user.id) != str(booking.user.telegram_id):
+            logger.warning(
+                f"Несанкционированный доступ: user_id={callback.from_user.id} != telegram_id={booking.user.telegram_id}")
+            await callback.answer("Доступ только для владельца записи. 🔒")
+            return
+        if booking.status != BookingStatus.COMPLETED or booking.review:
+            await callback.answer("Отзыв можно оставить только для выполненных записей без отзыва.")
+            return
+        await state.update_data(booking_id=booking_id, review_photos=[], review_video=None)
+        sent_message = await send_message(
+            bot, str(callback.message.chat.id), "photo",
+            (await get_progress_bar(ProfileStates.AwaitingReviewRating, PROFILE_PROGRESS_STEPS, style="emoji")).format(
+                message="⭐ Выберите рейтинг (1–5):"
+            ),
+            photo=get_photo_path("leave_review"),
+            reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+                [InlineKeyboardButton(text=str(i), callback_data=f"rating_{i}") for i in range(1, 6)],
+                [InlineKeyboardButton(text="Отмена 🚫", callback_data="cancel_review")]
+            ])
+        )
+        if sent_message:
+            await state.update_data(last_message_id=sent_message.message_id)
+        await state.set_state(ProfileStates.AwaitingReviewRating)
+        await callback.answer()
     except Exception as e:
         logger.error(f"Ошибка начала отзыва для записи #{booking_id}: {str(e)}")
         await handle_error(callback, state, bot, "Ошибка. Попробуйте снова. 😔", f"Ошибка начала отзыва #{booking_id}", e)
@@ -1256,7 +1226,7 @@ async def preview_review_media(callback: CallbackQuery, state: FSMContext, bot:
         await callback.answer()
 
 @profile_router.callback_query(ProfileStates.ConfirmReview, F.data == "save_review")
-async def save_review(callback: CallbackQuery, state: FSMContext, bot: Bot):
+async def save_review(callback: CallbackQuery, state: FSMContext, bot: Bot, session: AsyncSession):
     logger.info(f"Пользователь {callback.from_user.id} сохраняет отзыв")
     try:
         data = await state.get_data()
@@ -1265,58 +1235,58 @@ async def save_review(callback: CallbackQuery, state: FSMContext, bot: Bot):
         review_photos = data.get("review_photos", [])
         review_video = data.get("review_video")
         booking_id = data.get("booking_id")
-        with Session() as session:
-            review = Review(
-                user_id=session.query(User).filter_by(telegram_id=str(callback.from_user.id)).first().id,
-                booking_id=booking_id,
-                text=review_text,
-                rating=review_rating,
-                photo1=review_photos[0] if len(review_photos) > 0 else None,
-                photo2=review_photos[1] if len(review_photos) > 1 else None,
-                photo3=review_photos[2] if len(review_photos) > 2 else None,
-                video=review_video
+        review = Review(
+            user_id=(await session.scalar(select(User).filter_by(telegram_id=str(callback.from_user.id)))).id,
+            booking_id=booking_id,
+            text=review_text,
+            rating=review_rating,
+            photo1=review_photos[0] if len(review_photos) > 0 else None,
+            photo2=review_photos[1] if len(review_photos) > 1 else None,
+            photo3=review_photos[2] if len(review_photos) > 2 else None,
+            video=review_video
+        )
+        session.add(review)
+        await session.flush()
+        logger.info(f"Отзыв сохранён для записи #{booking_id}")
+        response = "⭐ Ваш отзыв успешно сохранён! Спасибо за обратную связь."
+        try:
+            sent_message = await send_message(
+                bot, str(callback.message.chat.id), "photo",
+                response,
+                photo=get_photo_path("review_saved"),
+                reply_markup=Keyboards.profile_menu_kb()
             )
-            session.add(review)
-            session.commit()
-            logger.info(f"Отзыв сохранён для записи #{booking_id}")
-            response = "⭐ Ваш отзыв успешно сохранён! Спасибо за обратную связь."
-            try:
-                sent_message = await send_message(
-                    bot, str(callback.message.chat.id), "photo",
-                    response,
-                    photo=get_photo_path("review_saved"),
-                    reply_markup=Keyboards.profile_menu_kb()
-                )
-            except FileNotFoundError as e:
-                logger.warning(f"Не удалось отправить фото review_saved: {str(e)}")
-                sent_message = await send_message(
-                    bot, str(callback.message.chat.id), "text",
-                    response,
-                    reply_markup=Keyboards.profile_menu_kb()
-                )
-            if sent_message:
-                await state.update_data(last_message_id=sent_message.message_id)
-                await state.set_state(ProfileStates.MainMenu)
-            await callback.answer()
-
-            booking = session.query(Booking).get(booking_id)
-            user = session.query(User).get(booking.user_id)
-            auto = session.query(Auto).get(booking.auto_id)
-            await send_booking_notification(
-                bot, ADMIN_ID, booking, user, auto,
-                f"Новый отзыв для записи #{booking_id}:\n"
-                f"Рейтинг: {'⭐' * review_rating}\n"
-                f"{review_text}\n"
-                f"Фотографий: {len(review_photos)}\n"
-                f"Видео: {'1' if review_video else '0'}"
+        except FileNotFoundError as e:
+            logger.warning(f"Не удалось отправить фото review_saved: {str(e)}")
+            sent_message = await send_message(
+                bot, str(callback.message.chat.id), "text",
+                response,
+                reply_markup=Keyboards.profile_menu_kb()
             )
+        if sent_message:
+            await state.update_data(last_message_id=sent_message.message_id)
+            await state.set_state(ProfileStates.MainMenu)
+        await callback.answer()
+
+        booking = await session.scalar(
+            select(Booking).options(joinedload(Booking.user), joinedload(Booking.auto)).filter_by(id=booking_id)
+        )
+        user, auto = booking.user, booking.auto
+        await send_booking_notification(
+            bot, ADMIN_ID, booking, user, auto,
+            f"Новый отзыв для записи #{booking_id}:\n"
+            f"Рейтинг: {'⭐' * review_rating}\n"
+            f"{review_text}\n"
+            f"Фотографий: {len(review_photos)}\n"
+            f"Видео: {'1' if review_video else '0'}"
+        )
     except Exception as e:
         logger.error(f"Ошибка сохранения отзыва для {callback.from_user.id}: {str(e)}")
         await handle_error(callback, state, bot, "Ошибка. Попробуйте снова. 😔", "Ошибка сохранения отзыва", e)
         await callback.answer()
 
 @profile_router.callback_query(ProfileStates.ConfirmReview, F.data == "cancel_review")
-async def cancel_review(callback: CallbackQuery, state: FSMContext, bot: Bot):
+async def cancel_review(callback: CallbackQuery, state: FSMContext, bot: Bot, session: AsyncSession):
     logger.info(f"Пользователь {callback.from_user.id} отменил отзыв")
     try:
         data = await state.get_data()
@@ -1328,30 +1298,25 @@ async def cancel_review(callback: CallbackQuery, state: FSMContext, bot: Bot):
         if review_video and os.path.exists(review_video):
             os.remove(review_video)
         response = "📜 <b>История ваших записей</b>\nВыберите запись для просмотра:"
-        with Session() as session:
-            user = session.query(User).filter_by(telegram_id=str(callback.from_user.id)).first()
-            bookings = session.query(Booking).filter(
-                Booking.user_id == user.id,
-                Booking.status.in_([BookingStatus.REJECTED, BookingStatus.CANCELLED, BookingStatus.COMPLETED])
-            ).order_by(Booking.date.desc()).all()
-            try:
-                sent_message = await send_message(
-                    bot, str(callback.message.chat.id), "photo",
-                    response,
-                    photo=get_photo_path("booking_history"),
-                    reply_markup=Keyboards.bookings_history_kb(bookings, page=0)
-                )
-            except FileNotFoundError as e:
-                logger.warning(f"Не удалось отправить фото booking_history: {str(e)}")
-                sent_message = await send_message(
-                    bot, str(callback.message.chat.id), "text",
-                    response,
-                    reply_markup=Keyboards.bookings_history_kb(bookings, page=0)
-                )
-            if sent_message:
-                await state.update_data(last_message_id=sent_message.message_id)
-                await state.set_state(ProfileStates.MainMenu)
-            await callback.answer("Отзыв отменён.")
+        bookings = await get_user_bookings(session, callback.from_user.id, HISTORY_STATUSES, newest_first=True)
+        try:
+            sent_message = await send_message(
+                bot, str(callback.message.chat.id), "photo",
+                response,
+                photo=get_photo_path("booking_history"),
+                reply_markup=Keyboards.bookings_history_kb(bookings, page=0)
+            )
+        except FileNotFoundError as e:
+            logger.warning(f"Не удалось отправить фото booking_history: {str(e)}")
+            sent_message = await send_message(
+                bot, str(callback.message.chat.id), "text",
+                response,
+                reply_markup=Keyboards.bookings_history_kb(bookings, page=0)
+            )
+        if sent_message:
+            await state.update_data(last_message_id=sent_message.message_id)
+            await state.set_state(ProfileStates.MainMenu)
+        await callback.answer("Отзыв отменён.")
     except Exception as e:
         logger.error(f"Ошибка отмены отзыва для {callback.from_user.id}: {str(e)}")
         await handle_error(callback, state, bot, "Ошибка. Попробуйте снова. 😔", "Ошибка отмены отзыва", e)
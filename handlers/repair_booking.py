@@ -3,60 +3,61 @@ from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKe
 from aiogram.fsm.context import FSMContext
 from config import get_photo_path, ADMIN_ID
 from keyboards.main_kb import Keyboards
-from database import User, Auto, Booking, BookingStatus, Session
+from database import User, Auto, Booking, BookingStatus
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
 from datetime import datetime
-import asyncio
 import re
 from .states import RepairBookingStates, REPAIR_PROGRESS_STEPS
 from utils import (
     get_progress_bar, send_message, handle_error, check_user_and_autos,
     master_only, get_booking_context, send_booking_notification, set_user_state,
-    notify_master, schedule_reminder, schedule_user_reminder, setup_logger, process_user_input
+    notify_master, schedule_reminder, schedule_user_reminder, setup_logger, process_user_input,
+    is_slot_free
 )
 
 repair_booking_router = Router()
 logger = setup_logger(__name__)
 
 @repair_booking_router.message(F.text == "Запись на ремонт")
-async def start_repair_booking(message: Message, state: FSMContext, bot: Bot):
+async def start_repair_booking(message: Message, state: FSMContext, bot: Bot, session: AsyncSession):
     """Запускает процесс записи на ремонт."""
     logger.info(f"Пользователь {message.from_user.id} начал запись на ремонт")
     try:
-        with Session() as session:
-            user, autos = await check_user_and_autos(session, str(message.from_user.id), bot, message, state, "booking_repair")
-            if not user:
-                logger.debug(f"Пользователь {message.from_user.id} не зарегистрирован, обработка завершена")
-                return
-            if autos:
-                response = (await get_progress_bar(RepairBookingStates.AwaitingAuto, REPAIR_PROGRESS_STEPS, style="emoji")).format(
-                    message="Выберите автомобиль для записи на ремонт: 🚗"
+        user, autos = await check_user_and_autos(session, str(message.from_user.id), bot, message, state, "booking_repair")
+        if not user:
+            logger.debug(f"Пользователь {message.from_user.id} не зарегистрирован, обработка завершена")
+            return
+        if autos:
+            response = (await get_progress_bar(RepairBookingStates.AwaitingAuto, REPAIR_PROGRESS_STEPS, style="emoji")).format(
+                message="Выберите автомобиль для записи на ремонт: 🚗"
+            )
+            try:
+                sent_message = await send_message(
+                    bot, str(message.chat.id), "photo",
+                    response,
+                    photo=get_photo_path("booking"),
+                    reply_markup=Keyboards.auto_selection_kb(autos)
                 )
-                try:
-                    sent_message = await send_message(
-                        bot, str(message.chat.id), "photo",
-                        response,
-                        photo=get_photo_path("booking"),
-                        reply_markup=Keyboards.auto_selection_kb(autos)
-                    )
-                except FileNotFoundError as e:
-                    logger.error(f"Фото booking не найдено: {str(e)}. Отправлено текстовое сообщение.")
-                    sent_message = await send_message(
-                        bot, str(message.chat.id), "text",
-                        response,
-                        reply_markup=Keyboards.auto_selection_kb(autos)
-                    )
-                if sent_message:
-                    await state.update_data(last_message_id=sent_message.message_id)
-                    await state.set_state(RepairBookingStates.AwaitingAuto)
-            else:
+            except FileNotFoundError as e:
+                logger.error(f"Фото booking не найдено: {str(e)}. Отправлено текстовое сообщение.")
                 sent_message = await send_message(
                     bot, str(message.chat.id), "text",
-                    "У вас нет зарегистрированных автомобилей. Добавьте автомобиль в личном кабинете. 🚗",
-                    reply_markup=Keyboards.profile_menu_kb()
+                    response,
+                    reply_markup=Keyboards.auto_selection_kb(autos)
                 )
-                if sent_message:
-                    await state.update_data(last_message_id=sent_message.message_id)
-                await state.clear()
+            if sent_message:
+                await state.update_data(last_message_id=sent_message.message_id)
+                await state.set_state(RepairBookingStates.AwaitingAuto)
+        else:
+            sent_message = await send_message(
+                bot, str(message.chat.id), "text",
+                "У вас нет зарегистрированных автомобилей. Добавьте автомобиль в личном кабинете. 🚗",
+                reply_markup=Keyboards.profile_menu_kb()
+            )
+            if sent_message:
+                await state.update_data(last_message_id=sent_message.message_id)
+            await state.clear()
     except Exception as e:
         logger.error(f"Неизвестная ошибка в start_repair_booking для user_id={message.from_user.id}: {str(e)}")
         await handle_error(message, state, bot,
@@ -64,39 +65,38 @@ async def start_repair_booking(message: Message, state: FSMContext, bot: Bot):
                            "Ошибка в start_repair_booking", e)
 
 @repair_booking_router.callback_query(RepairBookingStates.AwaitingAuto, F.data.startswith("auto_"))
-async def process_auto_selection(callback: CallbackQuery, state: FSMContext, bot: Bot):
+async def process_auto_selection(callback: CallbackQuery, state: FSMContext, bot: Bot, session: AsyncSession):
     """Обрабатывает выбор автомобиля."""
     auto_id = int(callback.data.replace("auto_", ""))
     try:
-        with Session() as session:
-            auto = session.query(Auto).get(auto_id)
-            if not auto:
-                await handle_error(callback, state, bot,
-                                   "Автомобиль не найден. Попробуйте снова. 🚗",
-                                   f"Автомобиль не найден для auto_id={auto_id}",
-                                   Exception("Автомобиль не найден"))
-                await callback.answer()
-                return
-            await state.update_data(auto_id=auto_id, photos=[])
-            response = (await get_progress_bar(RepairBookingStates.AwaitingProblemDescription, REPAIR_PROGRESS_STEPS, style="emoji")).format(
-                message="Опишите проблему с автомобилем (например, 'стук в подвеске'): 🔧"
-            )
-            try:
-                sent_message = await send_message(
-                    bot, str(callback.message.chat.id), "photo",
-                    response,
-                    photo=get_photo_path("repair_description")
-                )
-            except FileNotFoundError as e:
-                logger.error(f"Фото repair_description не найдено: {str(e)}. Отправлено текстовое сообщение.")
-                sent_message = await send_message(
-                    bot, str(callback.message.chat.id), "text",
-                    response
-                )
-            if sent_message:
-                await state.update_data(last_message_id=sent_message.message_id)
-                await state.set_state(RepairBookingStates.AwaitingProblemDescription)
+        auto = await session.get(Auto, auto_id)
+        if not auto:
+            await handle_error(callback, state, bot,
+                               "Автомобиль не найден. Попробуйте снова. 🚗",
+                               f"Автомобиль не найден для auto_id={auto_id}",
+                               Exception("Автомобиль не найден"))
             await callback.answer()
+            return
+        await state.update_data(auto_id=auto_id, photos=[])
+        response = (await get_progress_bar(RepairBookingStates.AwaitingProblemDescription, REPAIR_PROGRESS_STEPS, style="emoji")).format(
+            message="Опишите проблему с автомобилем (например, 'стук в подвеске'): 🔧"
+        )
+        try:
+            sent_message = await send_message(
+                bot, str(callback.message.chat.id), "photo",
+                response,
+                photo=get_photo_path("repair_description")
+            )
+        except FileNotFoundError as e:
+            logger.error(f"Фото repair_description не найдено: {str(e)}. Отправлено текстовое сообщение.")
+            sent_message = await send_message(
+                bot, str(callback.message.chat.id), "text",
+                response
+            )
+        if sent_message:
+            await state.update_data(last_message_id=sent_message.message_id)
+            await state.set_state(RepairBookingStates.AwaitingProblemDescription)
+        await callback.answer()
     except Exception as e:
         await handle_error(callback, state, bot,
                            "Ошибка. Попробуйте снова. 😔",
@@ -154,7 +154,7 @@ async def process_photo_upload(message: Message, state: FSMContext, bot: Bot):
         await state.update_data(last_message_id=sent_message.message_id)
 
 @repair_booking_router.callback_query(RepairBookingStates.AwaitingPhotos, F.data == "photos_ready")
-async def photos_ready(callback: CallbackQuery, state: FSMContext, bot: Bot):
+async def photos_ready(callback: CallbackQuery, state: FSMContext, bot: Bot, session: AsyncSession):
     """Обрабатывает завершение загрузки фотографий."""
     await state.update_data(service_name="Ремонт", service_duration=60, week_offset=0)
     response = (await get_progress_bar(RepairBookingStates.AwaitingDate, REPAIR_PROGRESS_STEPS, style="emoji")).format(
@@ -163,7 +163,7 @@ async def photos_ready(callback: CallbackQuery, state: FSMContext, bot: Bot):
     sent_message = await send_message(
         bot, str(callback.message.chat.id), "text",
         response,
-        reply_markup=Keyboards.calendar_kb()
+        reply_markup=await Keyboards.availability_calendar_kb(session, 60)
     )
     if sent_message:
         await state.update_data(last_message_id=sent_message.message_id)
@@ -171,7 +171,7 @@ async def photos_ready(callback: CallbackQuery, state: FSMContext, bot: Bot):
     await callback.answer()
 
 @repair_booking_router.callback_query(RepairBookingStates.AwaitingPhotos, F.data == "skip_photos")
-async def skip_photos(callback: CallbackQuery, state: FSMContext, bot: Bot):
+async def skip_photos(callback: CallbackQuery, state: FSMContext, bot: Bot, session: AsyncSession):
     """Обрабатывает пропуск загрузки фотографий."""
     await state.update_data(photos=[], service_name="Ремонт", service_duration=60, week_offset=0)
     response = (await get_progress_bar(RepairBookingStates.AwaitingDate, REPAIR_PROGRESS_STEPS, style="emoji")).format(
@@ -180,7 +180,7 @@ async def skip_photos(callback: CallbackQuery, state: FSMContext, bot: Bot):
     sent_message = await send_message(
         bot, str(callback.message.chat.id), "text",
         response,
-        reply_markup=Keyboards.calendar_kb()
+        reply_markup=await Keyboards.availability_calendar_kb(session, 60)
     )
     if sent_message:
         await state.update_data(last_message_id=sent_message.message_id)
@@ -201,74 +201,73 @@ async def cancel_action(callback: CallbackQuery, state: FSMContext, bot: Bot):
     await callback.answer()
 
 @repair_booking_router.callback_query(RepairBookingStates.AwaitingDate, F.data.startswith("prev_week_"))
-async def prev_week_selection(callback: CallbackQuery, state: FSMContext):
+async def prev_week_selection(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
     """Обрабатывает переход на предыдущую неделю."""
     week_offset = int(callback.data.replace("prev_week_", ""))
     data = await state.get_data()
     selected_date = data.get("selected_date")
     await state.update_data(week_offset=week_offset)
     await callback.message.edit_reply_markup(
-        reply_markup=Keyboards.calendar_kb(selected_date, week_offset)
+        reply_markup=await Keyboards.availability_calendar_kb(session, data["service_duration"], selected_date, week_offset)
     )
     await callback.answer()
 
 @repair_booking_router.callback_query(RepairBookingStates.AwaitingDate, F.data.startswith("next_week_"))
-async def next_week_selection(callback: CallbackQuery, state: FSMContext):
+async def next_week_selection(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
     """Обрабатывает переход на следующую неделю."""
     week_offset = int(callback.data.replace("next_week_", ""))
     data = await state.get_data()
     selected_date = data.get("selected_date")
     await state.update_data(week_offset=week_offset)
     await callback.message.edit_reply_markup(
-        reply_markup=Keyboards.calendar_kb(selected_date, week_offset)
+        reply_markup=await Keyboards.availability_calendar_kb(session, data["service_duration"], selected_date, week_offset)
     )
     await callback.answer()
 
 @repair_booking_router.callback_query(RepairBookingStates.AwaitingDate, F.data == "today")
-async def today_selection(callback: CallbackQuery, state: FSMContext):
+async def today_selection(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
     """Обрабатывает выбор текущего дня."""
     await state.update_data(week_offset=0)
     data = await state.get_data()
     selected_date = data.get("selected_date")
     await callback.message.edit_reply_markup(
-        reply_markup=Keyboards.calendar_kb(selected_date, 0)
+        reply_markup=await Keyboards.availability_calendar_kb(session, data["service_duration"], selected_date, 0)
     )
     await callback.answer()
 
 @repair_booking_router.callback_query(RepairBookingStates.AwaitingDate, F.data.startswith("date_"))
-async def process_date_selection(callback: CallbackQuery, state: FSMContext, bot: Bot):
+async def process_date_selection(callback: CallbackQuery, state: FSMContext, bot: Bot, session: AsyncSession):
     """Обрабатывает выбор даты."""
     date_str = callback.data.replace("date_", "")
     try:
         selected_date = datetime.strptime(date_str, "%Y-%m-%d")
         data = await state.get_data()
         week_offset = data.get("week_offset", 0)
-        with Session() as session:
-            time_slots = Keyboards.time_slots_kb(selected_date, data["service_duration"], session)
-            if not time_slots.inline_keyboard:
-                sent_message = await send_message(
-                    bot, str(callback.message.chat.id), "text",
-                    (await get_progress_bar(RepairBookingStates.AwaitingDate, REPAIR_PROGRESS_STEPS, style="emoji")).format(
-                        message="Нет доступных слотов на эту дату. Выберите другую дату: 📅"
-                    ),
-                    reply_markup=Keyboards.calendar_kb(selected_date, week_offset)
-                )
-                if sent_message:
-                    await state.update_data(last_message_id=sent_message.message_id)
-                await callback.answer()
-                return
-            await state.update_data(selected_date=selected_date, time_offset=0)
+        time_slots = await Keyboards.time_slots_kb(selected_date, data["service_duration"], session)
+        if not time_slots.inline_keyboard:
             sent_message = await send_message(
                 bot, str(callback.message.chat.id), "text",
-                (await get_progress_bar(RepairBookingStates.AwaitingTime, REPAIR_PROGRESS_STEPS, style="emoji")).format(
-                    message="Выберите <b>время</b> для записи: ⏰"
+                (await get_progress_bar(RepairBookingStates.AwaitingDate, REPAIR_PROGRESS_STEPS, style="emoji")).format(
+                    message="Нет доступных слотов на эту дату. Выберите другую дату: 📅"
                 ),
-                reply_markup=time_slots
+                reply_markup=await Keyboards.availability_calendar_kb(session, data["service_duration"], selected_date, week_offset)
             )
             if sent_message:
                 await state.update_data(last_message_id=sent_message.message_id)
-                await state.set_state(RepairBookingStates.AwaitingTime)
             await callback.answer()
+            return
+        await state.update_data(selected_date=selected_date, time_offset=0)
+        sent_message = await send_message(
+            bot, str(callback.message.chat.id), "text",
+            (await get_progress_bar(RepairBookingStates.AwaitingTime, REPAIR_PROGRESS_STEPS, style="emoji")).format(
+                message="Выберите <b>время</b> для записи: ⏰"
+            ),
+            reply_markup=time_slots
+        )
+        if sent_message:
+            await state.update_data(last_message_id=sent_message.message_id)
+            await state.set_state(RepairBookingStates.AwaitingTime)
+        await callback.answer()
     except ValueError:
         data = await state.get_data()
         week_offset = data.get("week_offset", 0)
@@ -277,108 +276,113 @@ async def process_date_selection(callback: CallbackQuery, state: FSMContext, bot
             (await get_progress_bar(RepairBookingStates.AwaitingDate, REPAIR_PROGRESS_STEPS, style="emoji")).format(
                 message="Некорректная дата. Выберите снова: 📅"
             ),
-            reply_markup=Keyboards.calendar_kb(week_offset=week_offset)
+            reply_markup=await Keyboards.availability_calendar_kb(session, data["service_duration"], week_offset=week_offset)
         )
         if sent_message:
             await state.update_data(last_message_id=sent_message.message_id)
         await callback.answer()
 
 @repair_booking_router.callback_query(RepairBookingStates.AwaitingTime, F.data.startswith("prev_slots_"))
-async def prev_slots_selection(callback: CallbackQuery, state: FSMContext):
+async def prev_slots_selection(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
     """Обрабатывает переход к предыдущим временным слотам."""
     time_offset = int(callback.data.replace("prev_slots_", ""))
     data = await state.get_data()
     selected_date = data.get("selected_date")
     service_duration = data.get("service_duration")
     await state.update_data(time_offset=time_offset)
-    with Session() as session:
-        await callback.message.edit_reply_markup(
-            reply_markup=Keyboards.time_slots_kb(selected_date, service_duration, session, time_offset)
-        )
+    await callback.message.edit_reply_markup(
+        reply_markup=await Keyboards.time_slots_kb(selected_date, service_duration, session, time_offset)
+    )
     await callback.answer()
 
 @repair_booking_router.callback_query(RepairBookingStates.AwaitingTime, F.data.startswith("next_slots_"))
-async def next_slots_selection(callback: CallbackQuery, state: FSMContext):
+async def next_slots_selection(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
     """Обрабатывает переход к следующим временным слотам."""
     time_offset = int(callback.data.replace("next_slots_", ""))
     data = await state.get_data()
     selected_date = data.get("selected_date")
     service_duration = data.get("service_duration")
     await state.update_data(time_offset=time_offset)
-    with Session() as session:
-        await callback.message.edit_reply_markup(
-            reply_markup=Keyboards.time_slots_kb(selected_date, service_duration, session, time_offset)
-        )
+    await callback.message.edit_reply_markup(
+        reply_markup=await Keyboards.time_slots_kb(selected_date, service_duration, session, time_offset)
+    )
     await callback.answer()
 
 @repair_booking_router.callback_query(RepairBookingStates.AwaitingTime, F.data.startswith("time_"))
-async def process_time_selection(callback: CallbackQuery, state: FSMContext, bot: Bot):
+async def process_time_selection(callback: CallbackQuery, state: FSMContext, bot: Bot, session: AsyncSession):
     """Обрабатывает выбор времени и создает запись."""
     time_str = callback.data.replace("time_", "")
     try:
         selected_time = datetime.strptime(time_str, "%H:%M").time()
         data = await state.get_data()
         photos = data.get("photos", [])
-        with Session() as session:
-            user = session.query(User).filter_by(telegram_id=str(callback.from_user.id)).first()
-            auto = session.query(Auto).get(data["auto_id"])
-            if not auto:
-                await handle_error(callback, state, bot,
-                                   "Автомобиль не найден. Начните заново. 🚗",
-                                   f"Автомобиль не найден для auto_id={data['auto_id']}",
-                                   Exception("Автомобиль не найден"))
-                await callback.answer()
-                return
-            booking = Booking(
-                user_id=user.id,
-                auto_id=data["auto_id"],
-                service_name="Ремонт",
-                problem_description=data.get("problem_description", ""),
-                photo1=photos[0] if photos else None,
-                photo2=photos[1] if len(photos) > 1 else None,
-                photo3=photos[2] if len(photos) > 2 else None,
-                date=data["selected_date"].date(),
-                time=selected_time,
-                status=BookingStatus.PENDING
-            )
-            session.add(booking)
-            session.commit()
-            logger.info(f"Запись на ремонт создана: booking_id={booking.id}, user_id={callback.from_user.id}")
-            notification_text = (
-                f"Новая запись на ремонт #{booking.id} ожидает оценки: 📝\n"
-                f"<b>Описание проблемы:</b> {data.get('problem_description', 'Не указано')}\n"
-                f"<b>Авто:</b> {auto.brand}, {auto.year}, {auto.license_plate}\n"
-                f"<b>Дата:</b> {booking.date.strftime('%d.%m.%Y')}\n"
-                f"<b>Время:</b> {booking.time.strftime('%H:%M')}"
-            )
-            keyboard = InlineKeyboardMarkup(inline_keyboard=[[
-                InlineKeyboardButton(text="Оценить ремонт 🔧", callback_data=f"evaluate_booking_{booking.id}"),
-                InlineKeyboardButton(text="Отказаться ❌", callback_data=f"reject_booking_{booking.id}")
-            ]])
-            success = await send_message(
-                bot, ADMIN_ID, "text",
-                notification_text,
-                reply_markup=keyboard
-            )
-            if not success:
-                logger.error(f"Не удалось уведомить мастера о записи booking_id={booking.id}, user_id={callback.from_user.id}")
-            if photos:
-                for i, photo_id in enumerate(photos, 1):
-                    await bot.send_photo(
-                        chat_id=ADMIN_ID,
-                        photo=photo_id,
-                        caption=f"Фото {i} для записи #{booking.id}"
-                    )
-            sent_message = await send_message(
-                bot, str(callback.message.chat.id), "text",
-                f"Ваша заявка на ремонт отправлена мастеру. Ожидайте оценки стоимости и времени. ⏳\n"
-                f"<b>Проблема:</b> {data.get('problem_description', 'Не указано')} 🔧",
-                reply_markup=Keyboards.main_menu_kb()
-            )
-            if sent_message:
-                await state.update_data(last_message_id=sent_message.message_id)
-            await state.clear()
+        user = await session.scalar(select(User).filter_by(telegram_id=str(callback.from_user.id)))
+        auto = await session.get(Auto, data["auto_id"])
+        if not auto:
+            await handle_error(callback, state, bot,
+                               "Автомобиль не найден. Начните заново. 🚗",
+                               f"Автомобиль не найден для auto_id={data['auto_id']}",
+                               Exception("Автомобиль не найден"))
             await callback.answer()
+            return
+        if not await is_slot_free(session, data["selected_date"].date(), selected_time, data["service_duration"]):
+            logger.info(f"Время {time_str} на {data['selected_date'].date()} уже занято, user_id={callback.from_user.id}")
+            await callback.message.edit_reply_markup(
+                reply_markup=await Keyboards.time_slots_kb(data["selected_date"], data["service_duration"], session)
+            )
+            await callback.answer("Это время уже занято. Выберите другое. ⏰", show_alert=True)
+            return
+        booking = Booking(
+            user_id=user.id,
+            auto_id=data["auto_id"],
+            service_name="Ремонт",
+            service_duration=data["service_duration"],
+            problem_description=data.get("problem_description", ""),
+            photo1=photos[0] if photos else None,
+            photo2=photos[1] if len(photos) > 1 else None,
+            photo3=photos[2] if len(photos) > 2 else None,
+            date=data["selected_date"].date(),
+            time=selected_time,
+            status=BookingStatus.PENDING
+        )
+        session.add(booking)
+        await session.flush()
+        logger.info(f"Запись на ремонт создана: booking_id={booking.id}, user_id={callback.from_user.id}")
+        notification_text = (
+            f"Новая запись на ремонт #{booking.id} ожидает оценки: 📝\n"
+            f"<b>Описание проблемы:</b> {data.get('problem_description', 'Не указано')}\n"
+            f"<b>Авто:</b> {auto.brand}, {auto.year}, {auto.license_plate}\n"
+            f"<b>Дата:</b> {booking.date.strftime('%d.%m.%Y')}\n"
+            f"<b>Время:</b> {booking.time.strftime('%H:%M')}"
+        )
+        keyboard = InlineKeyboardMarkup(inline_keyboard=[[
+            InlineKeyboardButton(text="Оценить ремонт 🔧", callback_data=f"evaluate_booking_{booking.id}"),
+            InlineKeyboardButton(text="Отказаться ❌", callback_data=f"reject_booking_{booking.id}")
+        ]])
+        success = await send_message(
+            bot, ADMIN_ID, "text",
+            notification_text,
+            reply_markup=keyboard
+        )
+        if not success:
+            logger.error(f"Не удалось уведомить мастера о записи booking_id={booking.id}, user_id={callback.from_user.id}")
+        if photos:
+            for i, photo_id in enumerate(photos, 1):
+                await bot.send_photo(
+                    chat_id=ADMIN_ID,
+                    photo=photo_id,
+                    caption=f"Фото {i} для записи #{booking.id}"
+                )
+        sent_message = await send_message(
+            bot, str(callback.message.chat.id), "text",
+            f"Ваша заявка на ремонт отправлена мастеру. Ожидайте оценки стоимости и времени. ⏳\n"
+            f"<b>Проблема:</b> {data.get('problem_description', 'Не указано')} 🔧",
+            reply_markup=Keyboards.main_menu_kb()
+        )
+        if sent_message:
+            await state.update_data(last_message_id=sent_message.message_id)
+        await state.clear()
+        await callback.answer()
     except Exception as e:
         await handle_error(callback, state, bot,
                            "Ошибка записи. Попробуйте снова. 😔",
@@ -387,15 +391,14 @@ async def process_time_selection(callback: CallbackQuery, state: FSMContext, bot
 
 @repair_booking_router.callback_query(F.data.startswith("evaluate_booking_"))
 @master_only
-async def evaluate_booking(callback: CallbackQuery, state: FSMContext, bot: Bot):
+async def evaluate_booking(callback: CallbackQuery, state: FSMContext, bot: Bot, session: AsyncSession):
     """Мастер оценивает стоимость и время ремонта."""
     booking_id = int(callback.data.replace("evaluate_booking_", ""))
     try:
-        with Session() as session:
-            booking, _, _ = await get_booking_context(session, booking_id, bot, callback, state)
-            if not booking:
-                await callback.answer()
-                return
+        booking, _, _ = await get_booking_context(session, booking_id, bot, callback, state)
+        if not booking:
+            await callback.answer()
+            return
         await state.update_data(booking_id=booking_id, master_action="evaluate")
         sent_message = await send_message(
             bot, str(callback.message.chat.id), "text",
@@ -414,7 +417,7 @@ async def evaluate_booking(callback: CallbackQuery, state: FSMContext, bot: Bot)
 
 @repair_booking_router.message(RepairBookingStates.AwaitingMasterEvaluation, F.text)
 @master_only
-async def process_master_evaluation(message: Message, state: FSMContext, bot: Bot):
+async def process_master_evaluation(message: Message, state: FSMContext, bot: Bot, session: AsyncSession):
     """Обрабатывает ввод стоимости и длительности мастером."""
     data = await state.get_data()
     booking_id = data.get("booking_id")
@@ -428,22 +431,21 @@ async def process_master_evaluation(message: Message, state: FSMContext, bot: Bo
         if cost < 0 or hours <= 0:
             raise ValueError("Стоимость и длительность должны быть положительными")
         duration = int(hours * 60)  # Конвертация часов в минуты
-        with Session() as session:
-            booking, _, _ = await get_booking_context(session, booking_id, bot, message, state)
-            if not booking:
-                return
-            await state.update_data(cost=cost, duration=duration)
-            sent_message = await send_message(
-                bot, str(message.chat.id), "text",
-                f"Текущее время записи: {booking.time.strftime('%H:%M')}. Хотите изменить время? ⏰",
-                reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-                    [InlineKeyboardButton(text="Оставить текущее время ✅", callback_data=f"keep_time_{booking_id}")],
-                    [InlineKeyboardButton(text="Выбрать новое время ⏰", callback_data=f"change_time_{booking_id}")]
-                ])
-            )
-            if sent_message:
-                await state.update_data(last_message_id=sent_message.message_id)
-            await state.set_state(RepairBookingStates.AwaitingMasterTimeSelection)
+        booking, _, _ = await get_booking_context(session, booking_id, bot, message, state)
+        if not booking:
+            return
+        await state.update_data(cost=cost, duration=duration)
+        sent_message = await send_message(
+            bot, str(message.chat.id), "text",
+            f"Текущее время записи: {booking.time.strftime('%H:%M')}. Хотите изменить время? ⏰",
+            reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+                [InlineKeyboardButton(text="Оставить текущее время ✅", callback_data=f"keep_time_{booking_id}")],
+                [InlineKeyboardButton(text="Выбрать новое время ⏰", callback_data=f"change_time_{booking_id}")]
+            ])
+        )
+        if sent_message:
+            await state.update_data(last_message_id=sent_message.message_id)
+        await state.set_state(RepairBookingStates.AwaitingMasterTimeSelection)
     except ValueError as e:
         logger.warning(f"Некорректный формат ввода для booking_id={booking_id}: {str(e)}")
         sent_message = await send_message(
@@ -459,47 +461,46 @@ async def process_master_evaluation(message: Message, state: FSMContext, bot: Bo
 
 @repair_booking_router.callback_query(RepairBookingStates.AwaitingMasterTimeSelection, F.data.startswith("keep_time_"))
 @master_only
-async def keep_time(callback: CallbackQuery, state: FSMContext, bot: Bot):
+async def keep_time(callback: CallbackQuery, state: FSMContext, bot: Bot, session: AsyncSession):
     """Мастер оставляет текущее время."""
     booking_id = int(callback.data.replace("keep_time_", ""))
     try:
         data = await state.get_data()
         cost = data.get("cost")
         duration = data.get("duration")
-        with Session() as session:
-            booking, user, auto = await get_booking_context(session, booking_id, bot, callback, state)
-            if not booking:
-                await callback.answer()
-                return
-            booking.cost = cost
-            booking.service_duration = duration
-            session.commit()
-            notification_text = (
-                f"Мастер оценил ремонт #{booking_id}:\n"
-                f"<b>Стоимость:</b> {cost:.2f} руб.\n"
-                f"<b>Длительность:</b> {duration // 60} ч.\n"
-                f"<b>Дата:</b> {booking.date.strftime('%d.%m.%Y')}\n"
-                f"<b>Время:</b> {booking.time.strftime('%H:%M')}\n"
-                f"<b>Проблема:</b> {booking.problem_description or 'Не указано'}"
-            )
-            keyboard = InlineKeyboardMarkup(inline_keyboard=[[
-                InlineKeyboardButton(text="Подтвердить ✅", callback_data=f"confirm_booking_{booking_id}"),
-                InlineKeyboardButton(text="Отказаться ❌", callback_data=f"reject_booking_{booking_id}")
-            ]])
-            success = await send_booking_notification(
-                bot, user.telegram_id, booking, user, auto,
-                notification_text,
-                keyboard
-            )
-            if not success:
-                logger.error(f"Не удалось уведомить пользователя о оценке booking_id={booking_id}, user_id={user.telegram_id}")
-            sent_message = await send_message(
-                bot, str(callback.message.chat.id), "text",
-                f"Оценка отправлена пользователю: {cost:.2f} руб., {duration // 60} ч. Ожидается подтверждение. ⏳"
-            )
-            if sent_message:
-                await state.update_data(last_message_id=sent_message.message_id)
-            await state.clear()
+        booking, user, auto = await get_booking_context(session, booking_id, bot, callback, state)
+        if not booking:
+            await callback.answer()
+            return
+        booking.cost = cost
+        booking.service_duration = duration
+        await session.flush()
+        notification_text = (
+            f"Мастер оценил ремонт #{booking_id}:\n"
+            f"<b>Стоимость:</b> {cost:.2f} руб.\n"
+            f"<b>Длительность:</b> {duration // 60} ч.\n"
+            f"<b>Дата:</b> {booking.date.strftime('%d.%m.%Y')}\n"
+            f"<b>Время:</b> {booking.time.strftime('%H:%M')}\n"
+            f"<b>Проблема:</b> {booking.problem_description or 'Не указано'}"
+        )
+        keyboard = InlineKeyboardMarkup(inline_keyboard=[[
+            InlineKeyboardButton(text="Подтвердить ✅", callback_data=f"confirm_booking_{booking_id}"),
+            InlineKeyboardButton(text="Отказаться ❌", callback_data=f"reject_booking_{booking_id}")
+        ]])
+        success = await send_booking_notification(
+            bot, user.telegram_id, booking, user, auto,
+            notification_text,
+            keyboard
+        )
+        if not success:
+            logger.error(f"Не удалось уведомить пользователя о оценке booking_id={booking_id}, user_id={user.telegram_id}")
+        sent_message = await send_message(
+            bot, str(callback.message.chat.id), "text",
+            f"Оценка отправлена пользователю: {cost:.2f} руб., {duration // 60} ч. Ожидается подтверждение. ⏳"
+        )
+        if sent_message:
+            await state.update_data(last_message_id=sent_message.message_id)
+        await state.clear()
         await callback.answer()
     except Exception as e:
         await handle_error(callback, state, bot,
@@ -529,7 +530,7 @@ async def change_time(callback: CallbackQuery, state: FSMContext, bot: Bot):
 
 @repair_booking_router.message(RepairBookingStates.AwaitingMasterTime, F.text)
 @master_only
-async def process_master_time(message: Message, state: FSMContext, bot: Bot):
+async def process_master_time(message: Message, state: FSMContext, bot: Bot, session: AsyncSession):
     """Обрабатывает ввод нового времени мастером."""
     data = await state.get_data()
     booking_id = data.get("booking_id")
@@ -551,41 +552,49 @@ async def process_master_time(message: Message, state: FSMContext, bot: Bot):
             await state.update_data(last_message_id=sent_message.message_id)
         return
     try:
-        with Session() as session:
-            booking, user, auto = await get_booking_context(session, booking_id, bot, message, state)
-            if not booking:
-                return
-            new_time = datetime.strptime(time_str, "%H:%M").time()
-            booking.time = new_time
-            booking.cost = cost
-            booking.service_duration = duration
-            session.commit()
-            notification_text = (
-                f"Мастер оценил ремонт #{booking_id}:\n"
-                f"<b>Стоимость:</b> {cost:.2f} руб.\n"
-                f"<b>Длительность:</b> {duration // 60} ч.\n"
-                f"<b>Дата:</b> {booking.date.strftime('%d.%m.%Y')}\n"
-                f"<b>Время:</b> {booking.time.strftime('%H:%M')}\n"
-                f"<b>Проблема:</b> {booking.problem_description or 'Не указано'}"
-            )
-            keyboard = InlineKeyboardMarkup(inline_keyboard=[[
-                InlineKeyboardButton(text="Подтвердить ✅", callback_data=f"confirm_booking_{booking_id}"),
-                InlineKeyboardButton(text="Отказаться ❌", callback_data=f"reject_booking_{booking_id}")
-            ]])
-            success = await send_booking_notification(
-                bot, user.telegram_id, booking, user, auto,
-                notification_text,
-                keyboard
-            )
-            if not success:
-                logger.error(f"Не удалось уведомить пользователя о новом времени booking_id={booking_id}, user_id={user.telegram_id}")
+        booking, user, auto = await get_booking_context(session, booking_id, bot, message, state)
+        if not booking:
+            return
+        new_time = datetime.strptime(time_str, "%H:%M").time()
+        if not await is_slot_free(session, booking.date, new_time, duration, exclude_booking_id=booking.id):
+            logger.info(f"Время {time_str} на {booking.date} занято, оценка booking_id={booking_id} не отправлена")
             sent_message = await send_message(
                 bot, str(message.chat.id), "text",
-                f"Оценка отправлена пользователю: {cost:.2f} руб., {duration // 60} ч., время {new_time.strftime('%H:%M')}. Ожидается подтверждение. ⏳"
+                "Это время уже занято другой записью. Введите другое (например, <b>14:30</b>): ⏰"
             )
             if sent_message:
                 await state.update_data(last_message_id=sent_message.message_id)
-            await state.clear()
+            return
+        booking.time = new_time
+        booking.cost = cost
+        booking.service_duration = duration
+        await session.flush()
+        notification_text = (
+            f"Мастер оценил ремонт #{booking_id}:\n"
+            f"<b>Стоимость:</b> {cost:.2f} руб.\n"
+            f"<b>Длительность:</b> {duration // 60} ч.\n"
+            f"<b>Дата:</b> {booking.date.strftime('%d.%m.%Y')}\n"
+            f"<b>Время:</b> {booking.time.strftime('%H:%M')}\n"
+            f"<b>Проблема:</b> {booking.problem_description or 'Не указано'}"
+        )
+        keyboard = InlineKeyboardMarkup(inline_keyboard=[[
+            InlineKeyboardButton(text="Подтвердить ✅", callback_data=f"confirm_booking_{booking_id}"),
+            InlineKeyboardButton(text="Отказаться ❌", callback_data=f"reject_booking_{booking_id}")
+        ]])
+        success = await send_booking_notification(
+            bot, user.telegram_id, booking, user, auto,
+            notification_text,
+            keyboard
+        )
+        if not success:
+            logger.error(f"Не удалось уведомить пользователя о новом времени booking_id={booking_id}, user_id={user.telegram_id}")
+        sent_message = await send_message(
+            bot, str(message.chat.id), "text",
+            f"Оценка отправлена пользователю: {cost:.2f} руб., {duration // 60} ч., время {new_time.strftime('%H:%M')}. Ожидается подтверждение. ⏳"
+        )
+        if sent_message:
+            await state.update_data(last_message_id=sent_message.message_id)
+        await state.clear()
     except Exception as e:
         await handle_error(message, state, bot,
                            "Критическая ошибка. Попробуйте снова. 😔",
@@ -593,15 +602,14 @@ async def process_master_time(message: Message, state: FSMContext, bot: Bot):
 
 @repair_booking_router.callback_query(F.data.startswith("reject_booking_"))
 @master_only
-async def reject_booking(callback: CallbackQuery, state: FSMContext, bot: Bot):
+async def reject_booking(callback: CallbackQuery, state: FSMContext, bot: Bot, session: AsyncSession):
     """Мастер отказывается от ремонта."""
     booking_id = int(callback.data.replace("reject_booking_", ""))
     try:
-        with Session() as session:
-            booking, _, _ = await get_booking_context(session, booking_id, bot, callback, state)
-            if not booking:
-                await callback.answer()
-                return
+        booking, _, _ = await get_booking_context(session, booking_id, bot, callback, state)
+        if not booking:
+            await callback.answer()
+            return
         await state.update_data(booking_id=booking_id, master_action="reject")
         sent_message = await send_message(
             bot, str(callback.message.chat.id), "text",
@@ -619,7 +627,7 @@ async def reject_booking(callback: CallbackQuery, state: FSMContext, bot: Bot):
 
 @repair_booking_router.message(RepairBookingStates.AwaitingMasterRejectionReason, F.text)
 @master_only
-async def process_master_rejection(message: Message, state: FSMContext, bot: Bot):
+async def process_master_rejection(message: Message, state: FSMContext, bot: Bot, session: AsyncSession):
     """Обрабатывает причину отказа мастера."""
     data = await state.get_data()
     booking_id = data.get("booking_id")
@@ -638,77 +646,75 @@ async def process_master_rejection(message: Message, state: FSMContext, bot: Bot
             await state.update_data(last_message_id=sent_message.message_id)
         return
     try:
-        with Session() as session:
-            booking, user, auto = await get_booking_context(session, booking_id, bot, message, state)
-            if not booking:
-                return
-            booking.status = BookingStatus.REJECTED
-            booking.rejection_reason = rejection_reason
-            session.commit()
-            success = await send_booking_notification(
-                bot, user.telegram_id, booking, user, auto,
-                f"Мастер отказался от ремонта:\n<b>Причина:</b> {rejection_reason} ❌"
-            )
-            if not success:
-                logger.error(f"Не удалось уведомить пользователя об отказе booking_id={booking_id}, user_id={user.telegram_id}")
-            sent_message = await send_message(
-                bot, str(message.chat.id), "text",
-                f"Отказ отправлен пользователю: {rejection_reason}. ❌"
-            )
-            if sent_message:
-                await state.update_data(last_message_id=sent_message.message_id)
-            await state.clear()
+        booking, user, auto = await get_booking_context(session, booking_id, bot, message, state)
+        if not booking:
+            return
+        booking.status = BookingStatus.REJECTED
+        booking.rejection_reason = rejection_reason
+        await session.flush()
+        success = await send_booking_notification(
+            bot, user.telegram_id, booking, user, auto,
+            f"Мастер отказался от ремонта:\n<b>Причина:</b> {rejection_reason} ❌"
+        )
+        if not success:
+            logger.error(f"Не удалось уведомить пользователя об отказе booking_id={booking_id}, user_id={user.telegram_id}")
+        sent_message = await send_message(
+            bot, str(message.chat.id), "text",
+            f"Отказ отправлен пользователю: {rejection_reason}. ❌"
+        )
+        if sent_message:
+            await state.update_data(last_message_id=sent_message.message_id)
+        await state.clear()
     except Exception as e:
         await handle_error(message, state, bot,
                            "Критическая ошибка. Попробуйте снова. 😔",
                            f"Ошибка обработки отказа для booking_id={booking_id}", e)
 
 @repair_booking_router.callback_query(F.data.startswith("confirm_booking_"))
-async def confirm_booking(callback: CallbackQuery, state: FSMContext, bot: Bot):
+async def confirm_booking(callback: CallbackQuery, state: FSMContext, bot: Bot, session: AsyncSession):
     """Пользователь подтверждает запись."""
     booking_id = int(callback.data.replace("confirm_booking_", ""))
     try:
-        with Session() as session:
-            booking, user, auto = await get_booking_context(session, booking_id, bot, callback, state)
-            if not booking:
-                await callback.answer()
-                return
-            if str(callback.from_user.id) != str(booking.user.telegram_id):
-                logger.warning(f"Несанкционированный доступ: user_id={callback.from_user.id} != telegram_id={booking.user.telegram_id}")
-                await callback.answer("Доступ только для владельца записи. 🔒")
-                return
-            booking.status = BookingStatus.CONFIRMED
-            session.commit()
-            cost = booking.cost or 0
-            duration = booking.service_duration or 60
-            notification_text = (
-                f"Пользователь {user.first_name} {user.last_name} подтвердил запись на ремонт #{booking_id}: ✅\n"
-                f"<b>Стоимость:</b> {cost:.2f} руб.\n"
-                f"<b>Длительность:</b> {duration // 60} ч."
-            )
-            success = await send_booking_notification(
-                bot, ADMIN_ID, booking, user, auto,
-                notification_text
-            )
-            if not success:
-                logger.error(f"Не удалось уведомить мастера о подтверждении booking_id={booking_id}, user_id={user.telegram_id}")
-            sent_message = await send_message(
-                bot, str(callback.message.chat.id), "text",
-                f"Вы подтвердили запись на ремонт: ✅\n"
-                f"<b>Услуга:</b> Ремонт 🔧\n"
-                f"<b>Стоимость:</b> {cost:.2f} руб.\n"
-                f"<b>Длительность:</b> {duration // 60} ч.\n"
-                f"<b>Дата:</b> {booking.date.strftime('%d.%m.%Y')} 📅\n"
-                f"<b>Время:</b> {booking.time.strftime('%H:%M')} ⏰\n"
-                f"<b>Авто:</b> {auto.brand}, {auto.year}, {auto.license_plate} 🚗",
-                reply_markup=Keyboards.main_menu_kb()
-            )
-            if sent_message:
-                await state.update_data(last_message_id=sent_message.message_id)
-            asyncio.create_task(schedule_reminder(bot, booking, user, auto))
-            asyncio.create_task(schedule_user_reminder(bot, booking, user, auto))
-            await callback.answer("Запись подтверждена. ✅")
-            await state.clear()
+        booking, user, auto = await get_booking_context(session, booking_id, bot, callback, state)
+        if not booking:
+            await callback.answer()
+            return
+        if str(callback.from_user.id) != str(user.telegram_id):
+            logger.warning(f"Несанкционированный доступ: user_id={callback.from_user.id} != telegram_id={user.telegram_id}")
+            await callback.answer("Доступ только для владельца записи. 🔒")
+            return
+        booking.status = BookingStatus.CONFIRMED
+        await session.flush()
+        cost = booking.cost or 0
+        duration = booking.service_duration or 60
+        notification_text = (
+            f"Пользователь {user.first_name} {user.last_name} подтвердил запись на ремонт #{booking_id}: ✅\n"
+            f"<b>Стоимость:</b> {cost:.2f} руб.\n"
+            f"<b>Длительность:</b> {duration // 60} ч."
+        )
+        success = await send_booking_notification(
+            bot, ADMIN_ID, booking, user, auto,
+            notification_text
+        )
+        if not success:
+            logger.error(f"Не удалось уведомить мастера о подтверждении booking_id={booking_id}, user_id={user.telegram_id}")
+        sent_message = await send_message(
+            bot, str(callback.message.chat.id), "text",
+            f"Вы подтвердили запись на ремонт: ✅\n"
+            f"<b>Услуга:</b> Ремонт 🔧\n"
+            f"<b>Стоимость:</b> {cost:.2f} руб.\n"
+            f"<b>Длительность:</b> {duration // 60} ч.\n"
+            f"<b>Дата:</b> {booking.date.strftime('%d.%m.%Y')} 📅\n"
+            f"<b>Время:</b> {booking.time.strftime('%H:%M')} ⏰\n"
+            f"<b>Авто:</b> {auto.brand}, {auto.year}, {auto.license_plate} 🚗",
+            reply_markup=Keyboards.main_menu_kb()
+        )
+        if sent_message:
+            await state.update_data(last_message_id=sent_message.message_id)
+        await schedule_reminder(session, booking)
+        await schedule_user_reminder(session, booking, user)
+        await callback.answer("Запись подтверждена. ✅")
+        await state.clear()
     except Exception as e:
         await handle_error(callback, state, bot,
                            "Ошибка. Попробуйте снова. 😔",
@@ -716,46 +722,45 @@ async def confirm_booking(callback: CallbackQuery, state: FSMContext, bot: Bot):
         await callback.answer()
 
 @repair_booking_router.callback_query(F.data.startswith("reject_booking_"))
-async def reject_booking_user(callback: CallbackQuery, state: FSMContext, bot: Bot):
+async def reject_booking_user(callback: CallbackQuery, state: FSMContext, bot: Bot, session: AsyncSession):
     """Пользователь отклоняет запись."""
     booking_id = int(callback.data.replace("reject_booking_", ""))
     try:
-        with Session() as session:
-            booking, user, auto = await get_booking_context(session, booking_id, bot, callback, state)
-            if not booking:
-                await callback.answer()
-                return
-            if str(callback.from_user.id) != str(booking.user.telegram_id):
-                logger.warning(f"Несанкционированный доступ: user_id={callback.from_user.id} != telegram_id={booking.user.telegram_id}")
-                await callback.answer("Доступ только для владельца записи. 🔒")
-                return
-            booking.status = BookingStatus.REJECTED
-            booking.rejection_reason = "Пользователь отклонил запись"
-            session.commit()
-            cost = booking.cost or 0
-            duration = booking.service_duration or 60
-            success = await send_booking_notification(
-                bot, ADMIN_ID, booking, user, auto,
-                f"Пользователь {user.first_name} {user.last_name} отклонил запись на ремонт #{booking_id}:\n"
-                f"<b>Причина:</b> Пользователь отклонил запись ❌\n"
-                f"<b>Стоимость:</b> {cost:.2f} руб.\n"
-                f"<b>Длительность:</b> {duration} мин."
-            )
-            if not success:
-                logger.error(f"Не удалось уведомить мастера об отклонении booking_id={booking_id}, user_id={user.telegram_id}")
-            sent_message = await send_message(
-                bot, str(callback.message.chat.id), "text",
-                f"Вы отклонили запись на ремонт: ❌\n"
-                f"<b>Услуга:</b> Ремонт 🔧\n"
-                f"<b>Дата:</b> {booking.date.strftime('%d.%m.%Y')} 📅\n"
-                f"<b>Время:</b> {booking.time.strftime('%H:%M')} ⏰\n"
-                f"<b>Авто:</b> {auto.brand}, {auto.year}, {auto.license_plate} 🚗",
-                reply_markup=Keyboards.main_menu_kb()
-            )
-            if sent_message:
-                await state.update_data(last_message_id=sent_message.message_id)
-            await callback.answer("Запись отклонена. ❌")
-            await state.clear()
+        booking, user, auto = await get_booking_context(session, booking_id, bot, callback, state)
+        if not booking:
+            await callback.answer()
+            return
+        if str(callback.from_user.id) != str(user.telegram_id):
+            logger.warning(f"Несанкционированный доступ: user_id={callback.from_user.id} != telegram_id={user.telegram_id}")
+            await callback.answer("Доступ только для владельца записи. 🔒")
+            return
+        booking.status = BookingStatus.REJECTED
+        booking.rejection_reason = "Пользователь отклонил запись"
+        await session.flush()
+        cost = booking.cost or 0
+        duration = booking.service_duration or 60
+        success = await send_booking_notification(
+            bot, ADMIN_ID, booking, user, auto,
+            f"Пользователь {user.first_name} {user.last_name} отклонил запись на ремонт #{booking_id}:\n"
+            f"<b>Причина:</b> Пользователь отклонил запись ❌\n"
+            f"<b>Стоимость:</b> {cost:.2f} руб.\n"
+            f"<b>Длительность:</b> {duration} мин."
+        )
+        if not success:
+            logger.error(f"Не удалось уведомить мастера об отклонении booking_id={booking_id}, user_id={user.telegram_id}")
+        sent_message = await send_message(
+            bot, str(callback.message.chat.id), "text",
+            f"Вы отклонили запись на ремонт: ❌\n"
+            f"<b>Услуга:</b> Ремонт 🔧\n"
+            f"<b>Дата:</b> {booking.date.strftime('%d.%m.%Y')} 📅\n"
+            f"<b>Время:</b> {booking.time.strftime('%H:%M')} ⏰\n"
+            f"<b>Авто:</b> {auto.brand}, {auto.year}, {auto.license_plate} 🚗",
+            reply_markup=Keyboards.main_menu_kb()
+        )
+        if sent_message:
+            await state.update_data(last_message_id=sent_message.message_id)
+        await callback.answer("Запись отклонена. ❌")
+        await state.clear()
     except Exception as e:
         await handle_error(callback, state, bot,
             "Ошибка. Попробуйте снова. 😔",
@@ -1,10 +1,12 @@
 from aiogram.utils.keyboard import ReplyKeyboardBuilder
 from aiogram.types import ReplyKeyboardMarkup, InlineKeyboardMarkup, InlineKeyboardButton
 from config import SERVICES, WORKING_HOURS
-from database import Booking, BookingStatus
-from datetime import datetime, timedelta, time
-from sqlalchemy.orm import Session
-from utils import setup_logger
+from database import BookingStatus
+from repository import BookingView
+from datetime import datetime, timedelta, date as date_type
+from typing import Dict, List, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from utils import setup_logger, get_free_slots, get_week_free_counts
 
 logger = setup_logger(__name__)
 
@@ -90,12 +92,37 @@ class Keyboards:
         ])
 
     @staticmethod
-    def calendar_kb(selected_date: datetime = None, week_offset: int = 0) -> InlineKeyboardMarkup:
+    def calendar_dates(week_offset: int = 0) -> List[datetime]:
+        """Возвращает 7 рабочих дней, отображаемых в календаре для указанной недели."""
+        start_date = datetime.today() + timedelta(days=week_offset * 7)
+        valid_dates = []
+        current_date = start_date
+        while len(valid_dates) < 7:
+            if current_date.strftime("%A") not in WORKING_HOURS["weekends"]:
+                valid_dates.append(current_date)
+            current_date += timedelta(days=1)
+            if (current_date - start_date).days > 30:
+                break
+        return valid_dates
+
+    @staticmethod
+    async def availability_calendar_kb(session: AsyncSession, service_duration: int,
+                                       selected_date: datetime = None, week_offset: int = 0,
+                                       exclude_booking_id: Optional[int] = None) -> InlineKeyboardMarkup:
+        """Создаёт календарь с количеством свободных слотов на каждый день."""
+        valid_dates = Keyboards.calendar_dates(week_offset)
+        free_counts = await get_week_free_counts(session, [d.date() for d in valid_dates], service_duration,
+                                                 exclude_booking_id)
+        return Keyboards.calendar_kb(selected_date, week_offset, free_counts)
+
+    @staticmethod
+    def calendar_kb(selected_date: datetime = None, week_offset: int = 0,
+                    free_counts: Dict[date_type, int] = None) -> InlineKeyboardMarkup:
         """Создаёт инлайн-клавиатуру с доступными датами (7 рабочих дней, на русском)."""
         today = datetime.today()
         start_date = today + timedelta(days=week_offset * 7)
         keyboard = []
-        valid_dates = []
+        valid_dates = Keyboards.calendar_dates(week_offset)
 
         day_names = {
             "Monday": "Понедельник",
@@ -116,14 +143,6 @@ class Keyboards:
             "Sunday": "⚪"
         }
 
-        current_date = start_date
-        while len(valid_dates) < 7:
-            if current_date.strftime("%A") not in WORKING_HOURS["weekends"]:
-                valid_dates.append(current_date)
-            current_date += timedelta(days=1)
-            if (current_date - start_date).days > 30:
-                break
-
         for i in range(0, len(valid_dates), 2):
             row = []
             for date in valid_dates[i:i+2]:
@@ -131,6 +150,14 @@ class Keyboards:
                 emoji = day_emojis[date.strftime("%A")]
                 callback_data = f"date_{date.strftime('%Y-%m-%d')}"
                 text = f"{emoji} {date.strftime('%d.%m')} {day_name}"
+                if free_counts is not None:
+                    free = free_counts.get(date.date(), 0)
+                    if free:
+                        text = f"{text} ({free})"
+                    else:
+                        # Занятый день остаётся в сетке, но не ведёт к пустому списку слотов
+                        text = f"⛔ {date.strftime('%d.%m')} {day_name} — занято"
+                        callback_data = f"full_{date.strftime('%Y-%m-%d')}"
                 if selected_date and selected_date.date() == date.date():
                     text = f"✅ {text}"
                 row.append(InlineKeyboardButton(text=text, callback_data=callback_data))
@@ -149,43 +176,11 @@ class Keyboards:
         return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
     @staticmethod
-    def time_slots_kb(date: datetime, service_duration: int, session: Session,
-                      time_offset: int = 0) -> InlineKeyboardMarkup:
+    async def time_slots_kb(date: datetime, service_duration: int, session: AsyncSession,
+                            time_offset: int = 0, exclude_booking_id: Optional[int] = None) -> InlineKeyboardMarkup:
         """Создаёт инлайн-клавиатуру с доступными временными слотами."""
-        start_hour = int(WORKING_HOURS["start"].split(":")[0])
-        start_minute = int(WORKING_HOURS["start"].split(":")[1])
-        end_hour = int(WORKING_HOURS["end"].split(":")[0])
-        end_minute = int(WORKING_HOURS["end"].split(":")[1])
         keyboard = []
-        valid_slots = []
-
-        existing_bookings = session.query(Booking).filter(
-            Booking.date == date.date(),
-            Booking.status != BookingStatus.REJECTED
-        ).all()
-        booked_slots = []
-        for b in existing_bookings:
-            start_time = b.time
-            duration = SERVICES[[s["name"] for s in SERVICES].index(b.service_name)]["duration_minutes"] if b.service_name != "Ремонт" else 60
-            end_time = (datetime.combine(date.today(), start_time) + timedelta(minutes=duration)).time()
-            booked_slots.append((start_time, end_time))
-
-        current_time = datetime.combine(date.today(), time(hour=start_hour, minute=start_minute))
-        end_time = datetime.combine(date.today(), time(hour=end_hour, minute=end_minute))
-        while current_time < end_time:
-            slot_end = current_time + timedelta(minutes=service_duration)
-            if slot_end > end_time:
-                break
-            is_booked = False
-            for booked_start, booked_end in booked_slots:
-                booked_start_dt = datetime.combine(date.today(), booked_start)
-                booked_end_dt = datetime.combine(date.today(), booked_end)
-                if (current_time < booked_end_dt and slot_end > booked_start_dt):
-                    is_booked = True
-                    break
-            if not is_booked:
-                valid_slots.append(current_time.time())
-            current_time += timedelta(minutes=30)
+        valid_slots = await get_free_slots(session, date.date(), service_duration, exclude_booking_id)
 
         start_index = time_offset * 6
         display_slots = valid_slots[start_index:start_index + 6]
@@ -210,7 +205,7 @@ class Keyboards:
         return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
     @staticmethod
-    def bookings_kb(bookings: list) -> InlineKeyboardMarkup:
+    def bookings_kb(bookings: List[BookingView]) -> InlineKeyboardMarkup:
         """Создаёт инлайн-клавиатуру со списком записей."""
         keyboard = []
         for booking in bookings:
@@ -263,7 +258,7 @@ class Keyboards:
         ])
 
     @staticmethod
-    def bookings_history_kb(bookings: list, page: int = 0, bookings_per_page: int = 5) -> InlineKeyboardMarkup:
+    def bookings_history_kb(bookings: List[BookingView], page: int = 0, bookings_per_page: int = 5) -> InlineKeyboardMarkup:
         """Создаёт инлайн-клавиатуру для истории записей с пагинацией."""
         keyboard = []
         start_idx = page * bookings_per_page
@@ -284,7 +279,7 @@ class Keyboards:
             )
             keyboard.append([InlineKeyboardButton(text=text, callback_data=f"view_booking_{booking.id}")])
             buttons = []
-            if booking.status == BookingStatus.COMPLETED and not booking.review:
+            if booking.status == BookingStatus.COMPLETED and not booking.has_review:
                 buttons.append(
                     InlineKeyboardButton(text="Оставить отзыв ⭐", callback_data=f"leave_review_{booking.id}"))
             if booking.status in [BookingStatus.REJECTED, BookingStatus.CANCELLED]:
@@ -1,44 +1,67 @@
 import asyncio
 from aiogram import Bot, Dispatcher
-from aiogram.fsm.storage.memory import MemoryStorage
-from config import BOT_TOKEN
-from database import init_db
+from config import BOT_TOKEN, BOT_MODE
+from database import init_db, close_db, async_engine, AsyncSessionLocal
 from handlers import all_handlers
-from utils import setup_logger, on_start, on_shutdown, start_status_updater
+from middlewares import DbSessionMiddleware, OutboundRequestMiddleware
+from utils import (setup_logger, on_start, on_shutdown, start_status_updater, outbound_dispatcher, create_fsm_storage,
+                   create_events_isolation)
+from webhook import run_webhook
 
 
 logger = setup_logger(__name__)
 
+def configure_dispatcher(dp: Dispatcher):
+    """Регистрирует middleware и обработчики диспетчера."""
+    # Одна сессия БД на апдейт: обработчики получают её аргументом session
+    dp.update.outer_middleware(DbSessionMiddleware(AsyncSessionLocal, async_engine))
+    dp.include_router(all_handlers)
+
+def configure_bot(bot: Bot):
+    """Пропускает исходящие сообщения бота через очередь с лимитами Telegram."""
+    bot.session.middleware(OutboundRequestMiddleware(outbound_dispatcher))
+
 async def main():
     """Точка входа бота."""
     bot = Bot(token=BOT_TOKEN)
-    dp = Dispatcher(storage=MemoryStorage())
+    configure_bot(bot)
+    # Состояния пользователей переживают перезапуск бота; с FSM_STORAGE=redis их видят все процессы
+    storage = create_fsm_storage()
+    dp = Dispatcher(storage=storage, events_isolation=create_events_isolation(storage))
     dp["bot"] = bot
 
     # Инициализация базы данных
     try:
-        Session = init_db()
-        dp["session"] = Session
+        await init_db()
         logger.info("База данных успешно инициализирована")
     except Exception as e:
         logger.error(f"Ошибка инициализации базы данных: {str(e)}")
         return
 
-    # Регистрация всех обработчиков
-    dp.include_router(all_handlers)
+    # Регистрация middleware и всех обработчиков
+    configure_dispatcher(dp)
     start_status_updater()
 
     # Регистрация функций startup и shutdown
     dp.startup.register(on_start)
+    # Хранилище FSM закрывает on_shutdown после остановки фоновых задач, а не aiogram до них
+    dp.shutdown.handlers = [handler for handler in dp.shutdown.handlers if handler.callback != dp.fsm.close]
     dp.shutdown.register(on_shutdown)
 
     try:
-        logger.info("Запуск бота")
-        await dp.start_polling(bot)
+        if BOT_MODE == "webhook":
+            logger.info("Запуск бота в режиме вебхука")
+            await run_webhook(dp, bot)
+        else:
+            logger.info("Запуск бота")
+            # Вебхук, оставшийся от запуска в другом режиме, не даёт получать апдейты через getUpdates
+            await bot.delete_webhook()
+            await dp.start_polling(bot)
     except Exception as e:
         logger.error(f"Ошибка работы бота: {str(e)}")
     finally:
         await bot.session.close()
+        await close_db()
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,9 @@
+from .db_session import DbSessionMiddleware
+from .outbound import OutboundRequestMiddleware
+from .webhook_reply import WebhookReplyMiddleware, webhook_reply
+
+__all__ = [
+    'DbSessionMiddleware',
+    'OutboundRequestMiddleware',
+    'WebhookReplyMiddleware', 'webhook_reply',
+]
@@ -0,0 +1,64 @@
+import asyncio
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Optional
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import async_sessionmaker, AsyncEngine
+from utils import setup_logger
+
+logger = setup_logger(__name__)
+
+# Счётчик SQL-выражений текущего апдейта: [задача апдейта, число выражений]
+_statement_counter: ContextVar[Optional[list]] = ContextVar("statement_counter", default=None)
+
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    """Увеличивает счётчик SQL-выражений текущего апдейта."""
+    counter = _statement_counter.get()
+    # Задачи, запущенные из обработчика, наследуют контекст, но работают со своими сессиями
+    if counter is not None and counter[0] is asyncio.current_task():
+        counter[1] += 1
+
+class DbSessionMiddleware(BaseMiddleware):
+    """Открывает одну сессию БД на апдейт, передаёт её обработчику и фиксирует транзакцию в конце."""
+
+    def __init__(self, session_factory: async_sessionmaker, engine: AsyncEngine):
+        self.session_factory = session_factory
+        self.updates = 0
+        self.statements = 0
+        self.max_statements = 0
+        event.listen(engine.sync_engine, "before_cursor_execute", _count_statement)
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        counter = [asyncio.current_task(), 0]
+        token = _statement_counter.set(counter)
+        try:
+            async with self.session_factory() as session:
+                data["session"] = session
+                try:
+                    result = await handler(event, data)
+                    await session.commit()
+                except Exception:
+                    await session.rollback()
+                    raise
+            return result
+        finally:
+            _statement_counter.reset(token)
+            self.updates += 1
+            self.statements += counter[1]
+            self.max_statements = max(self.max_statements, counter[1])
+            logger.debug(f"Апдейт {getattr(event, 'update_id', '?')}: выполнено SQL-запросов: {counter[1]}")
+
+    def get_stats(self) -> dict:
+        """Возвращает статистику SQL-запросов по апдейтам."""
+        return {
+            "updates": self.updates,
+            "statements": self.statements,
+            "avg_statements": round(self.statements / self.updates, 2) if self.updates else 0,
+            "max_statements": self.max_statements
+        }
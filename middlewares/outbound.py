@@ -0,0 +1,24 @@
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import (TelegramMethod, Response, SendMessage, SendPhoto, SendVideo, SendDocument,
+                             SendMediaGroup, CopyMessage, ForwardMessage, EditMessageText, EditMessageCaption,
+                             EditMessageMedia, EditMessageReplyMarkup)
+from utils.outbound import OutboundDispatcher
+
+# Методы, которые Telegram считает сообщениями в чат и ограничивает по частоте
+RATE_LIMITED_METHODS = (
+    SendMessage, SendPhoto, SendVideo, SendDocument, SendMediaGroup, CopyMessage, ForwardMessage,
+    EditMessageText, EditMessageCaption, EditMessageMedia, EditMessageReplyMarkup,
+)
+
+class OutboundRequestMiddleware(BaseRequestMiddleware):
+    """Пропускает исходящие сообщения бота через очередь с лимитами частоты."""
+
+    def __init__(self, dispatcher: OutboundDispatcher):
+        self.dispatcher = dispatcher
+
+    async def __call__(self, make_request: NextRequestMiddlewareType, bot: Bot, method: TelegramMethod) -> Response:
+        chat_id = getattr(method, "chat_id", None)
+        if not self.dispatcher.running or chat_id is None or not isinstance(method, RATE_LIMITED_METHODS):
+            return await make_request(bot, method)
+        return await self.dispatcher.submit(chat_id, lambda: make_request(bot, method))
@@ -0,0 +1,23 @@
+import asyncio
+from contextvars import ContextVar
+from typing import Optional
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import TelegramMethod, Response, AnswerCallbackQuery
+
+# Ответ вебхука для апдейта, который обрабатывается сейчас; пока он не отправлен, future не завершён
+webhook_reply: ContextVar[Optional[asyncio.Future]] = ContextVar("webhook_reply", default=None)
+
+class WebhookReplyMiddleware(BaseRequestMiddleware):
+    """Отправляет ответ на callback в теле ответа вебхука вместо отдельного запроса к Bot API.
+
+    Так можно только с методами, результат которых обработчику не нужен: answerCallbackQuery
+    всегда возвращает True, а из ответа вебхука Telegram ничего не возвращает.
+    """
+
+    async def __call__(self, make_request: NextRequestMiddlewareType, bot: Bot, method: TelegramMethod) -> Response:
+        reply = webhook_reply.get()
+        if reply is None or reply.done() or not isinstance(method, AnswerCallbackQuery):
+            return await make_request(bot, method)
+        reply.set_result(method)
+        return True
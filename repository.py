@@ -0,0 +1,121 @@
+from dataclasses import dataclass
+from datetime import date as date_type, time as time_type, datetime
+from typing import List, Optional, Tuple
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, contains_eager
+from database import User, Auto, Booking, BookingStatus
+
+ACTIVE_STATUSES = (BookingStatus.PENDING, BookingStatus.CONFIRMED)
+HISTORY_STATUSES = (BookingStatus.REJECTED, BookingStatus.CANCELLED, BookingStatus.COMPLETED)
+
+@dataclass(frozen=True)
+class UserView:
+    """Данные клиента для отображения."""
+    id: int
+    telegram_id: str
+    first_name: str
+    last_name: Optional[str]
+    phone: Optional[str]
+    username: Optional[str]
+
+    @classmethod
+    def from_model(cls, user: User) -> "UserView":
+        return cls(user.id, user.telegram_id, user.first_name, user.last_name, user.phone, user.username)
+
+@dataclass(frozen=True)
+class AutoView:
+    """Данные автомобиля для отображения."""
+    id: int
+    brand: str
+    year: int
+    vin: str
+    license_plate: str
+
+    @classmethod
+    def from_model(cls, auto: Auto) -> "AutoView":
+        return cls(auto.id, auto.brand, auto.year, auto.vin, auto.license_plate)
+
+@dataclass(frozen=True)
+class BookingView:
+    """Запись вместе с клиентом, автомобилем и признаком отзыва."""
+    id: int
+    service_name: str
+    problem_description: Optional[str]
+    cost: Optional[float]
+    service_duration: Optional[int]
+    date: date_type
+    time: time_type
+    status: BookingStatus
+    rejection_reason: Optional[str]
+    user: UserView
+    auto: AutoView
+    has_review: bool
+
+    @classmethod
+    def from_model(cls, booking: Booking) -> "BookingView":
+        return cls(
+            id=booking.id,
+            service_name=booking.service_name,
+            problem_description=booking.problem_description,
+            cost=booking.cost,
+            service_duration=booking.service_duration,
+            date=booking.date,
+            time=booking.time,
+            status=booking.status,
+            rejection_reason=booking.rejection_reason,
+            user=UserView.from_model(booking.user),
+            auto=AutoView.from_model(booking.auto),
+            has_review=booking.review is not None
+        )
+
+def _bookings_with_relations():
+    """Запрос записей, подгружающий клиента, автомобиль и отзыв в том же SELECT."""
+    return (
+        select(Booking)
+        .join(Booking.user)
+        .options(contains_eager(Booking.user), joinedload(Booking.auto), joinedload(Booking.review))
+    )
+
+async def get_user_bookings(
+    session: AsyncSession,
+    telegram_id: str,
+    statuses: Tuple[BookingStatus, ...],
+    newest_first: bool = False
+) -> List[BookingView]:
+    """Возвращает записи пользователя с указанными статусами одним запросом."""
+    order = Booking.date.desc() if newest_first else Booking.date
+    result = await session.scalars(
+        _bookings_with_relations()
+        .filter(User.telegram_id == str(telegram_id), Booking.status.in_(statuses))
+        .order_by(order, Booking.time)
+    )
+    return [BookingView.from_model(booking) for booking in result.unique()]
+
+async def get_admin_bookings_page(
+    session: AsyncSession,
+    now: datetime,
+    page: int,
+    per_page: int = 5
+) -> Tuple[List[BookingView], int]:
+    """Возвращает страницу предстоящих активных записей и их общее количество (два запроса)."""
+    condition = (
+        Booking.status.in_(ACTIVE_STATUSES)
+        & ((Booking.date > now.date()) | ((Booking.date == now.date()) & (Booking.time >= now.time())))
+    )
+    total = await session.scalar(select(func.count(Booking.id)).filter(condition))
+    result = await session.scalars(
+        _bookings_with_relations()
+        .filter(condition)
+        .order_by(Booking.date, Booking.time)
+        .limit(per_page)
+        .offset(page * per_page)
+    )
+    return [BookingView.from_model(booking) for booking in result.unique()], total or 0
+
+async def get_booking_details(session: AsyncSession, booking_id: int) -> Optional[BookingView]:
+    """Возвращает запись с клиентом, автомобилем и отзывом одним запросом."""
+    booking = (await session.scalars(
+        _bookings_with_relations().filter(Booking.id == booking_id)
+    )).unique().first()
+    return BookingView.from_model(booking) if booking else None
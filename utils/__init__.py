@@ -1,11 +1,28 @@
 from .logger import setup_logger
+from .http_client import start_http_client, get_http_client, close_http_client
+from .single_flight import SingleFlight
+from .resilience import (CircuitBreaker, ResilientUpstream, UpstreamUnavailable, gpt_upstream, vision_upstream)
 from .vision_api import analyze_images, analyze_with_gpt_only
-from .gpt_helper import analyze_text_description
+from .gpt_helper import analyze_text_description, post_completion
 from .init import delete_previous_message
+from .progressive_message import ProgressiveMessage
 from .validation import UserInput, AutoInput
 from .misc import on_start, on_shutdown
-from .status_updater import update_booking_statuses, start_status_updater
+from .fsm_storage import (SQLiteStorage, TrackedMemoryStorage, RedisStateScanner, create_fsm_storage, create_events_isolation,
+                          dumps_state_data, loads_state_data)
+from .state_reaper import StateReaper, state_reaper
+from .status_updater import CompletionScheduler, completion_scheduler, start_status_updater
 from .reminder_manager import ReminderManager, reminder_manager
+from .media_cache import MediaCache, media_cache
+from .diagnostic_cache import DiagnosticCache, diagnostic_cache, image_key, recognition_key, text_key
+from .diagnostic_queue import (DiagnosticQueue, diagnostic_queue, DiagnosticQueueError, DiagnosticQueueFull,
+                               DiagnosticUserLimit)
+from .blob_spool import BlobSpool, blob_spool, BlobMissingError
+from .image_pipeline import ImagePipeline, image_pipeline, PreparedImage, InvalidImageError
+from .outbound import (OutboundDispatcher, outbound_dispatcher, send_priority, PRIORITY_INTERACTIVE,
+                       PRIORITY_NOTIFICATION, PRIORITY_BACKGROUND)
+from .availability import (DayAvailability, load_day_availability, get_free_slots, is_slot_free,
+                           get_week_free_counts, invalidate_availability)
 from .service_utils import (send_message, handle_error,get_progress_bar, check_user_registered,
                             check_user_and_autos, master_only, get_booking_context, send_booking_notification,
                             set_user_state, notify_master, schedule_reminder, schedule_user_reminder,
@@ -13,16 +30,30 @@ from .service_utils import (send_message, handle_error,get_progress_bar, check_u
 
 __all__ = [
     'setup_logger',
+    'start_http_client', 'get_http_client', 'close_http_client',
+    'SingleFlight',
+    'CircuitBreaker', 'ResilientUpstream', 'UpstreamUnavailable', 'gpt_upstream', 'vision_upstream',
     'analyze_images', 'analyze_with_gpt_only',
-    'analyze_text_description',
-    'delete_previous_message',
+    'analyze_text_description', 'post_completion',
+    'delete_previous_message', 'ProgressiveMessage',
     'UserInput', 'AutoInput',
     'on_start', 'on_shutdown',
-    'update_booking_statuses', 'start_status_updater',
+    'SQLiteStorage', 'TrackedMemoryStorage', 'RedisStateScanner', 'create_fsm_storage', 'create_events_isolation', 'dumps_state_data', 'loads_state_data',
+    'StateReaper', 'state_reaper',
+    'CompletionScheduler', 'completion_scheduler', 'start_status_updater',
     'ReminderManager', 'reminder_manager',
+    'MediaCache', 'media_cache',
+    'DiagnosticCache', 'diagnostic_cache', 'image_key', 'recognition_key', 'text_key',
+    'DiagnosticQueue', 'diagnostic_queue', 'DiagnosticQueueError', 'DiagnosticQueueFull', 'DiagnosticUserLimit',
+    'BlobSpool', 'blob_spool', 'BlobMissingError',
+    'ImagePipeline', 'image_pipeline', 'PreparedImage', 'InvalidImageError',
+    'OutboundDispatcher', 'outbound_dispatcher', 'send_priority', 'PRIORITY_INTERACTIVE',
+    'PRIORITY_NOTIFICATION', 'PRIORITY_BACKGROUND',
     'send_message', 'handle_error', 'get_progress_bar', 'check_user_registered',
     'check_user_and_autos', 'master_only', 'get_booking_context', 'send_booking_notification',
     'set_user_state', 'notify_master', 'schedule_reminder', 'schedule_user_reminder',
     'process_user_input',
+    'DayAvailability', 'load_day_availability', 'get_free_slots', 'is_slot_free',
+    'get_week_free_counts', 'invalidate_availability',
 
 ]
\ No newline at end of file
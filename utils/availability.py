@@ -0,0 +1,176 @@
+from time import monotonic
+from collections import defaultdict
+from datetime import date as date_type, datetime, time, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import select, event, inspect
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from config import WORKING_HOURS, SLOT_STEP_MINUTES, SLOT_CACHE_TTL_SECONDS
+from database import Booking, BookingStatus, calculate_end_at
+from utils import setup_logger
+
+logger = setup_logger(__name__)
+
+# Статусы, при которых запись не занимает время мастера
+FREE_STATUSES = (BookingStatus.REJECTED, BookingStatus.CANCELLED)
+
+def _parse_time(value: str) -> time:
+    hour, minute = map(int, value.split(":"))
+    return time(hour=hour, minute=minute)
+
+class DayAvailability:
+    """Занятость рабочего дня с точностью до минуты.
+
+    Интервалы записей накладываются через разностный массив, после чего
+    префиксные суммы позволяют проверить любой слот за O(1).
+    """
+
+    def __init__(self, day: date_type, intervals: Iterable[Tuple[datetime, datetime]] = (),
+                 work_start: time = None, work_end: time = None):
+        self.day = day
+        self.work_start = datetime.combine(day, work_start or _parse_time(WORKING_HOURS["start"]))
+        self.work_end = datetime.combine(day, work_end or _parse_time(WORKING_HOURS["end"]))
+        self.length = max(int((self.work_end - self.work_start).total_seconds() // 60), 0)
+        diff = [0] * (self.length + 1)
+        for start, end in intervals:
+            first = max(self._offset(start), 0)
+            last = min(self._offset(end), self.length)
+            if first < last:
+                diff[first] += 1
+                diff[last] -= 1
+        # busy_prefix[i] — количество занятых минут в [0, i)
+        self.busy_prefix = [0] * (self.length + 1)
+        depth = 0
+        for minute in range(self.length):
+            depth += diff[minute]
+            self.busy_prefix[minute + 1] = self.busy_prefix[minute] + (1 if depth > 0 else 0)
+
+    def _offset(self, moment: datetime) -> int:
+        return int((moment - self.work_start).total_seconds() // 60)
+
+    def is_free(self, start: time, duration: int) -> bool:
+        """Проверяет, свободен ли интервал длительностью duration минут с начала start."""
+        first = self._offset(datetime.combine(self.day, start))
+        last = first + duration
+        if first < 0 or last > self.length:
+            return False
+        return self.busy_prefix[last] - self.busy_prefix[first] == 0
+
+    def free_slots(self, duration: int, step: int = SLOT_STEP_MINUTES, not_before: datetime = None) -> List[time]:
+        """Возвращает начала свободных слотов длительностью duration минут с шагом step."""
+        slots = []
+        first = 0
+        if not_before and not_before.date() == self.day:
+            first = max(-(-self._offset(not_before) // step) * step, 0)
+        for offset in range(first, self.length - duration + 1, step):
+            if self.busy_prefix[offset + duration] - self.busy_prefix[offset] == 0:
+                slots.append((self.work_start + timedelta(minutes=offset)).time())
+        return slots
+
+def _booking_interval(row) -> Tuple[datetime, datetime]:
+    return (
+        datetime.combine(row.date, row.time),
+        row.end_at or calculate_end_at(row.date, row.time, row.service_name, row.service_duration)
+    )
+
+async def load_day_availability(session: AsyncSession, day: date_type,
+                                exclude_booking_id: Optional[int] = None) -> DayAvailability:
+    """Загружает занятость дня одним запросом по индексу (date, status)."""
+    query = select(Booking.date, Booking.time, Booking.end_at, Booking.service_name, Booking.service_duration).filter(
+        Booking.date == day,
+        Booking.status.not_in(FREE_STATUSES)
+    )
+    if exclude_booking_id is not None:
+        query = query.filter(Booking.id != exclude_booking_id)
+    rows = (await session.execute(query)).all()
+    return DayAvailability(day, [_booking_interval(row) for row in rows])
+
+async def get_free_slots(session: AsyncSession, day: date_type, duration: int,
+                         exclude_booking_id: Optional[int] = None) -> List[time]:
+    """Возвращает свободные слоты дня для услуги длительностью duration минут; на сегодня — только будущие."""
+    availability = await load_day_availability(session, day, exclude_booking_id)
+    return availability.free_slots(duration, not_before=datetime.now())
+
+async def is_slot_free(session: AsyncSession, day: date_type, start: time, duration: int,
+                       exclude_booking_id: Optional[int] = None) -> bool:
+    """Проверяет, свободно ли время перед созданием или переносом записи."""
+    availability = await load_day_availability(session, day, exclude_booking_id)
+    return availability.is_free(start, duration)
+
+# Кэш количества свободных слотов: (первый день, последний день, длительность, исключённая запись) ->
+# (момент устаревания, {день: слотов}). Commit в этом процессе сбрасывает его сразу, записи других
+# процессов и прошедшее время сегодняшнего дня учитываются через SLOT_CACHE_TTL_SECONDS.
+_week_cache: Dict[Tuple[date_type, date_type, int, Optional[int]], Tuple[float, Dict[date_type, int]]] = {}
+WEEK_CACHE_MAX_SIZE = 256
+
+async def get_week_free_counts(session: AsyncSession, days: List[date_type], duration: int,
+                               exclude_booking_id: Optional[int] = None) -> Dict[date_type, int]:
+    """Возвращает количество свободных слотов по дням недели; все дни считаются по одному запросу."""
+    if not days:
+        return {}
+    key = (days[0], days[-1], duration, exclude_booking_id)
+    cached = _week_cache.get(key)
+    if cached is not None and cached[0] > monotonic():
+        return cached[1]
+    query = select(Booking.date, Booking.time, Booking.end_at, Booking.service_name, Booking.service_duration).filter(
+        Booking.date.between(days[0], days[-1]),
+        Booking.status.not_in(FREE_STATUSES)
+    ).order_by(Booking.date)
+    if exclude_booking_id is not None:
+        query = query.filter(Booking.id != exclude_booking_id)
+    rows = (await session.execute(query)).all()
+    intervals_by_day = defaultdict(list)
+    for row in rows:
+        intervals_by_day[row.date].append(_booking_interval(row))
+    now = datetime.now()
+    counts = {
+        day: len(DayAvailability(day, intervals_by_day[day]).free_slots(duration, not_before=now)) for day in days
+    }
+    if len(_week_cache) >= WEEK_CACHE_MAX_SIZE:
+        _week_cache.clear()
+    _week_cache[key] = (monotonic() + SLOT_CACHE_TTL_SECONDS, counts)
+    return counts
+
+def invalidate_availability(days: Iterable[date_type] = None):
+    """Сбрасывает кэш недель, содержащих указанные дни (без аргумента — весь кэш)."""
+    if days is None:
+        _week_cache.clear()
+        return
+    days = set(days)
+    for key in [k for k in _week_cache if any(k[0] <= day <= k[1] for day in days)]:
+        del _week_cache[key]
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_booking_days(session, flush_context):
+    """Запоминает дни, занятость которых изменилась в транзакции."""
+    days = session.info.setdefault("availability_days", set())
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if not isinstance(obj, Booking):
+            continue
+        days.add(obj.date)
+        # При переносе сбрасываем и прежний день
+        days.update(d for d in inspect(obj).attrs.date.history.deleted or () if d)
+
+@event.listens_for(Session, "do_orm_execute")
+def _track_bulk_booking_changes(orm_execute_state):
+    """Массовые UPDATE/DELETE по записям сбрасывают весь кэш после commit."""
+    if (orm_execute_state.is_update or orm_execute_state.is_delete) and orm_execute_state.bind_mapper is not None \
+            and orm_execute_state.bind_mapper.class_ is Booking:
+        orm_execute_state.session.info["availability_all"] = True
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_on_commit(session):
+    """Кэш сбрасывается только после commit, чтобы параллельные чтения не закэшировали старые данные."""
+    if session.info.pop("availability_all", False):
+        session.info.pop("availability_days", None)
+        invalidate_availability()
+        return
+    days = session.info.pop("availability_days", None)
+    if days:
+        invalidate_availability(days)
+        logger.debug(f"Кэш свободных слотов сброшен для дней: {sorted(days)}")
+
+@event.listens_for(Session, "after_rollback")
+def _discard_on_rollback(session):
+    session.info.pop("availability_days", None)
+    session.info.pop("availability_all", None)
@@ -0,0 +1,123 @@
+import asyncio
+import hashlib
+import os
+import time
+from typing import List, Optional
+from config import BLOB_SPOOL_DIR, BLOB_SPOOL_TTL_HOURS
+from utils import setup_logger
+
+logger = setup_logger(__name__)
+
+class BlobMissingError(KeyError):
+    """Файл удалён из спула по сроку хранения или не сохранялся."""
+
+class BlobSpool:
+    """Временное хранилище фото диагностики на диске, адресуемое SHA-256 содержимого.
+
+    В состоянии FSM лежат только ссылки, а байты читаются непосредственно перед
+    анализом. Файлы старше ttl удаляются фоновой очисткой.
+    """
+
+    CLEANUP_INTERVAL = 600  # Секунд между очистками
+
+    def __init__(self, directory: str = BLOB_SPOOL_DIR, ttl_hours: float = BLOB_SPOOL_TTL_HOURS):
+        self.directory = directory
+        self.ttl = ttl_hours * 3600
+        self._task: Optional[asyncio.Task] = None
+
+    def _path(self, ref: str) -> str:
+        if len(ref) != 64 or not all(c in "0123456789abcdef" for c in ref):
+            raise BlobMissingError(ref)
+        return os.path.join(self.directory, ref[:2], ref)
+
+    def _write(self, ref: str, data: bytes):
+        path = self._path(ref)
+        if os.path.exists(path):
+            # Повторная загрузка того же фото продлевает срок хранения
+            os.utime(path)
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _read(self, ref: str) -> bytes:
+        try:
+            with open(self._path(ref), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            raise BlobMissingError(ref) from None
+
+    async def put(self, data: bytes) -> str:
+        """Сохраняет байты и возвращает ссылку на них."""
+        ref = hashlib.sha256(data).hexdigest()
+        await asyncio.to_thread(self._write, ref, data)
+        return ref
+
+    async def get(self, ref: str) -> bytes:
+        """Читает байты по ссылке; если файла уже нет, выбрасывает BlobMissingError."""
+        return await asyncio.to_thread(self._read, ref)
+
+    async def get_many(self, refs: List[str]) -> List[bytes]:
+        """Читает несколько файлов параллельно."""
+        return list(await asyncio.gather(*(self.get(ref) for ref in refs)))
+
+    def size(self, ref: str) -> int:
+        """Размер файла в байтах; 0, если его уже нет."""
+        try:
+            return os.path.getsize(self._path(ref))
+        except (BlobMissingError, OSError):
+            return 0
+
+    def discard(self, ref: str, idle_seconds: float) -> bool:
+        """Удаляет файл, если его не загружали повторно последние idle_seconds секунд."""
+        try:
+            path = self._path(ref)
+            if os.stat(path).st_mtime > time.time() - idle_seconds:
+                return False
+            os.remove(path)
+            return True
+        except (BlobMissingError, FileNotFoundError):
+            return False
+
+    def cleanup(self) -> int:
+        """Удаляет файлы старше ttl и возвращает их число."""
+        expires_before = time.time() - self.ttl
+        removed = 0
+        if not os.path.isdir(self.directory):
+            return 0
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    if os.stat(path).st_mtime < expires_before:
+                        os.remove(path)
+                        removed += 1
+                except FileNotFoundError:
+                    pass
+        if removed:
+            logger.info(f"Удалено устаревших фото из спула: {removed}")
+        return removed
+
+    async def _cleanup_loop(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.cleanup)
+            except Exception as e:
+                logger.error(f"Ошибка очистки спула фото: {str(e)}")
+            await asyncio.sleep(self.CLEANUP_INTERVAL)
+
+    def start(self):
+        """Запускает периодическую очистку."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._cleanup_loop())
+
+    async def stop(self):
+        """Останавливает очистку."""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+blob_spool = BlobSpool()
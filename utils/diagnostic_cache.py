@@ -0,0 +1,157 @@
+import asyncio
+import hashlib
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+from sqlalchemy import select, delete, func
+from config import (DIAGNOSTIC_CACHE_TTL_HOURS, DIAGNOSTIC_CACHE_MAX_ROWS, DIAGNOSTIC_CACHE_MEMORY_SIZE,
+                    DIAGNOSTIC_PHASH_MAX_DISTANCE)
+from database import AsyncSessionLocal, DiagnosticCacheEntry
+from utils import setup_logger
+from utils.image_hash import BKTree, to_hex, from_hex
+
+logger = setup_logger(__name__)
+
+def image_key(image_data: bytes) -> str:
+    """Ключ результата по содержимому изображения."""
+    return f"img:{hashlib.md5(image_data).hexdigest()}"
+
+def recognition_key(image_data: bytes) -> str:
+    """Ключ текста, распознанного на изображении; анализ описания пользователя сюда не входит."""
+    return f"ocr:{hashlib.md5(image_data).hexdigest()}"
+
+def text_key(description: str) -> str:
+    """Ключ результата по описанию: регистр и лишние пробелы не учитываются."""
+    normalized = " ".join(description.lower().split())
+    return f"txt:{hashlib.sha256(normalized.encode('utf-8')).hexdigest()}"
+
+class DiagnosticCache:
+    """LRU в памяти поверх таблицы diagnostic_cache с поиском по первичному ключу.
+
+    Записи старше ttl не возвращаются и удаляются при очистке; в БД хранится
+    не больше max_rows самых свежих результатов. Для фото дополнительно ведётся
+    BK-дерево перцептивных хешей, чтобы находить пересжатые и переснятые копии.
+    """
+
+    EVICT_EVERY = 100  # Очистка БД выполняется раз в столько записей
+
+    def __init__(self, ttl: timedelta = timedelta(hours=DIAGNOSTIC_CACHE_TTL_HOURS),
+                 max_rows: int = DIAGNOSTIC_CACHE_MAX_ROWS, memory_size: int = DIAGNOSTIC_CACHE_MEMORY_SIZE):
+        self.ttl = ttl
+        self.max_rows = max_rows
+        self.memory_size = memory_size
+        self._memory: "OrderedDict[str, Tuple[datetime, str]]" = OrderedDict()
+        self._writes = 0
+        self._phash_index: Optional[BKTree] = None
+        # merge читает и вставляет строку отдельно, поэтому одновременные записи одного ключа упорядочиваются
+        self._write_lock = asyncio.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _remember(self, key: str, created_at: datetime, result: str):
+        self._memory[key] = (created_at, result)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    async def get(self, key: str) -> Optional[str]:
+        """Возвращает результат из памяти или БД, если он не устарел."""
+        expires_before = datetime.now() - self.ttl
+        entry = self._memory.get(key)
+        if entry is not None:
+            if entry[0] >= expires_before:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            del self._memory[key]
+        try:
+            async with AsyncSessionLocal() as session:
+                row = (await session.execute(
+                    select(DiagnosticCacheEntry.created_at, DiagnosticCacheEntry.result)
+                    .filter(DiagnosticCacheEntry.key == key, DiagnosticCacheEntry.created_at >= expires_before)
+                )).first()
+        except Exception as e:
+            logger.error(f"Ошибка чтения кэша диагностики: {str(e)}")
+            row = None
+        if row is None:
+            self.misses += 1
+            return None
+        self._remember(key, row.created_at, row.result)
+        self.hits += 1
+        return row.result
+
+    async def _load_phash_index(self) -> BKTree:
+        """Строит BK-дерево по хешам из БД при первом поиске похожих фото."""
+        if self._phash_index is None:
+            index = BKTree()
+            async with AsyncSessionLocal() as session:
+                rows = (await session.execute(
+                    select(DiagnosticCacheEntry.key, DiagnosticCacheEntry.phash)
+                    .filter(DiagnosticCacheEntry.phash.is_not(None),
+                            DiagnosticCacheEntry.created_at >= datetime.now() - self.ttl)
+                )).all()
+            for row in rows:
+                index.add(from_hex(row.phash), row.key)
+            self._phash_index = index
+            logger.info(f"Индекс перцептивных хешей загружен: {index.size}")
+        return self._phash_index
+
+    async def find_similar(self, phash: int, max_distance: int = DIAGNOSTIC_PHASH_MAX_DISTANCE,
+                           prefix: str = "ocr:") -> Optional[str]:
+        """Возвращает результат для ближайшего по dHash фото, если оно не дальше max_distance.
+
+        Ищутся только ключи с prefix: похожее фото другого пользователя может отдать лишь текст с
+        изображения, но не анализ его описания.
+        """
+        try:
+            index = await self._load_phash_index()
+        except Exception as e:
+            logger.error(f"Ошибка загрузки индекса перцептивных хешей: {str(e)}")
+            return None
+        for distance, key in index.search(phash, max_distance):
+            if not key.startswith(prefix):
+                continue
+            result = await self.get(key)
+            if result:
+                logger.info(f"Найдено похожее фото в кэше диагностики (расстояние {distance})")
+                return result
+        return None
+
+    async def set(self, key: str, result: str, phash: Optional[int] = None):
+        """Сохраняет результат в памяти и БД."""
+        created_at = datetime.now()
+        self._remember(key, created_at, result)
+        try:
+            async with self._write_lock, AsyncSessionLocal() as session:
+                await session.merge(DiagnosticCacheEntry(
+                    key=key, result=result, created_at=created_at,
+                    phash=to_hex(phash) if phash is not None else None
+                ))
+                await session.commit()
+            if phash is not None and self._phash_index is not None:
+                self._phash_index.add(phash, key)
+            self._writes += 1
+            if self._writes % self.EVICT_EVERY == 0:
+                await self.evict()
+        except Exception as e:
+            logger.error(f"Ошибка записи кэша диагностики: {str(e)}")
+
+    async def evict(self):
+        """Удаляет устаревшие записи и самые старые записи сверх max_rows."""
+        async with AsyncSessionLocal() as session:
+            expired = await session.execute(
+                delete(DiagnosticCacheEntry).where(DiagnosticCacheEntry.created_at < datetime.now() - self.ttl)
+            )
+            total = await session.scalar(select(func.count()).select_from(DiagnosticCacheEntry))
+            excess = max(total - self.max_rows, 0)
+            if excess:
+                oldest = select(DiagnosticCacheEntry.key).order_by(DiagnosticCacheEntry.created_at).limit(excess)
+                await session.execute(
+                    delete(DiagnosticCacheEntry).where(DiagnosticCacheEntry.key.in_(oldest.scalar_subquery()))
+                )
+            await session.commit()
+        # Из BK-дерева нельзя удалять, поэтому после очистки оно строится заново при следующем поиске
+        self._phash_index = None
+        logger.info(f"Очистка кэша диагностики: устаревших {expired.rowcount}, сверх лимита {excess}")
+
+diagnostic_cache = DiagnosticCache()
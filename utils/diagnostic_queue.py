@@ -0,0 +1,139 @@
+import asyncio
+import time
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Deque, List, Optional
+from config import DIAGNOSTIC_WORKERS, DIAGNOSTIC_PER_USER_LIMIT, DIAGNOSTIC_QUEUE_MAX_SIZE
+from utils import setup_logger
+
+logger = setup_logger(__name__)
+
+class DiagnosticQueueError(Exception):
+    """Задание не принято в очередь; текст исключения можно показать пользователю."""
+
+class DiagnosticQueueFull(DiagnosticQueueError):
+    pass
+
+class DiagnosticUserLimit(DiagnosticQueueError):
+    pass
+
+@dataclass
+class _DiagnosticJob:
+    user_id: int
+    run: Callable[[], Awaitable[None]]
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+class DiagnosticQueue:
+    """Очередь диагностик с фиксированным числом воркеров.
+
+    Обработчик только ставит задание и сразу отвечает пользователю, а обращения
+    к Yandex выполняют не больше workers заданий одновременно.
+    """
+
+    METRICS_WINDOW = 200
+
+    def __init__(self, workers: int = DIAGNOSTIC_WORKERS, per_user_limit: int = DIAGNOSTIC_PER_USER_LIMIT,
+                 max_size: int = DIAGNOSTIC_QUEUE_MAX_SIZE):
+        self.workers = workers
+        self.per_user_limit = per_user_limit
+        self.max_size = max_size
+        self._pending: Deque[_DiagnosticJob] = deque()
+        self._has_jobs = asyncio.Event()
+        self._per_user: Counter = Counter()  # Заданий пользователя в очереди и в работе
+        self._tasks: List[asyncio.Task] = []
+        self.in_service = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self._wait_times: Deque[float] = deque(maxlen=self.METRICS_WINDOW)
+        self._service_times: Deque[float] = deque(maxlen=self.METRICS_WINDOW)
+
+    def start(self):
+        """Запускает воркеры."""
+        self._tasks = [task for task in self._tasks if not task.done()]
+        for i in range(len(self._tasks), self.workers):
+            self._tasks.append(asyncio.create_task(self._worker(i)))
+
+    async def stop(self):
+        """Останавливает воркеры; незапущенные задания отбрасываются."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._pending:
+            logger.warning(f"Остановка очереди диагностики, не выполнено заданий: {len(self._pending)}")
+        self._pending.clear()
+        self._per_user.clear()
+
+    def submit(self, user_id: int, run: Callable[[], Awaitable[None]]) -> int:
+        """Ставит задание в очередь и возвращает место в ней (0 — свободный воркер есть и задание начнётся сразу)."""
+        if self._per_user[user_id] >= self.per_user_limit:
+            self.rejected += 1
+            raise DiagnosticUserLimit("У вас уже есть диагностика в работе. Дождитесь результата. ⏳")
+        if len(self._pending) >= self.max_size:
+            self.rejected += 1
+            raise DiagnosticQueueFull("Сейчас много запросов на диагностику. Попробуйте через пару минут. 🙏")
+        self.start()
+        position = max(len(self._pending) + self.in_service - self.workers + 1, 0)
+        self._pending.append(_DiagnosticJob(user_id, run))
+        self._per_user[user_id] += 1
+        self._has_jobs.set()
+        logger.info(f"Диагностика пользователя {user_id} в очереди, место: {position}")
+        return position
+
+    def position(self, user_id: int) -> Optional[int]:
+        """Место первого ожидающего задания пользователя (1 — следующее), None — если в очереди его нет."""
+        for index, job in enumerate(self._pending):
+            if job.user_id == user_id:
+                return index + 1
+        return None
+
+    async def _worker(self, number: int):
+        while True:
+            if not self._pending:
+                self._has_jobs.clear()
+                await self._has_jobs.wait()
+                continue
+            job = self._pending.popleft()
+            started = time.monotonic()
+            self._wait_times.append(started - job.enqueued_at)
+            self.in_service += 1
+            try:
+                await job.run()
+                self.completed += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Ошибка задания диагностики пользователя {job.user_id} (воркер {number}): {str(e)}")
+            finally:
+                self.in_service -= 1
+                self._service_times.append(time.monotonic() - started)
+                self._per_user[job.user_id] -= 1
+                if self._per_user[job.user_id] <= 0:
+                    del self._per_user[job.user_id]
+
+    @staticmethod
+    def _summary(values: Deque[float]) -> dict:
+        ordered = sorted(values)
+        if not ordered:
+            return {"avg_ms": 0, "p95_ms": 0}
+        return {
+            "avg_ms": round(sum(ordered) / len(ordered) * 1000, 1),
+            "p95_ms": round(ordered[int(len(ordered) * 0.95)] * 1000, 1),
+        }
+
+    def get_stats(self) -> dict:
+        """Глубина очереди, счётчики и время ожидания/обработки заданий."""
+        return {
+            "queued": len(self._pending),
+            "in_service": self.in_service,
+            "workers": self.workers,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "wait": self._summary(self._wait_times),
+            "service": self._summary(self._service_times),
+        }
+
+diagnostic_queue = DiagnosticQueue()
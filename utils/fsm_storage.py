@@ -0,0 +1,331 @@
+import asyncio
+import base64
+import json
+import time as clock
+from datetime import date, datetime, time
+from typing import Any, Dict, Hashable, List, Optional, Set, Tuple
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseEventIsolation, BaseStorage, DefaultKeyBuilder, StateType, StorageKey
+from aiogram.fsm.storage.memory import DisabledEventIsolation, MemoryStorage
+from sqlalchemy import select, delete, insert
+from config import FSM_STORAGE, FSM_FLUSH_INTERVAL, FSM_REDIS_URL, FSM_STATE_TTL, FSM_LOCK_TIMEOUT
+from database import AsyncSessionLocal, FSMRecord
+from utils import setup_logger
+
+logger = setup_logger(__name__)
+
+def _encode_value(value: Any) -> Any:
+    """Типы, которые обработчики кладут в данные состояния, но которых нет в JSON."""
+    if isinstance(value, datetime):
+        return {"__datetime__": value.isoformat()}
+    if isinstance(value, date):
+        return {"__date__": value.isoformat()}
+    if isinstance(value, time):
+        return {"__time__": value.isoformat()}
+    if isinstance(value, bytes):
+        return {"__bytes__": base64.b64encode(value).decode("ascii")}
+    raise TypeError(f"Тип {type(value).__name__} не сохраняется в состоянии FSM")
+
+def _decode_value(obj: Dict[str, Any]) -> Any:
+    if len(obj) == 1:
+        (tag, value), = obj.items()
+        if tag == "__datetime__":
+            return datetime.fromisoformat(value)
+        if tag == "__date__":
+            return date.fromisoformat(value)
+        if tag == "__time__":
+            return time.fromisoformat(value)
+        if tag == "__bytes__":
+            return base64.b64decode(value)
+    return obj
+
+def dumps_state_data(data: Dict[str, Any]) -> str:
+    """Сериализует данные состояния в JSON с поддержкой дат и байтов."""
+    return json.dumps(data, default=_encode_value, ensure_ascii=False)
+
+def loads_state_data(raw: str) -> Dict[str, Any]:
+    """Восстанавливает данные состояния, сохранённые dumps_state_data."""
+    return json.loads(raw, object_hook=_decode_value)
+
+# Запись состояния для очистки брошенных диалогов: ключ, состояние, данные и время последнего изменения
+StateSnapshot = Tuple[Hashable, Optional[str], Dict[str, Any], float]
+
+class TrackedMemoryStorage(MemoryStorage):
+    """MemoryStorage, который помнит время последнего изменения каждого состояния."""
+
+    def __init__(self):
+        super().__init__()
+        self._touched: Dict[StorageKey, float] = {}
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        await super().set_state(key, state)
+        self._touched[key] = clock.time()
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        await super().set_data(key, data)
+        self._touched[key] = clock.time()
+
+    async def snapshot(self) -> List[StateSnapshot]:
+        """Все непустые состояния; пустые записи, которые создаёт get_state, удаляются."""
+        result = []
+        for key, record in list(self.storage.items()):
+            if record.state is None and not record.data:
+                self.drop(key)
+                continue
+            result.append((key, record.state, record.data, self._touched.get(key, 0.0)))
+        return result
+
+    def drop(self, key: StorageKey):
+        """Удаляет состояние и данные пользователя."""
+        self.storage.pop(key, None)
+        self._touched.pop(key, None)
+
+class SQLiteStorage(BaseStorage):
+    """Хранилище FSM в таблице fsm_states с отложенной записью.
+
+    Состояния читаются из БД один раз и дальше живут в памяти; изменённые ключи
+    пачкой сохраняются раз в flush_interval секунд и при остановке бота.
+    """
+
+    def __init__(self, flush_interval: float = FSM_FLUSH_INTERVAL):
+        self.flush_interval = flush_interval
+        self.key_builder = DefaultKeyBuilder(with_bot_id=True, with_business_connection_id=True, with_destiny=True)
+        self._records: Dict[str, Tuple[Optional[str], Dict[str, Any]]] = {}
+        self._touched: Dict[str, float] = {}
+        self._dirty: Set[str] = set()
+        self._loaded = False
+        self._load_lock = asyncio.Lock()
+        self._flush_lock = asyncio.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+        self.flushes = 0
+
+    async def _ensure_loaded(self):
+        if self._loaded:
+            return
+        async with self._load_lock:
+            if self._loaded:
+                return
+            async with AsyncSessionLocal() as session:
+                rows = (await session.execute(
+                    select(FSMRecord.key, FSMRecord.state, FSMRecord.data, FSMRecord.updated_at)
+                )).all()
+            for row in rows:
+                try:
+                    self._records[row.key] = (row.state, loads_state_data(row.data))
+                    self._touched[row.key] = row.updated_at.timestamp()
+                except ValueError as e:
+                    logger.error(f"Повреждённое состояние FSM {row.key} пропущено: {str(e)}")
+            self._loaded = True
+            logger.info(f"Загружено состояний FSM из БД: {len(self._records)}")
+
+    def _mark_dirty(self, key: str):
+        self._dirty.add(key)
+        self._touched[key] = clock.time()
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        while self._dirty:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def flush(self):
+        """Сохраняет изменённые состояния одной транзакцией; пустые удаляются из БД."""
+        async with self._flush_lock:
+            if not self._dirty:
+                return
+            dirty, self._dirty = self._dirty, set()
+            now = datetime.now()
+            rows = []
+            for key in dirty:
+                state, data = self._records.get(key, (None, {}))
+                if state is not None or data:
+                    rows.append({"key": key, "state": state, "data": dumps_state_data(data), "updated_at": now})
+            try:
+                async with AsyncSessionLocal() as session:
+                    await session.execute(delete(FSMRecord).where(FSMRecord.key.in_(dirty)))
+                    if rows:
+                        await session.execute(insert(FSMRecord), rows)
+                    await session.commit()
+            except BaseException as e:
+                # Ключи попадут в следующую запись, в том числе если текущую прервала отмена
+                self._dirty |= dirty
+                if not isinstance(e, Exception):
+                    raise
+                logger.error(f"Ошибка сохранения состояний FSM: {str(e)}")
+                return
+            self.flushes += 1
+            # Очищенные состояния больше не нужно держать в памяти
+            for key in dirty - self._dirty:
+                if self._records.get(key) == (None, {}):
+                    del self._records[key]
+                    self._touched.pop(key, None)
+            logger.debug(f"Сохранено состояний FSM: {len(rows)}, удалено: {len(dirty) - len(rows)}")
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        await self._ensure_loaded()
+        storage_key = self.key_builder.build(key)
+        state = state.state if isinstance(state, State) else state
+        _, data = self._records.get(storage_key, (None, {}))
+        self._records[storage_key] = (state, data)
+        self._mark_dirty(storage_key)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        await self._ensure_loaded()
+        return self._records.get(self.key_builder.build(key), (None, {}))[0]
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        await self._ensure_loaded()
+        storage_key = self.key_builder.build(key)
+        state, _ = self._records.get(storage_key, (None, {}))
+        self._records[storage_key] = (state, data.copy())
+        self._mark_dirty(storage_key)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        await self._ensure_loaded()
+        return self._records.get(self.key_builder.build(key), (None, {}))[1].copy()
+
+    async def snapshot(self) -> List[StateSnapshot]:
+        """Все состояния в памяти со временем их последнего изменения."""
+        await self._ensure_loaded()
+        return [(key, state, data, self._touched.get(key, 0.0))
+                for key, (state, data) in self._records.items() if state is not None or data]
+
+    def drop(self, key: str):
+        """Очищает состояние; строка удалится из БД при следующей записи."""
+        if key in self._records:
+            self._records[key] = (None, {})
+            self._mark_dirty(key)
+
+    async def close(self) -> None:
+        """Останавливает фоновую запись и сохраняет оставшиеся изменения."""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+            self._flush_task = None
+        await self.flush()
+
+    def get_stats(self) -> dict:
+        """Сколько состояний в памяти, сколько ждут записи и сколько было сохранений."""
+        return {"states": len(self._records), "dirty": len(self._dirty), "flushes": self.flushes}
+
+class RedisStateScanner:
+    """Обход состояний RedisStorage для очистки брошенных диалогов из любого процесса бота.
+
+    Время последнего изменения восстанавливается по остатку TTL: RedisStorage продлевает его
+    при каждой записи, поэтому сканер работает только при заданном FSM_STATE_TTL.
+    """
+
+    PARTS = ("state", "data")
+
+    def __init__(self, storage: BaseStorage, scan_count: int = 500):
+        self.storage = storage
+        self.redis = storage.redis
+        self.key_builder = storage.key_builder
+        self.scan_count = scan_count
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.storage.state_ttl and self.storage.data_ttl)
+
+    def _keys(self, base: str) -> List[str]:
+        return [f"{base}{self.key_builder.separator}{part}" for part in self.PARTS]
+
+    def _last_change(self, state_pttl: int, data_pttl: int, now: float) -> float:
+        """Время последней записи состояния или данных по остатку их TTL (pttl < 0 — ключа нет)."""
+        touched = 0.0
+        for ttl, pttl in ((self.storage.state_ttl, state_pttl), (self.storage.data_ttl, data_pttl)):
+            ttl = ttl.total_seconds() if hasattr(ttl, "total_seconds") else ttl
+            if pttl > 0:
+                touched = max(touched, now - (ttl - pttl / 1000))
+        return touched
+
+    async def snapshot(self) -> List[StateSnapshot]:
+        """Все состояния с префиксом хранилища; ключи блокировок пропускаются."""
+        bases = set()
+        async for raw_key in self.redis.scan_iter(match=f"{self.key_builder.prefix}{self.key_builder.separator}*",
+                                                  count=self.scan_count):
+            redis_key = raw_key.decode() if isinstance(raw_key, bytes) else raw_key
+            base, _, part = redis_key.rpartition(self.key_builder.separator)
+            if part in self.PARTS:
+                bases.add(base)
+        bases = list(bases)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for base in bases:
+                for key in self._keys(base):
+                    pipe.get(key)
+                    pipe.pttl(key)
+            values = await pipe.execute()
+        now = clock.time()
+        result = []
+        for index, base in enumerate(bases):
+            state, state_pttl, data, data_pttl = values[index * 4:index * 4 + 4]
+            if isinstance(state, bytes):
+                state = state.decode("utf-8")
+            data = self.storage.json_loads(data.decode("utf-8") if isinstance(data, bytes) else data) if data else {}
+            if state is None and not data:
+                continue
+            result.append((base, state, data, self._last_change(state_pttl, data_pttl, now)))
+        return result
+
+    async def drop_if_idle(self, base: str, touched: float) -> bool:
+        """Удаляет состояние, если его не меняли после снимка; возвращает, удалено ли оно."""
+        from redis.exceptions import WatchError
+        keys = self._keys(base)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            try:
+                await pipe.watch(*keys)
+                state_pttl, data_pttl = await pipe.pttl(keys[0]), await pipe.pttl(keys[1])
+                # Диалог уже очищен или продолжен: его файлы могут принадлежать сохранённому отзыву
+                if state_pttl < 0 and data_pttl < 0:
+                    return False
+                if self._last_change(state_pttl, data_pttl, clock.time()) > touched + 1:
+                    return False
+                pipe.multi()
+                pipe.delete(*keys)
+                await pipe.execute()
+                return True
+            except WatchError:
+                # Пользователь продолжил диалог, пока шла проверка
+                return False
+
+def _create_redis_storage(url: str, redis: Any = None) -> BaseStorage:
+    """RedisStorage с общими для всех процессов ключами, TTL брошенных диалогов и нашей сериализацией данных."""
+    try:
+        from aiogram.fsm.storage.redis import RedisStorage
+    except ImportError as e:
+        raise RuntimeError("Для FSM_STORAGE=redis установите пакет redis (pip install redis)") from e
+    options = dict(
+        key_builder=DefaultKeyBuilder(with_bot_id=True, with_destiny=True),
+        state_ttl=FSM_STATE_TTL or None,
+        data_ttl=FSM_STATE_TTL or None,
+        json_dumps=dumps_state_data,
+        json_loads=loads_state_data,
+    )
+    if redis is not None:
+        return RedisStorage(redis=redis, **options)
+    return RedisStorage.from_url(url, **options)
+
+def create_fsm_storage(backend: str = FSM_STORAGE, redis: Any = None) -> BaseStorage:
+    """Создаёт хранилище FSM по настройке FSM_STORAGE: sqlite, redis или memory.
+
+    redis — готовый клиент (например, fakeredis) вместо подключения по FSM_REDIS_URL.
+    """
+    if backend == "redis":
+        logger.info("Состояния FSM хранятся в Redis")
+        return _create_redis_storage(FSM_REDIS_URL, redis)
+    if backend == "memory":
+        logger.warning("Состояния FSM хранятся в памяти и будут потеряны при перезапуске")
+        return TrackedMemoryStorage()
+    if backend != "sqlite":
+        logger.error(f"Неизвестное хранилище FSM '{backend}', используется sqlite")
+    return SQLiteStorage()
+
+def create_events_isolation(storage: BaseStorage) -> BaseEventIsolation:
+    """С Redis апдейты одного пользователя обрабатываются по очереди под распределённой блокировкой.
+
+    Один процесс с sqlite или memory работает без блокировки, как раньше.
+    """
+    if hasattr(storage, "create_isolation"):
+        return storage.create_isolation(lock_kwargs={"timeout": FSM_LOCK_TIMEOUT})
+    return DisabledEventIsolation()
@@ -1,47 +1,143 @@
+import asyncio
+import json
+import time
+from typing import Awaitable, Callable, Optional, Tuple
 import httpx
 from config import YANDEX_FOLDER_ID, YANDEX_API_KEY, AI_PROMPT_STR
 from utils import setup_logger
+from utils.http_client import get_http_client
+from utils.diagnostic_cache import diagnostic_cache, text_key
+from utils.single_flight import SingleFlight
+from utils.resilience import gpt_upstream, UpstreamUnavailable, RETRY_STATUSES
 
 logger = setup_logger(__name__)
 
+COMPLETION_URL = "https://llm.api.cloud.yandex.net/foundationModels/v1/completion"
 
-async def analyze_text_description(description: str) -> str:
-    """Анализирует текстовое описание проблемы через Yandex GPT API."""
+# Получает накопленный текст ответа по мере его генерации
+PartialCallback = Callable[[str], Awaitable[None]]
+
+# Одинаковые описания, пришедшие одновременно, анализируются одним запросом
+text_flight = SingleFlight("анализа описания")
+
+async def _stream_completion(headers: dict, body: dict, on_partial: PartialCallback) -> Tuple[int, str]:
+    """Читает потоковый ответ Yandex GPT: каждая строка — JSON с накопленным текстом."""
+    client = get_http_client()
+    body = {**body, "completionOptions": {**body["completionOptions"], "stream": True}}
+    async with client.stream("POST", COMPLETION_URL, headers=headers, json=body) as response:
+        if response.status_code != 200:
+            return response.status_code, (await response.aread()).decode("utf-8", "replace")
+        text = ""
+        started = time.perf_counter()
+        async for line in response.aiter_lines():
+            if not line.strip():
+                continue
+            chunk = json.loads(line)["result"]["alternatives"][0]["message"]["text"]
+            if chunk != text:
+                if not text:
+                    logger.info(f"Первый фрагмент ответа Yandex GPT через {(time.perf_counter() - started) * 1000:.0f} мс")
+                text = chunk
+                try:
+                    await on_partial(text)
+                except Exception as e:
+                    logger.debug(f"Ошибка обновления промежуточного ответа: {str(e)}")
+        return 200, text
+
+async def post_completion(headers: dict, body: dict, on_partial: Optional[PartialCallback] = None) -> Tuple[int, str]:
+    """Запрашивает ответ Yandex GPT; возвращает (код ответа, текст ответа или ошибки).
+
+    С on_partial ответ читается потоком; если поток не удался, запрос повторяется без него
+    в пределах того же срока gpt_upstream.deadline.
+    Если сервис не ответил за отведённый срок и повторы, выбрасывает UpstreamUnavailable.
+    """
+    deadline_at = time.monotonic() + gpt_upstream.deadline
+    # Поток проходит через тот же предохранитель, что и обычный запрос: при разомкнутой цепи он не отправляется
+    if on_partial is not None:
+        if not gpt_upstream.breaker.allow():
+            raise UpstreamUnavailable(f"{gpt_upstream.name}: сервис временно отключён после серии ошибок")
+        gpt_upstream.calls += 1
+        try:
+            status_code, text = await asyncio.wait_for(_stream_completion(headers, body, on_partial),
+                                                       timeout=gpt_upstream.deadline)
+            if status_code not in RETRY_STATUSES:
+                gpt_upstream.breaker.record_success()
+                return status_code, text
+            gpt_upstream.breaker.record_failure()
+            logger.warning(f"Потоковый ответ Yandex GPT вернул {status_code}, повтор без потока")
+        except (httpx.TransportError, asyncio.TimeoutError) as e:
+            gpt_upstream.breaker.record_failure()
+            logger.warning(f"Потоковый ответ Yandex GPT недоступен, повтор без потока: {str(e) or type(e).__name__}")
+        except Exception as e:
+            gpt_upstream.breaker.release()
+            logger.warning(f"Ошибка чтения потокового ответа Yandex GPT, повтор без потока: {str(e) or type(e).__name__}")
+        except BaseException:
+            gpt_upstream.breaker.release()
+            raise
+    remaining = deadline_at - time.monotonic()
+    if remaining <= 0:
+        raise UpstreamUnavailable(f"Yandex GPT: истёк срок {gpt_upstream.deadline:.0f} с")
+    client = get_http_client()
+    response = await gpt_upstream.request(lambda: client.post(COMPLETION_URL, headers=headers, json=body),
+                                          deadline=remaining)
+    if response.status_code == 200:
+        return 200, response.json()["result"]["alternatives"][0]["message"]["text"]
+    return response.status_code, response.text
+
+async def analyze_text_description(description: str, on_partial: Optional[PartialCallback] = None) -> str:
+    """Анализирует текстовое описание проблемы через Yandex GPT API.
+
+    Если анализ получить не удалось, выбрасывает UpstreamUnavailable: текст ошибки не выдаётся за результат.
+    """
     try:
-        model_uri = f"gpt://{YANDEX_FOLDER_ID}/yandexgpt"
-        logger.info(f"Отправка запроса на Yandex GPT с Modeluri: {model_uri}")
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                "https://llm.api.cloud.yandex.net/foundationModels/v1/completion",
-                headers={
-                    "Authorization": f"Bearer {YANDEX_API_KEY}",
-                    "x-folder-id": YANDEX_FOLDER_ID
-                },
-                json={
-                    "modelUri": model_uri,
-                    "completionOptions": {
-                        "stream": False,
-                        "temperature": 0.6,
-                        "maxTokens": 500
-                    },
-                    "messages": [
-                        {
-                            "role": "user",
-                            "text": (
-                                f"{AI_PROMPT_STR}"
-                                f"Описание: {description}"
-                            )
-                        }
-                    ]
-                }
-            )
-            if response.status_code == 200:
-                result = response.json()["result"]["alternatives"][0]["message"]["text"]
-                logger.info(f"Yandex gpt response: {result[:100]}")
-                return result[:500]  # Ограничиваем длину ответа
-            else:
-                logger.error(f"Ошибка API yandex gpt api: {response.status_code} - {response.text}")
-                return f"Анализ текста недоступен (ошибка {response.status_code}). Описание: {description}"
+        cache_key = text_key(description)
+        cached = await diagnostic_cache.get(cache_key)
+        if cached:
+            logger.info("Анализ описания взят из кэша")
+            return cached
+        return await text_flight.do(
+            cache_key,
+            lambda publish: _request_text_analysis(description, cache_key, publish if on_partial else None),
+            on_partial
+        )
+    except UpstreamUnavailable:
+        raise
     except Exception as e:
         logger.error(f"Ошибка Yandex GPT API: {str(e)}")
-        return f"Анализ текста недоступен. Описание: {description}"
\ No newline at end of file
+        raise UpstreamUnavailable(f"Yandex GPT: {str(e)}") from e
+
+async def _request_text_analysis(description: str, cache_key: str, on_partial: Optional[PartialCallback]) -> str:
+    """Запрашивает анализ описания у Yandex GPT и сохраняет успешный ответ в кэш."""
+    model_uri = f"gpt://{YANDEX_FOLDER_ID}/yandexgpt"
+    logger.info(f"Отправка запроса на Yandex GPT с Modeluri: {model_uri}")
+    status_code, result = await post_completion(
+        headers={
+            "Authorization": f"Bearer {YANDEX_API_KEY}",
+            "x-folder-id": YANDEX_FOLDER_ID
+        },
+        body={
+            "modelUri": model_uri,
+            "completionOptions": {
+                "stream": False,
+                "temperature": 0.6,
+                "maxTokens": 500
+            },
+            "messages": [
+                {
+                    "role": "user",
+                    "text": (
+                        f"{AI_PROMPT_STR}"
+                        f"Описание: {description}"
+                    )
+                }
+            ]
+        },
+        on_partial=on_partial
+    )
+    if status_code == 200:
+        logger.info(f"Yandex gpt response: {result[:100]}")
+        result = result[:500]  # Ограничиваем длину ответа
+        await diagnostic_cache.set(cache_key, result)
+        return result
+    else:
+        logger.error(f"Ошибка API yandex gpt api: {status_code} - {result}")
+        raise UpstreamUnavailable(f"Yandex GPT: HTTP {status_code}")
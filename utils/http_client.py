@@ -0,0 +1,54 @@
+import importlib.util
+from typing import Optional
+import httpx
+from config import (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT, HTTP_WRITE_TIMEOUT, HTTP_POOL_TIMEOUT,
+                    HTTP_MAX_CONNECTIONS, HTTP_MAX_KEEPALIVE_CONNECTIONS, HTTP_KEEPALIVE_EXPIRY, HTTP2_ENABLED)
+from utils import setup_logger
+
+logger = setup_logger(__name__)
+
+_client: Optional[httpx.AsyncClient] = None
+
+def _http2_available() -> bool:
+    """HTTP/2 включается, только если установлен пакет h2 (pip install httpx[http2])."""
+    if not HTTP2_ENABLED:
+        return False
+    if importlib.util.find_spec("h2") is None:
+        logger.warning("HTTP/2 запрошен, но пакет h2 не установлен; используется HTTP/1.1")
+        return False
+    return True
+
+def _create_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        http2=_http2_available(),
+        timeout=httpx.Timeout(
+            connect=HTTP_CONNECT_TIMEOUT, read=HTTP_READ_TIMEOUT, write=HTTP_WRITE_TIMEOUT, pool=HTTP_POOL_TIMEOUT
+        ),
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+        )
+    )
+
+async def start_http_client():
+    """Создаёт общий HTTP-клиент процесса."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _create_client()
+        logger.info("HTTP-клиент для Yandex API создан")
+
+def get_http_client() -> httpx.AsyncClient:
+    """Возвращает общий HTTP-клиент; если бот ещё не запущен (скрипты), создаёт его."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _create_client()
+    return _client
+
+async def close_http_client():
+    """Закрывает общий HTTP-клиент и его соединения."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+        logger.info("HTTP-клиент для Yandex API закрыт")
@@ -0,0 +1,75 @@
+from io import BytesIO
+from typing import Dict, List, Optional, Tuple
+from PIL import Image
+
+HASH_SIZE = 8  # dHash 8x8 = 64 бита
+
+def dhash(image_data: bytes, hash_size: int = HASH_SIZE) -> int:
+    """Разностный перцептивный хеш: устойчив к пересжатию и небольшому масштабированию."""
+    with Image.open(BytesIO(image_data)) as img:
+        # draft позволяет декодеру JPEG сразу уменьшить картинку, не распаковывая её целиком
+        img.draft("L", (hash_size * 8, hash_size * 8))
+        return dhash_image(img, hash_size)
+
+def dhash_image(img: Image.Image, hash_size: int = HASH_SIZE) -> int:
+    """dHash уже открытого изображения."""
+    pixels = list(img.convert("L").resize((hash_size + 1, hash_size), Image.Resampling.LANCZOS).getdata())
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+def hamming(a: int, b: int) -> int:
+    """Число различающихся битов двух хешей."""
+    return (a ^ b).bit_count()
+
+def to_hex(value: int) -> str:
+    return f"{value:016x}"
+
+def from_hex(value: str) -> int:
+    return int(value, 16)
+
+class BKTree:
+    """BK-дерево по расстоянию Хэмминга: поиск соседей без перебора всех хешей."""
+
+    def __init__(self):
+        self._root: Optional[Tuple[int, List[str], Dict[int, tuple]]] = None
+        self.size = 0
+
+    def add(self, value: int, key: str):
+        """Добавляет хеш; одинаковые хеши хранятся в одном узле."""
+        self.size += 1
+        if self._root is None:
+            self._root = (value, [key], {})
+            return
+        node = self._root
+        while True:
+            distance = hamming(value, node[0])
+            if distance == 0:
+                node[1].append(key)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = (value, [key], {})
+                return
+            node = child
+
+    def search(self, value: int, max_distance: int) -> List[Tuple[int, str]]:
+        """Возвращает (расстояние, ключ) всех хешей не дальше max_distance, ближайшие первыми."""
+        if self._root is None:
+            return []
+        found = []
+        stack = [self._root]
+        while stack:
+            node_value, keys, children = stack.pop()
+            distance = hamming(value, node_value)
+            if distance <= max_distance:
+                found.extend((distance, key) for key in keys)
+            for child_distance in range(distance - max_distance, distance + max_distance + 1):
+                child = children.get(child_distance)
+                if child is not None:
+                    stack.append(child)
+        found.sort()
+        return found
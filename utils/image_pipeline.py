@@ -0,0 +1,114 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from io import BytesIO
+from typing import Optional
+from PIL import Image, ImageOps
+from config import IMAGE_POOL_WORKERS, VISION_MAX_SIDE, VISION_JPEG_QUALITY
+from utils import setup_logger
+from utils.image_hash import dhash_image
+
+logger = setup_logger(__name__)
+
+ALLOWED_FORMATS = ("JPEG", "PNG")
+EXIF_ORIENTATION = 0x0112
+
+class InvalidImageError(ValueError):
+    """Файл не является изображением JPEG или PNG."""
+
+@dataclass(frozen=True)
+class PreparedImage:
+    data: bytes  # JPEG, уменьшенный до VISION_MAX_SIDE по длинной стороне
+    phash: int  # dHash подготовленного изображения
+    source_format: str
+    original_bytes: int
+    elapsed_ms: float
+
+def _prepare(image_data: bytes, max_side: int, quality: int) -> PreparedImage:
+    """Проверяет, поворачивает по EXIF, уменьшает и пережимает изображение (выполняется в пуле потоков)."""
+    started = time.perf_counter()
+    try:
+        img = Image.open(BytesIO(image_data))
+        source_format = img.format
+    except Exception as e:
+        raise InvalidImageError(f"Не удалось открыть изображение: {str(e)}") from e
+    if source_format not in ALLOWED_FORMATS:
+        raise InvalidImageError(f"Неподдерживаемый формат: {source_format}")
+    with img:
+        needs_resize = max(img.size) > max_side
+        needs_rotation = img.getexif().get(EXIF_ORIENTATION, 1) != 1
+        if not (needs_resize or needs_rotation or source_format != "JPEG"):
+            # Небольшой JPEG без поворота отправляется как есть
+            data, oriented = image_data, img
+        else:
+            # JPEG декодируется сразу в уменьшенном масштабе, если исходник намного больше нужного
+            img.draft("RGB", (max_side, max_side))
+            oriented = ImageOps.exif_transpose(img).convert("RGB")
+            oriented.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+            buffer = BytesIO()
+            oriented.save(buffer, "JPEG", quality=quality, optimize=True)
+            data = buffer.getvalue()
+        phash = dhash_image(oriented)
+    return PreparedImage(
+        data=data,
+        phash=phash,
+        source_format=source_format,
+        original_bytes=len(image_data),
+        elapsed_ms=(time.perf_counter() - started) * 1000
+    )
+
+class ImagePipeline:
+    """Подготовка фото диагностики вне цикла событий.
+
+    Pillow отпускает GIL при декодировании и масштабировании, поэтому
+    небольшого пула потоков достаточно, чтобы не блокировать бота.
+    """
+
+    def __init__(self, workers: int = IMAGE_POOL_WORKERS, max_side: int = VISION_MAX_SIDE,
+                 quality: int = VISION_JPEG_QUALITY):
+        self.workers = workers
+        self.max_side = max_side
+        self.quality = quality
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.images = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.total_ms = 0.0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="image")
+        return self._executor
+
+    async def prepare(self, image_data: bytes) -> PreparedImage:
+        """Готовит изображение к распознаванию; при неверном формате выбрасывает InvalidImageError."""
+        loop = asyncio.get_running_loop()
+        prepared = await loop.run_in_executor(self._get_executor(), _prepare, image_data, self.max_side, self.quality)
+        self.images += 1
+        self.bytes_in += prepared.original_bytes
+        self.bytes_out += len(prepared.data)
+        self.total_ms += prepared.elapsed_ms
+        logger.info(
+            f"Изображение подготовлено: {prepared.original_bytes // 1024} КБ → {len(prepared.data) // 1024} КБ "
+            f"за {prepared.elapsed_ms:.0f} мс"
+        )
+        return prepared
+
+    def get_stats(self) -> dict:
+        """Сколько изображений обработано, сколько байт сэкономлено и сколько времени потрачено."""
+        return {
+            "images": self.images,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "bytes_saved": self.bytes_in - self.bytes_out,
+            "avg_ms": round(self.total_ms / self.images, 1) if self.images else 0,
+        }
+
+    def shutdown(self):
+        """Останавливает пул потоков."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+image_pipeline = ImagePipeline()
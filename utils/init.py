@@ -1,18 +1,31 @@
+from typing import Optional, Union
+from aiogram import Bot
 from aiogram.types import Message
 from utils import setup_logger
 
 logger = setup_logger(__name__)
 
-async def delete_previous_message(message: Message) -> bool:
-    """Удаляет предыдущее сообщение бота в чате."""
+async def delete_previous_message(source: Union[Message, Bot], chat_id: Optional[int] = None,
+                                  message_id: Optional[int] = None) -> bool:
+    """Удаляет предыдущее сообщение бота в чате.
+
+    Принимает либо сообщение пользователя (удаляется сообщение перед ним),
+    либо бота, чат и id сохранённого сообщения.
+    """
     try:
-        # Пытаемся удалить сообщение с ID на единицу меньше текущего
-        await message.bot.delete_message(
-            chat_id=message.chat.id,
-            message_id=message.message_id - 1
+        if isinstance(source, Message):
+            # Пытаемся удалить сообщение с ID на единицу меньше текущего
+            bot, chat_id, message_id = source.bot, source.chat.id, source.message_id - 1
+        else:
+            bot = source
+            if not message_id:
+                return False
+        await bot.delete_message(
+            chat_id=chat_id,
+            message_id=message_id
         )
-        logger.debug(f"Удалено предыдущее сообщение в чате {message.chat.id}")
+        logger.debug(f"Удалено предыдущее сообщение в чате {chat_id}")
         return True
     except Exception as e:
         logger.debug(f"Не удалось удалить предыдущее сообщение: {str(e)}")
-        return False
\ No newline at end of file
+        return False
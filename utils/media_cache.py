@@ -0,0 +1,133 @@
+import asyncio
+import hashlib
+import os
+from datetime import datetime
+from typing import Dict, Optional, Set, Tuple, Union
+from aiogram import Bot
+from aiogram.types import FSInputFile, Message
+from sqlalchemy import select
+from config import PHOTO_DIR
+from database import AsyncSessionLocal, TelegramFile
+from utils import setup_logger
+from utils.outbound import send_priority, PRIORITY_BACKGROUND
+
+logger = setup_logger(__name__)
+
+class MediaCache:
+    """Кэш file_id для статичных картинок из photos/.
+
+    Первая отправка загружает файл, дальше Telegram получает только file_id.
+    Запись привязана к SHA-1 содержимого: изменённый файл загружается заново.
+    """
+
+    def __init__(self):
+        self._file_ids: Dict[str, Tuple[str, str]] = {}  # путь -> (отпечаток, file_id)
+        self._fingerprints: Dict[str, Tuple[int, int, str]] = {}  # путь -> (mtime_ns, размер, отпечаток)
+        self._pending: Set[asyncio.Task] = set()
+        # Параллельные отправки одной картинки не должны вставлять одну и ту же строку дважды
+        self._persist_lock = asyncio.Lock()
+
+    @staticmethod
+    def _key(path: str) -> str:
+        return os.path.normpath(path)
+
+    def fingerprint(self, path: str) -> str:
+        """SHA-1 файла; пересчитывается только при изменении mtime или размера."""
+        key = self._key(path)
+        stat = os.stat(key)
+        cached = self._fingerprints.get(key)
+        if cached and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+            return cached[2]
+        with open(key, "rb") as f:
+            digest = hashlib.sha1(f.read()).hexdigest()
+        self._fingerprints[key] = (stat.st_mtime_ns, stat.st_size, digest)
+        return digest
+
+    def get(self, path: str) -> Optional[str]:
+        """Возвращает file_id, если файл уже загружен и с тех пор не менялся."""
+        key = self._key(path)
+        entry = self._file_ids.get(key)
+        if entry is None:
+            return None
+        try:
+            if entry[0] == self.fingerprint(key):
+                return entry[1]
+        except OSError:
+            pass
+        self._file_ids.pop(key, None)
+        return None
+
+    def input_file(self, path: str) -> Union[str, FSInputFile]:
+        """file_id из кэша или FSInputFile для первой загрузки."""
+        return self.get(path) or FSInputFile(path=path)
+
+    def remember(self, path: str, message: Optional[Message]):
+        """Сохраняет file_id отправленного фото; запись в БД выполняется в фоне."""
+        if not message or not message.photo:
+            return
+        key = self._key(path)
+        try:
+            fingerprint = self.fingerprint(key)
+        except OSError:
+            return
+        file_id = message.photo[-1].file_id
+        if self._file_ids.get(key) == (fingerprint, file_id):
+            return
+        self._file_ids[key] = (fingerprint, file_id)
+        # Отдельная транзакция не должна ждать транзакцию обработчика, поэтому не блокируем отправку
+        task = asyncio.create_task(self._persist(key, fingerprint, file_id))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    def forget(self, path: str):
+        """Удаляет file_id, который Telegram перестал принимать."""
+        self._file_ids.pop(self._key(path), None)
+
+    async def _persist(self, key: str, fingerprint: str, file_id: str):
+        try:
+            async with self._persist_lock, AsyncSessionLocal() as session:
+                record = await session.get(TelegramFile, key)
+                if record:
+                    record.fingerprint, record.file_id, record.updated_at = fingerprint, file_id, datetime.now()
+                else:
+                    session.add(TelegramFile(path=key, fingerprint=fingerprint, file_id=file_id))
+                await session.commit()
+            logger.debug(f"file_id для {key} сохранён")
+        except Exception as e:
+            logger.error(f"Ошибка сохранения file_id для {key}: {str(e)}")
+
+    async def load(self):
+        """Загружает сохранённые file_id из БД."""
+        async with AsyncSessionLocal() as session:
+            records = (await session.scalars(select(TelegramFile))).all()
+        self._file_ids = {record.path: (record.fingerprint, record.file_id) for record in records}
+        logger.info(f"Загружено file_id из БД: {len(self._file_ids)}")
+
+    async def warm_up(self, bot: Bot, chat_id: str) -> int:
+        """Загружает в Telegram все картинки из photos/, которых ещё нет в кэше. Возвращает число загрузок."""
+        if not chat_id:
+            logger.warning("Прогрев кэша file_id пропущен: не задан чат для загрузки")
+            return 0
+        with send_priority(PRIORITY_BACKGROUND):
+            uploaded = await self._upload_missing(bot, chat_id)
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+        logger.info(f"Прогрев кэша file_id завершён, загружено файлов: {uploaded}")
+        return uploaded
+
+    async def _upload_missing(self, bot: Bot, chat_id: str) -> int:
+        uploaded = 0
+        for name in sorted(os.listdir(PHOTO_DIR)):
+            path = os.path.join(PHOTO_DIR, name)
+            if not name.lower().endswith(".jpg") or not os.path.isfile(path) or self.get(path):
+                continue
+            try:
+                message = await bot.send_photo(chat_id=chat_id, photo=FSInputFile(path=path), disable_notification=True)
+                self.remember(path, message)
+                uploaded += 1
+                await bot.delete_message(chat_id=chat_id, message_id=message.message_id)
+            except Exception as e:
+                logger.error(f"Ошибка прогрева file_id для {path}: {str(e)}")
+        return uploaded
+
+media_cache = MediaCache()
@@ -1,14 +1,50 @@
-from aiogram import Bot
+import asyncio
+from aiogram import Bot, Dispatcher
+from config import ADMIN_ID
 from utils import setup_logger
+from utils.http_client import start_http_client, close_http_client
+from utils.diagnostic_queue import diagnostic_queue
+from utils.blob_spool import blob_spool
+from utils.image_pipeline import image_pipeline
+from utils.media_cache import media_cache
+from utils.outbound import outbound_dispatcher
+from utils.status_updater import completion_scheduler
+from utils.reminder_manager import reminder_manager
+from utils.state_reaper import state_reaper
 
 logger = setup_logger(__name__)
 
-async def on_start(bot: Bot):
+_background_tasks = set()
+
+async def on_start(bot: Bot, dispatcher: Dispatcher):
     """Функция, выполняемая при старте бота."""
     logger.info(f"Бот {bot.id} успешно запущен")
+    outbound_dispatcher.start()
+    await start_http_client()
+    diagnostic_queue.start()
+    blob_spool.start()
+    reminder_manager.start(bot)
+    state_reaper.start(dispatcher.storage)
+    await media_cache.load()
+    # Загрузка картинок в Telegram идёт в фоне и не задерживает приём обновлений
+    task = asyncio.create_task(media_cache.warm_up(bot, ADMIN_ID))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
     # Здесь можно добавить другие действия при старте, например, отправку уведомления админу
 
-async def on_shutdown(bot: Bot):
+async def on_shutdown(bot: Bot, dispatcher: Dispatcher):
     """Функция, выполняемая при остановке бота."""
     logger.info(f"Бот {bot.id} останавливается")
+    await completion_scheduler.stop()
+    await reminder_manager.stop()
+    await state_reaper.stop()
+    await diagnostic_queue.stop()
+    await blob_spool.stop()
+    for task in list(_background_tasks):
+        task.cancel()
+    await outbound_dispatcher.stop()
+    await close_http_client()
+    image_pipeline.shutdown()
+    # Хранилище закрывается последним: очистка диалогов и очередь диагностики уже не пишут в него
+    await dispatcher.fsm.close()
     # Здесь можно добавить другие действия при остановке
\ No newline at end of file
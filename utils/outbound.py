@@ -0,0 +1,250 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Set
+from aiogram.exceptions import TelegramRetryAfter
+from config import (OUTBOUND_GLOBAL_RATE, OUTBOUND_CHAT_RATE, OUTBOUND_CHAT_BURST, OUTBOUND_GROUP_RATE_PER_MINUTE,
+                    OUTBOUND_MAX_RETRIES)
+from utils import setup_logger
+
+logger = setup_logger(__name__)
+
+# Полосы приоритета: меньшее значение отправляется раньше
+PRIORITY_INTERACTIVE = 0  # Ответы на действия пользователя и мастера
+PRIORITY_NOTIFICATION = 1  # Уведомления, порождённые действиями другого пользователя
+PRIORITY_BACKGROUND = 2  # Напоминания, прогрев кэша и прочие фоновые рассылки
+
+_current_priority: ContextVar[int] = ContextVar("outbound_priority", default=PRIORITY_INTERACTIVE)
+
+@contextmanager
+def send_priority(priority: int):
+    """Задаёт приоритет исходящих сообщений внутри блока with."""
+    token = _current_priority.set(priority)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+def current_priority() -> int:
+    return _current_priority.get()
+
+class TokenBucket:
+    """Маркерное ведро: rate маркеров в секунду, не больше capacity подряд."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """Сколько секунд ждать до следующего маркера (0 — можно отправлять)."""
+        self._refill(now)
+        wait = 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+        return max(wait, self.blocked_until - now)
+
+    def take(self, now: float):
+        self._refill(now)
+        self.tokens -= 1
+
+    def block(self, seconds: float):
+        """Запрещает отправку на seconds секунд (ответ Telegram retry_after)."""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def is_idle(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity and self.blocked_until <= now
+
+@dataclass
+class _Job:
+    chat_id: str
+    priority: int
+    send: Callable[[], Awaitable[Any]]
+    future: asyncio.Future
+    enqueued_at: float = field(default_factory=time.monotonic)
+    attempts: int = 0
+
+class OutboundDispatcher:
+    """Очередь исходящих сообщений с общим лимитом, лимитом на чат и полосами приоритета.
+
+    Сообщения одного чата уходят строго по очереди; ответ retry_after
+    приостанавливает чат и возвращает сообщение в начало его полосы.
+    """
+
+    MAX_IDLE_BUCKETS = 1024
+    LATENCY_WINDOW = 500
+
+    def __init__(self, global_rate: float = OUTBOUND_GLOBAL_RATE, chat_rate: float = OUTBOUND_CHAT_RATE,
+                 chat_burst: float = OUTBOUND_CHAT_BURST, group_rate_per_minute: float = OUTBOUND_GROUP_RATE_PER_MINUTE,
+                 max_retries: int = OUTBOUND_MAX_RETRIES):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate_per_minute / 60
+        self.max_retries = max_retries
+        self._lanes: Dict[int, Deque[_Job]] = {
+            priority: deque() for priority in (PRIORITY_INTERACTIVE, PRIORITY_NOTIFICATION, PRIORITY_BACKGROUND)
+        }
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._in_flight: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        # Метрики
+        self._latencies: Deque[float] = deque(maxlen=self.LATENCY_WINDOW)
+        self.sent = 0
+        self.failed = 0
+        self.retry_after = 0
+        self.max_queue_depth = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def _bucket(self, chat_id: str) -> TokenBucket:
+        bucket = self._buckets.get(chat_id)
+        if bucket is None:
+            # Отрицательный chat_id — группа или канал: у них лимит в минуту
+            if chat_id.startswith("-"):
+                bucket = TokenBucket(self.group_rate, 1)
+            else:
+                bucket = TokenBucket(self.chat_rate, self.chat_burst)
+            self._buckets[chat_id] = bucket
+        return bucket
+
+    def queue_depth(self) -> int:
+        return sum(len(lane) for lane in self._lanes.values())
+
+    async def submit(self, chat_id, send: Callable[[], Awaitable[Any]], priority: Optional[int] = None) -> Any:
+        """Ставит отправку в очередь и ждёт её результата."""
+        priority = current_priority() if priority is None else priority
+        job = _Job(str(chat_id), priority, send, asyncio.get_running_loop().create_future())
+        self._lanes[priority].append(job)
+        self.max_queue_depth = max(self.max_queue_depth, self.queue_depth())
+        self._wakeup.set()
+        return await job.future
+
+    def _next_ready(self, now: float):
+        """Возвращает первое готовое к отправке задание и время ожидания следующего."""
+        if not self.queue_depth():
+            return None, None
+        global_wait = self.global_bucket.wait_time(now)
+        if global_wait > 0:
+            return None, global_wait
+        best_wait = None
+        for priority in sorted(self._lanes):
+            blocked: Set[str] = set()
+            for job in self._lanes[priority]:
+                if job.chat_id in self._in_flight or job.chat_id in blocked:
+                    continue
+                wait = self._bucket(job.chat_id).wait_time(now)
+                if wait <= 0:
+                    return job, 0
+                blocked.add(job.chat_id)
+                best_wait = wait if best_wait is None else min(best_wait, wait)
+        return None, best_wait
+
+    async def _execute(self, job: _Job):
+        job.attempts += 1
+        try:
+            result = await job.send()
+        except TelegramRetryAfter as e:
+            self.retry_after += 1
+            self._bucket(job.chat_id).block(e.retry_after)
+            if job.attempts <= self.max_retries:
+                logger.warning(f"Флуд-контроль в чате {job.chat_id}: повтор через {e.retry_after} с")
+                self._lanes[job.priority].appendleft(job)
+            else:
+                self.failed += 1
+                if not job.future.done():
+                    job.future.set_exception(e)
+        except Exception as e:
+            self.failed += 1
+            if not job.future.done():
+                job.future.set_exception(e)
+        else:
+            self.sent += 1
+            self._latencies.append(time.monotonic() - job.enqueued_at)
+            if not job.future.done():
+                job.future.set_result(result)
+        finally:
+            self._in_flight.discard(job.chat_id)
+            self._wakeup.set()
+
+    def _prune_buckets(self, now: float):
+        if len(self._buckets) <= self.MAX_IDLE_BUCKETS:
+            return
+        queued = {job.chat_id for lane in self._lanes.values() for job in lane}
+        for chat_id in [c for c, b in self._buckets.items()
+                        if c not in queued and c not in self._in_flight and b.is_idle(now)]:
+            del self._buckets[chat_id]
+
+    async def run(self):
+        """Цикл выдачи сообщений по лимитам."""
+        while True:
+            self._wakeup.clear()
+            now = time.monotonic()
+            job, wait = self._next_ready(now)
+            if job is not None:
+                self._lanes[job.priority].remove(job)
+                if job.future.cancelled():
+                    continue
+                self.global_bucket.take(now)
+                self._bucket(job.chat_id).take(now)
+                self._in_flight.add(job.chat_id)
+                task = asyncio.create_task(self._execute(job))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+                continue
+            self._prune_buckets(now)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        """Запускает цикл отправки."""
+        if not self.running:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self, timeout: float = 5):
+        """Дожидается отправки очереди (не дольше timeout секунд) и останавливает цикл."""
+        deadline = time.monotonic() + timeout
+        while (self.queue_depth() or self._tasks) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for lane in self._lanes.values():
+            while lane:
+                job = lane.popleft()
+                if not job.future.done():
+                    job.future.set_exception(RuntimeError("Очередь исходящих сообщений остановлена"))
+
+    def get_stats(self) -> dict:
+        """Глубина очередей, счётчики и задержка от постановки в очередь до отправки."""
+        latencies = sorted(self._latencies)
+        return {
+            "queued": {priority: len(lane) for priority, lane in self._lanes.items()},
+            "in_flight": len(self._in_flight),
+            "max_queue_depth": self.max_queue_depth,
+            "sent": self.sent,
+            "failed": self.failed,
+            "retry_after": self.retry_after,
+            "latency_avg_ms": round(sum(latencies) / len(latencies) * 1000, 1) if latencies else 0,
+            "latency_p95_ms": round(latencies[int(len(latencies) * 0.95)] * 1000, 1) if latencies else 0,
+        }
+
+outbound_dispatcher = OutboundDispatcher()
@@ -0,0 +1,50 @@
+import time
+from aiogram import Bot
+from aiogram.types import Message
+from config import GPT_STREAM_EDIT_INTERVAL
+from utils import setup_logger
+
+logger = setup_logger(__name__)
+
+MAX_MESSAGE_LENGTH = 4000  # Запас до лимита Telegram в 4096 символов
+
+class ProgressiveMessage:
+    """Сообщение-заглушка, которое редактируется по мере генерации ответа.
+
+    Правки отправляются не чаще раза в interval секунд, чтобы не упираться
+    в лимиты Telegram на редактирование.
+    """
+
+    def __init__(self, bot: Bot, message: Message, header: str, interval: float = GPT_STREAM_EDIT_INTERVAL):
+        self.bot = bot
+        self.message = message
+        self.header = header
+        self.interval = interval
+        self._last_edit = 0.0
+        self._last_text = ""
+
+    @classmethod
+    async def send(cls, bot: Bot, chat_id: int, header: str, placeholder: str) -> "ProgressiveMessage":
+        """Отправляет заглушку и возвращает объект для её обновления."""
+        message = await bot.send_message(chat_id=chat_id, text=f"{header}\n{placeholder}")
+        return cls(bot, message, header)
+
+    async def update(self, text: str):
+        """Показывает накопленный текст, если с прошлой правки прошло достаточно времени."""
+        now = time.monotonic()
+        if not text or text == self._last_text or now - self._last_edit < self.interval:
+            return
+        self._last_edit = now
+        self._last_text = text
+        try:
+            await self.bot.edit_message_text(
+                chat_id=self.message.chat.id,
+                message_id=self.message.message_id,
+                text=f"{self.header}\n{text}▌"[:MAX_MESSAGE_LENGTH]
+            )
+        except Exception as e:
+            logger.debug(f"Не удалось обновить промежуточный ответ: {str(e)}")
+
+    @property
+    def message_id(self) -> int:
+        return self.message.message_id
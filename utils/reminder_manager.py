@@ -1,8 +1,17 @@
 import asyncio
+import heapq
+import time
 from aiogram import Bot
-from datetime import datetime
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
 import pytz
+from sqlalchemy import select, update, delete, event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload
+from config import REMINDER_TIME_MINUTES, REMINDER_RESYNC_MINUTES
+from database import AsyncSessionLocal, Booking, BookingStatus, Reminder
 from utils import setup_logger
+from utils.outbound import send_priority, PRIORITY_BACKGROUND
 
 logger = setup_logger(__name__)
 
@@ -14,55 +23,191 @@ def to_msk(dt: datetime) -> datetime:
         return MSK.localize(dt)
     return dt.astimezone(MSK)
 
+def msk_now() -> datetime:
+    """Текущее время MSK без часового пояса (в таком виде время хранится в БД)."""
+    return datetime.now(MSK).replace(tzinfo=None)
+
 class ReminderManager:
+    """Напоминания хранятся в таблице reminders, отправкой управляет один таймер над min-кучей."""
+
     def __init__(self):
-        self.reminders = {}
-
-    async def schedule(self, bot: Bot, booking_id: int, reminder_time: datetime, chat_id: str, message: str):
-        """Планирует напоминание о бронировании."""
-        try:
-            now = self.get_msk_time()
-            reminder_time = to_msk(reminder_time)
-            delay = (reminder_time - now).total_seconds()
-            if delay <= 0:
-                logger.info(f"Напоминание о booking_id={booking_id} в прошлом, пропустить")
-                return
-            self.reminders[booking_id] = asyncio.create_task(
-                self._send_reminder(bot, booking_id, delay, chat_id, message)
+        self._heap: List[Tuple[datetime, int]] = []
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.bot: Optional[Bot] = None
+
+    async def schedule(self, session: AsyncSession, booking: Booking, recipient: str, kind: str) -> Optional[Reminder]:
+        """Создаёт или переносит напоминание (запись, получатель, вид) в транзакции обработчика."""
+        send_at = datetime.combine(booking.date, booking.time) - timedelta(minutes=REMINDER_TIME_MINUTES)
+        if send_at <= msk_now():
+            logger.info(f"Напоминание о booking_id={booking.id} в прошлом, пропустить")
+            return None
+        reminder = await session.scalar(
+            select(Reminder).filter_by(booking_id=booking.id, recipient=str(recipient), kind=kind)
+        )
+        if reminder:
+            reminder.send_at = send_at
+            reminder.sent_at = None
+        else:
+            reminder = Reminder(booking_id=booking.id, recipient=str(recipient), kind=kind, send_at=send_at)
+            session.add(reminder)
+        logger.info(f"Запланировано напоминание ({kind}) для booking_id={booking.id} на {send_at}")
+        return reminder
+
+    async def cancel(self, session: AsyncSession, booking_id: int):
+        """Удаляет неотправленные напоминания записи."""
+        await session.execute(
+            delete(Reminder).where(Reminder.booking_id == booking_id, Reminder.sent_at.is_(None))
+        )
+        logger.info(f"Отменены напоминания для booking_id={booking_id}")
+
+    def arm(self, reminder_id: int, send_at: datetime):
+        """Добавляет напоминание в очередь таймера."""
+        heapq.heappush(self._heap, (send_at, reminder_id))
+        if self._heap[0] == (send_at, reminder_id):
+            self._wakeup.set()
+
+    async def _rehydrate(self):
+        """Загружает неотправленные напоминания из БД после запуска."""
+        async with AsyncSessionLocal() as session:
+            rows = (await session.execute(
+                select(Reminder.send_at, Reminder.id).filter(Reminder.sent_at.is_(None))
+            )).all()
+        # Напоминания, поставленные через schedule() во время загрузки, сохраняются
+        known = set(self._heap)
+        self._heap.extend(entry for entry in ((row.send_at, row.id) for row in rows) if entry not in known)
+        heapq.heapify(self._heap)
+        logger.info(f"Восстановлено напоминаний из БД: {len(self._heap)}")
+
+    @staticmethod
+    def _render(reminder: Reminder) -> str:
+        booking = reminder.booking
+        user, auto = booking.user, booking.auto
+        if reminder.kind == "master":
+            header = (
+                f"Напоминание: запись #{booking.id} через {REMINDER_TIME_MINUTES} минут! ⏰\n"
+                f"<b>Пользователь:</b> {user.first_name} {user.last_name or ''}\n"
             )
-            logger.info(f"Запланированное напоминание для booking_id={booking_id} at {reminder_time}")
-        except Exception as e:
-            logger.error(f"Напоминание о планировании ошибок для booking_id={booking_id}: {str(e)}")
-
-    async def _send_reminder(self, bot: Bot, booking_id: int, delay: float, chat_id: str, message: str):
-        """Отправляет напоминание после указанной задержки."""
-        try:
-            await asyncio.sleep(delay)
-            from database import Session, Booking, BookingStatus
-            with Session() as session:
-                booking = session.query(Booking).get(booking_id)
-                if booking and booking.status == BookingStatus.CONFIRMED:
-                    await bot.send_message(chat_id=chat_id, text=message, parse_mode="HTML")
-                    logger.info(f"Послал напоминание для booking_id={booking_id} до chat_id={chat_id}")
+        else:
+            header = f"Напоминание: ваша запись #{booking.id} через {REMINDER_TIME_MINUTES} минут! ⏰\n"
+        return (
+            f"{header}"
+            f"<b>Авто:</b> {auto.brand}, {auto.year}, {auto.license_plate}\n"
+            f"<b>Услуга:</b> {booking.service_name}\n"
+            f"<b>Время:</b> {booking.date.strftime('%d.%m.%Y')} {booking.time.strftime('%H:%M')}"
+        )
+
+    async def _send_due(self):
+        """Отправляет наступившие напоминания; каждое сначала захватывается условным UPDATE."""
+        now = msk_now()
+        due_ids = set()
+        while self._heap and self._heap[0][0] <= now:
+            due_ids.add(heapq.heappop(self._heap)[1])
+        if not due_ids:
+            return
+        outgoing = []
+        async with AsyncSessionLocal() as session:
+            reminders = (await session.scalars(
+                select(Reminder)
+                .options(joinedload(Reminder.booking).joinedload(Booking.user),
+                         joinedload(Reminder.booking).joinedload(Booking.auto))
+                .filter(Reminder.id.in_(due_ids), Reminder.sent_at.is_(None), Reminder.send_at <= now)
+            )).all()
+            for reminder in reminders:
+                booking = reminder.booking
+                if booking:
+                    expected = datetime.combine(booking.date, booking.time) - timedelta(minutes=REMINDER_TIME_MINUTES)
+                    if expected > now:
+                        # Запись перенесли на более позднее время: переставляем напоминание
+                        reminder.send_at = expected
+                        continue
+                claimed = await session.execute(
+                    update(Reminder)
+                    .where(Reminder.id == reminder.id, Reminder.sent_at.is_(None))
+                    .values(sent_at=now)
+                )
+                if claimed.rowcount != 1:
+                    continue
+                if booking and booking.status == BookingStatus.CONFIRMED \
+                        and datetime.combine(booking.date, booking.time) > now:
+                    outgoing.append((reminder, self._render(reminder)))
                 else:
-                    logger.info(f"Напоминание о booking_id={booking_id} Пропущен: бронирование не подтверждено")
-            del self.reminders[booking_id]
-        except Exception as e:
-            logger.error(f"Ошибка отправки напоминания для booking_id={booking_id}: {str(e)}")
-
-    def cancel(self, booking_id: int):
-        """Отменяет напоминание о бронировании."""
-        try:
-            task = self.reminders.get(booking_id)
-            if task:
-                task.cancel()
-                del self.reminders[booking_id]
-                logger.info(f"Отменено напоминание для booking_id={booking_id}")
-        except Exception as e:
-            logger.error(f"Ошибка отмены напоминания для booking_id={booking_id}: {str(e)}")
+                    logger.info(f"Напоминание для booking_id={reminder.booking_id} пропущено: запись не подтверждена")
+            await session.commit()
+        # Напоминания уступают очередь ответам пользователям и мастеру
+        with send_priority(PRIORITY_BACKGROUND):
+            results = await asyncio.gather(*(
+                self.bot.send_message(chat_id=reminder.recipient, text=text, parse_mode="HTML")
+                for reminder, text in outgoing
+            ), return_exceptions=True)
+        for (reminder, _), result in zip(outgoing, results):
+            if isinstance(result, Exception):
+                logger.error(f"Ошибка отправки напоминания для booking_id={reminder.booking_id}: {str(result)}")
+            else:
+                logger.info(f"Послал напоминание для booking_id={reminder.booking_id} до chat_id={reminder.recipient}")
+
+    async def run(self):
+        """Единственный цикл, обслуживающий все напоминания."""
+        # Первая загрузка выполняется внутри защищённого цикла: ошибка БД не останавливает задачу
+        resync_at = time.monotonic()
+        while True:
+            try:
+                self._wakeup.clear()
+                if time.monotonic() >= resync_at:
+                    # Напоминания мог создать другой процесс бота; двойной отправки не будет благодаря захвату в БД
+                    await self._rehydrate()
+                    resync_at = time.monotonic() + REMINDER_RESYNC_MINUTES * 60
+                delay = resync_at - time.monotonic()
+                if self._heap:
+                    delay = min(delay, (self._heap[0][0] - msk_now()).total_seconds())
+                if delay > 0:
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                        continue
+                    except asyncio.TimeoutError:
+                        pass
+                await self._send_due()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка цикла напоминаний: {str(e)}")
+                await asyncio.sleep(5)
+
+    def start(self, bot: Bot):
+        """Запускает цикл напоминаний."""
+        self.bot = bot
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        """Останавливает цикл напоминаний."""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
 
     def get_msk_time(self):
         """Возвращает текущее время в MSK."""
         return datetime.now(MSK)
 
-reminder_manager = ReminderManager()
\ No newline at end of file
+reminder_manager = ReminderManager()
+
+@event.listens_for(Session, "after_flush")
+def _collect_scheduled_reminders(session, flush_context):
+    """Запоминает созданные и перенесённые напоминания транзакции."""
+    pending = session.info.setdefault("pending_reminders", {})
+    for obj in (*session.new, *session.dirty):
+        if isinstance(obj, Reminder) and obj.sent_at is None:
+            pending[obj.id] = obj.send_at
+
+@event.listens_for(Session, "after_commit")
+def _arm_after_commit(session):
+    for reminder_id, send_at in session.info.pop("pending_reminders", {}).items():
+        reminder_manager.arm(reminder_id, send_at)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_on_rollback(session):
+    session.info.pop("pending_reminders", None)
@@ -0,0 +1,192 @@
+import asyncio
+import random
+import time
+from typing import Awaitable, Callable, Optional, Tuple
+import httpx
+from config import (YANDEX_MAX_RETRIES, YANDEX_RETRY_BACKOFF, BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_TIMEOUT,
+                    YANDEX_GPT_DEADLINE, YANDEX_GPT_HEDGE_AFTER, YANDEX_VISION_DEADLINE, YANDEX_VISION_HEDGE_AFTER)
+from utils import setup_logger
+
+logger = setup_logger(__name__)
+
+# Ответы, после которых запрос имеет смысл повторить
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+MAX_RETRY_AFTER = 10.0  # Дольше этого не ждём, даже если сервис просит
+
+class UpstreamUnavailable(Exception):
+    """Внешний сервис не ответил: цепь разомкнута, истёк срок или закончились повторы."""
+
+class CircuitBreaker:
+    """Размыкает цепь после серии ошибок и какое-то время сразу отказывает.
+
+    Через reset_timeout пропускается один пробный запрос: успех замыкает цепь,
+    ошибка снова размыкает её.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+                 reset_timeout: float = BREAKER_RESET_TIMEOUT):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0  # Ошибок подряд
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self.trips = 0
+        self.rejected = 0
+
+    def allow(self) -> bool:
+        """Можно ли выполнить запрос сейчас."""
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                self.rejected += 1
+                return False
+            self.state = self.HALF_OPEN
+            logger.info(f"{self.name}: пробный запрос после паузы")
+        if self.state == self.HALF_OPEN:
+            if self._probe_in_flight:
+                self.rejected += 1
+                return False
+            self._probe_in_flight = True
+        return True
+
+    def record_success(self):
+        """Сервис ответил: сбрасывает счётчик ошибок и замыкает цепь."""
+        if self.state != self.CLOSED:
+            logger.info(f"{self.name}: сервис снова отвечает, цепь замкнута")
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        """Запрос не удался: после failure_threshold ошибок подряд или неудачной пробы цепь размыкается."""
+        self.failures += 1
+        self._probe_in_flight = False
+        if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self.failures >= self.failure_threshold):
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+            self.trips += 1
+            logger.warning(f"{self.name}: цепь разомкнута после {self.failures} ошибок подряд на {self.reset_timeout:.0f} с")
+
+    def release(self):
+        """Отменённый запрос не считается ни успехом, ни ошибкой."""
+        self._probe_in_flight = False
+
+    def get_stats(self) -> dict:
+        """Состояние цепи, ошибки подряд, число размыканий и отказов."""
+        return {"state": self.state, "failures": self.failures, "trips": self.trips, "rejected": self.rejected}
+
+class ResilientUpstream:
+    """Вызовы внешнего API со сроком, повторами с джиттером, дублированием медленных запросов и предохранителем."""
+
+    def __init__(self, name: str, deadline: float, hedge_after: float = 0.0, retries: int = YANDEX_MAX_RETRIES,
+                 backoff: float = YANDEX_RETRY_BACKOFF):
+        self.name = name
+        self.deadline = deadline
+        self.hedge_after = hedge_after  # 0 — не дублировать
+        self.retries = retries
+        self.backoff = backoff
+        self.breaker = CircuitBreaker(name)
+        self.calls = 0
+        self.failed = 0
+        self.retried = 0
+        self.hedged = 0
+
+    async def request(self, send: Callable[[], Awaitable[httpx.Response]],
+                      deadline: Optional[float] = None) -> httpx.Response:
+        """Выполняет send() с повторами; возвращает ответ без 429/5xx или выбрасывает UpstreamUnavailable.
+
+        deadline — остаток общего срока вызова, если часть его уже потрачена; по умолчанию весь срок.
+        """
+        if not self.breaker.allow():
+            raise UpstreamUnavailable(f"{self.name}: сервис временно отключён после серии ошибок")
+        self.calls += 1
+        deadline = self.deadline if deadline is None else deadline
+        try:
+            response, error = await asyncio.wait_for(self._attempts(send), timeout=deadline)
+        except asyncio.TimeoutError:
+            response, error = None, f"истёк срок {deadline:.0f} с"
+        except BaseException:
+            self.breaker.release()
+            raise
+        if response is not None:
+            self.breaker.record_success()
+            return response
+        self.failed += 1
+        self.breaker.record_failure()
+        logger.error(f"{self.name}: запрос не выполнен: {error}")
+        raise UpstreamUnavailable(f"{self.name}: {error}")
+
+    async def _attempts(self, send: Callable[[], Awaitable[httpx.Response]]) -> Tuple[Optional[httpx.Response], str]:
+        error = ""
+        for attempt in range(self.retries + 1):
+            response = None
+            try:
+                response = await self._hedged(send)
+            except httpx.TransportError as e:
+                error = f"{type(e).__name__}: {str(e)}"
+            else:
+                if response.status_code not in RETRY_STATUSES:
+                    return response, ""
+                error = f"HTTP {response.status_code}"
+            if attempt == self.retries:
+                break
+            delay = self._retry_delay(response, attempt)
+            self.retried += 1
+            logger.warning(f"{self.name}: {error}, повтор {attempt + 1}/{self.retries} через {delay:.1f} с")
+            await asyncio.sleep(delay)
+        return None, error
+
+    def _retry_delay(self, response: Optional[httpx.Response], attempt: int) -> float:
+        """Retry-After от сервиса или экспоненциальная пауза с полным джиттером."""
+        if response is not None:
+            try:
+                return min(float(response.headers["Retry-After"]), MAX_RETRY_AFTER)
+            except (KeyError, ValueError):
+                pass
+        return random.uniform(0, self.backoff * 2 ** attempt)
+
+    async def _hedged(self, send: Callable[[], Awaitable[httpx.Response]]) -> httpx.Response:
+        """Если ответа нет через hedge_after секунд, отправляет копию запроса и берёт первый удачный ответ."""
+        if self.hedge_after <= 0:
+            return await send()
+        tasks = {asyncio.create_task(send())}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.hedge_after)
+            if not done:
+                self.hedged += 1
+                logger.info(f"{self.name}: нет ответа за {self.hedge_after:.1f} с, дублирую запрос")
+                tasks.add(asyncio.create_task(send()))
+            pending = set(tasks)
+            result: Optional[httpx.Response] = None
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        error = task.exception()
+                    elif task.result().status_code not in RETRY_STATUSES:
+                        return task.result()
+                    else:
+                        result = task.result()
+            if result is not None:
+                return result
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def get_stats(self) -> dict:
+        """Состояние предохранителя и счётчики вызовов, повторов и дублей."""
+        return {
+            **self.breaker.get_stats(),
+            "calls": self.calls,
+            "failed": self.failed,
+            "retried": self.retried,
+            "hedged": self.hedged,
+        }
+
+gpt_upstream = ResilientUpstream("Yandex GPT", deadline=YANDEX_GPT_DEADLINE, hedge_after=YANDEX_GPT_HEDGE_AFTER)
+vision_upstream = ResilientUpstream("Yandex Vision", deadline=YANDEX_VISION_DEADLINE, hedge_after=YANDEX_VISION_HEDGE_AFTER)
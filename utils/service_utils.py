@@ -1,12 +1,20 @@
 from typing import Tuple, Optional, List
 from aiogram import Bot
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton, FSInputFile
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
 from aiogram.fsm.context import FSMContext
-from sqlalchemy.orm import Session
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload
+from sqlalchemy.ext.asyncio import AsyncSession
 from database import User, Auto, Booking, BookingStatus
 from config import ADMIN_ID, REMINDER_TIME_MINUTES
 from utils import setup_logger
+from utils.media_cache import media_cache
+from utils.outbound import send_priority, PRIORITY_NOTIFICATION
 from datetime import datetime, timedelta
+import functools
+import inspect
 import os
 
 logger = setup_logger(__name__)
@@ -21,9 +29,25 @@ async def send_message(bot: Bot, chat_id: str, message_type: str, message: str =
             if not photo:
                 logger.error("Параметр 'photo' не предоставлен для отправки фото")
                 return None
-            # Если photo — строка и это путь к файлу, преобразуем в FSInputFile
+            # Если photo — путь к файлу, отправляем сохранённый file_id или загружаем файл
             if isinstance(photo, str) and os.path.isfile(photo):
-                photo = FSInputFile(path=photo)
+                path = photo
+                file_id = media_cache.get(path)
+                if file_id:
+                    try:
+                        return await bot.send_photo(chat_id=chat_id, photo=file_id, caption=message,
+                                                    parse_mode="HTML", **kwargs)
+                    except TelegramBadRequest as e:
+                        logger.warning(f"file_id для {path} отклонён, загружаем файл заново: {str(e)}")
+                        media_cache.forget(path)
+                sent = await bot.send_photo(chat_id=chat_id,
+                                            photo=FSInputFile(path=path),
+                                            caption=message,
+                                            parse_mode="HTML",
+                                            **kwargs
+                                            )
+                media_cache.remember(path, sent)
+                return sent
             return await bot.send_photo(chat_id=chat_id,
                                         photo=photo,
                                         caption=message,
@@ -32,6 +56,9 @@ async def send_message(bot: Bot, chat_id: str, message_type: str, message: str =
                                         )
         logger.warning(f"Неизвестный тип сообщения: {message_type}")
         return None
+    except TelegramRetryAfter as e:
+        logger.error(f"Сообщение в чат {chat_id} не отправлено после повторов (флуд-контроль): {str(e)}")
+        return None
     except Exception as e:
         logger.error(f"Ошибка отправки сообщения в чат {chat_id}: {str(e)}")
         return None
@@ -76,7 +103,7 @@ async def get_progress_bar(
         return "{message}"
 
 async def check_user_and_autos(
-    session: Session,
+    session: AsyncSession,
     user_id: str,
     bot: Bot,
     source: Message | CallbackQuery,
@@ -86,7 +113,10 @@ async def check_user_and_autos(
     """Проверяет, зарегистрирован ли пользователь и есть ли у него автомобили."""
     from keyboards.main_kb import Keyboards
     try:
-        user = session.query(User).filter_by(telegram_id=user_id).first()
+        # Пользователь и его автомобили загружаются одним запросом
+        user = (await session.scalars(
+            select(User).options(joinedload(User.autos)).filter_by(telegram_id=user_id)
+        )).unique().first()
         if not user:
             logger.info(f"Пользователь {user_id} не зарегистрирован в контексте {context}")
             chat_id = str(source.chat.id) if isinstance(source, Message) else str(source.message.chat.id)
@@ -99,8 +129,7 @@ async def check_user_and_autos(
                 await state.update_data(last_message_id=sent_message.message_id)
             await state.clear()
             return None, []
-        autos = session.query(Auto).filter_by(user_id=user.id).all()
-        return user, autos
+        return user, list(user.autos)
     except Exception as e:
         logger.error(f"Ошибка проверки пользователя {user_id} в контексте {context}: {str(e)}")
         await handle_error(source,
@@ -112,7 +141,7 @@ async def check_user_and_autos(
         return None, []
 
 async def check_user_registered(
-    session: Session,
+    session: AsyncSession,
     user_id: str,
     bot: Bot,
     source: Message | CallbackQuery,
@@ -122,7 +151,7 @@ async def check_user_registered(
     """Проверяет, зарегистрирован ли пользователь."""
     from keyboards.main_kb import Keyboards
     try:
-        user = session.query(User).filter_by(telegram_id=user_id).first()
+        user = await session.scalar(select(User).filter_by(telegram_id=user_id))
         if not user:
             logger.info(f"Пользователь {user_id} не зарегистрирован в контексте {context}")
             chat_id = str(source.chat.id) if isinstance(source, Message) else str(source.message.chat.id)
@@ -148,16 +177,20 @@ async def check_user_registered(
 
 def master_only(func):
     """Декоратор: доступ только для мастера."""
-    async def wrapper(callback: CallbackQuery, state: FSMContext, bot: Bot):
+    # Передаём обработчику только те зависимости (state, bot, session...), которые он объявил
+    params = set(inspect.signature(func).parameters)
+
+    @functools.wraps(func)
+    async def wrapper(callback: CallbackQuery, **kwargs):
         if str(callback.from_user.id) != ADMIN_ID:
             logger.warning(f"Несанкционированный доступ: user_id={callback.from_user.id}")
             await callback.answer("Доступ только для мастера. 🔒")
             return
-        return await func(callback, state, bot)
+        return await func(callback, **{k: v for k, v in kwargs.items() if k in params})
     return wrapper
 
 async def get_booking_context(
-    session: Session,
+    session: AsyncSession,
     booking_id: int,
     bot: Bot,
     source: Message | CallbackQuery,
@@ -165,7 +198,10 @@ async def get_booking_context(
 ) -> Tuple[Optional[Booking], Optional[User], Optional[Auto]]:
     """Получает контекст бронирования."""
     try:
-        booking = session.query(Booking).get(booking_id)
+        # Запись, клиент и автомобиль загружаются одним запросом
+        booking = await session.scalar(
+            select(Booking).options(joinedload(Booking.user), joinedload(Booking.auto)).filter_by(id=booking_id)
+        )
         if not booking:
             logger.warning(f"Запись booking_id={booking_id} не найдена")
             await handle_error(
@@ -173,9 +209,7 @@ async def get_booking_context(
                 "Запись не найдена. 📝", f"Запись не найдена для booking_id={booking_id}", Exception("Запись не найдена")
             )
             return None, None, None
-        user = session.query(User).get(booking.user_id)
-        auto = session.query(Auto).get(booking.auto_id)
-        return booking, user, auto
+        return booking, booking.user, booking.auto
     except Exception as e:
         logger.error(f"Ошибка получения контекста записи booking_id={booking_id}: {str(e)}")
         await handle_error(source, state, bot, "Ошибка. Попробуйте снова. 😔", f"Ошибка контекста записи booking_id={booking_id}", e)
@@ -212,11 +246,13 @@ async def send_booking_notification(
                 f"<b>Время:</b> {booking.time.strftime('%H:%M')} ⏰"
             )
         logger.debug(f"Отправка уведомления для booking_id={booking.id}, status={booking.status}, text: {text}")
-        sent_message = await send_message(
-            bot, chat_id, "text",
-            text,
-            reply_markup=reply_markup
-        )
+        # Уведомление другому участнику уступает очередь ответу на текущее действие
+        with send_priority(PRIORITY_NOTIFICATION):
+            sent_message = await send_message(
+                bot, chat_id, "text",
+                text,
+                reply_markup=reply_markup
+            )
         return bool(sent_message)
     except Exception as e:
         logger.error(f"Ошибка отправки уведомления в чат {chat_id} для booking_id={booking.id}: {str(e)}")
@@ -225,19 +261,16 @@ async def send_booking_notification(
 async def set_user_state(
     bot_id: int,
     user_id: str,
-    storage,
-    state: str,
+    storage: BaseStorage,
+    state: StateType,
     data: dict
 ) -> bool:
-    """Устанавливает состояние FSM для пользователя."""
+    """Устанавливает состояние FSM для пользователя в его личном чате с ботом."""
     try:
-        from aiogram.fsm.storage.memory import MemoryStorage
-        if isinstance(storage, MemoryStorage):
-            storage_key = f"{bot_id}:{user_id}"
-            storage.storage[storage_key] = {"state": state, "data": data}
-            return True
-        logger.warning(f"Неподдерживаемый тип хранилища: {type(storage)}")
-        return False
+        key = StorageKey(bot_id=bot_id, chat_id=int(user_id), user_id=int(user_id))
+        await storage.set_state(key, state)
+        await storage.set_data(key, data)
+        return True
     except Exception as e:
         logger.error(f"Ошибка установки состояния для user_id={user_id}: {str(e)}")
         return False
@@ -255,44 +288,23 @@ async def notify_master(bot: Bot, booking: Booking, user: User, auto: Auto) -> b
         reply_markup=keyboard
     )
 
-async def schedule_reminder(bot: Bot, booking: Booking, user: User, auto: Auto):
-    """Планирует напоминание мастеру."""
+async def schedule_reminder(session: AsyncSession, booking: Booking):
+    """Планирует напоминание мастеру (отправляется, только если запись будет подтверждена)."""
     try:
         from utils import reminder_manager
-        if booking.status != BookingStatus.PENDING:
-            return
-        reminder_time = datetime.combine(booking.date, booking.time) - timedelta(minutes=REMINDER_TIME_MINUTES)
-        if reminder_time <= datetime.now():
+        if booking.status not in (BookingStatus.PENDING, BookingStatus.CONFIRMED):
             return
-        await reminder_manager.schedule(
-            bot, booking.id, reminder_time,
-            ADMIN_ID,
-            f"Напоминание: запись #{booking.id} через {REMINDER_TIME_MINUTES} минут! ⏰\n"
-            f"<b>Пользователь:</b> {user.first_name} {user.last_name or ''}\n"
-            f"<b>Авто:</b> {auto.brand}, {auto.year}, {auto.license_plate}\n"
-            f"<b>Услуга:</b> {booking.service_name}\n"
-            f"<b>Время:</b> {booking.date.strftime('%d.%m.%Y')} {booking.time.strftime('%H:%M')}"
-        )
+        await reminder_manager.schedule(session, booking, ADMIN_ID, "master")
     except Exception as e:
         logger.error(f"Ошибка планирования напоминания для booking_id={booking.id}: {str(e)}")
 
-async def schedule_user_reminder(bot: Bot, booking: Booking, user: User, auto: Auto):
-    """Планирует напоминание пользователю."""
+async def schedule_user_reminder(session: AsyncSession, booking: Booking, user: User):
+    """Планирует напоминание пользователю (отправляется, только если запись будет подтверждена)."""
     try:
         from utils import reminder_manager
-        if booking.status != BookingStatus.CONFIRMED:
-            return
-        reminder_time = datetime.combine(booking.date, booking.time) - timedelta(minutes=REMINDER_TIME_MINUTES)
-        if reminder_time <= datetime.now():
+        if booking.status not in (BookingStatus.PENDING, BookingStatus.CONFIRMED):
             return
-        await reminder_manager.schedule(
-            bot, booking.id, reminder_time,
-            user.telegram_id,
-            f"Напоминание: ваша запись #{booking.id} через {REMINDER_TIME_MINUTES} минут! ⏰\n"
-            f"<b>Авто:</b> {auto.brand}, {auto.year}, {auto.license_plate}\n"
-            f"<b>Услуга:</b> {booking.service_name}\n"
-            f"<b>Время:</b> {booking.date.strftime('%d.%m.%Y')} {booking.time.strftime('%H:%M')}"
-        )
+        await reminder_manager.schedule(session, booking, user.telegram_id, "user")
     except Exception as e:
         logger.error(f"Ошибка планирования напоминания пользователю для booking_id={booking.id}: {str(e)}")
 
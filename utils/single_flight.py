@@ -0,0 +1,67 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional
+from utils import setup_logger
+
+logger = setup_logger(__name__)
+
+PartialCallback = Callable[[str], Awaitable[None]]
+
+class _Flight:
+    def __init__(self):
+        self.task: Optional[asyncio.Task] = None
+        self.subscribers: List[PartialCallback] = []
+        self.last_partial = ""
+
+    async def publish(self, text: str):
+        """Рассылает промежуточный ответ всем ожидающим."""
+        self.last_partial = text
+        for callback in list(self.subscribers):
+            try:
+                await callback(text)
+            except Exception as e:
+                logger.debug(f"Ошибка обновления промежуточного ответа: {str(e)}")
+
+class SingleFlight:
+    """Объединяет одинаковые запросы, выполняющиеся одновременно.
+
+    Первый вызов с ключом выполняет запрос, остальные ждут его результат;
+    промежуточные ответы потока получают все ожидающие.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._flights: Dict[str, _Flight] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[PartialCallback], Awaitable[str]],
+                 on_partial: Optional[PartialCallback] = None) -> str:
+        """Выполняет fn(publish) или присоединяется к уже идущему запросу с тем же ключом."""
+        self.calls += 1
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight()
+            flight.task = asyncio.create_task(fn(flight.publish))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _: self._flights.pop(key, None))
+        else:
+            self.coalesced += 1
+            logger.info(f"Запрос {self.name} присоединён к уже выполняющемуся")
+            if on_partial is not None and flight.last_partial:
+                # Присоединившийся сразу видит уже сгенерированную часть ответа
+                try:
+                    await on_partial(flight.last_partial)
+                except Exception as e:
+                    logger.debug(f"Ошибка обновления промежуточного ответа: {str(e)}")
+        if on_partial is not None:
+            flight.subscribers.append(on_partial)
+        try:
+            # Отмена одного ожидающего не должна отменять общий запрос
+            return await asyncio.shield(flight.task)
+        finally:
+            if on_partial is not None and on_partial in flight.subscribers:
+                flight.subscribers.remove(on_partial)
+
+    def get_stats(self) -> dict:
+        """Сколько было вызовов, сколько из них присоединено к идущему запросу и сколько запросов идёт сейчас."""
+        return {"calls": self.calls, "coalesced": self.coalesced, "in_flight": len(self._flights)}
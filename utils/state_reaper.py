@@ -0,0 +1,169 @@
+import asyncio
+import os
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+from aiogram.fsm.storage.base import BaseStorage
+from config import FSM_IDLE_MINUTES, FSM_IDLE_DEFAULT_MINUTES, STATE_REAPER_INTERVAL_MINUTES, UPLOAD_USER_DIR
+from utils import setup_logger
+from utils.blob_spool import blob_spool
+from utils.fsm_storage import dumps_state_data, RedisStateScanner
+
+logger = setup_logger(__name__)
+
+# Состояния, в которых загруженные файлы ещё не привязаны к сохранённому отзыву
+REVIEW_DRAFT_STATES = {
+    "ProfileStates:AwaitingReviewRating",
+    "ProfileStates:AwaitingReviewText",
+    "ProfileStates:AwaitingReviewPhotos",
+    "ProfileStates:AwaitingReviewVideo",
+    "ProfileStates:ConfirmReview",
+}
+
+def _temp_media(state: Optional[str], data: Dict[str, Any]) -> Tuple[List[str], List[str]]:
+    """Файлы черновика отзыва и ссылки на фото диагностики в спуле, которые держит состояние."""
+    paths = []
+    if state in REVIEW_DRAFT_STATES:
+        paths = list(data.get("review_photos") or [])
+        if data.get("review_video"):
+            paths.append(data["review_video"])
+    return paths, list(data.get("photo_refs") or [])
+
+def _remove_upload(path: str) -> bool:
+    # Удаляются только загрузки пользователей, а не любой путь из данных состояния
+    if os.path.dirname(os.path.realpath(path)) != os.path.realpath(UPLOAD_USER_DIR):
+        logger.warning(f"Файл {path} вне {UPLOAD_USER_DIR}, не удаляется")
+        return False
+    try:
+        os.remove(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+def _file_size(path: str) -> int:
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+class StateReaper:
+    """Очищает диалоги, брошенные пользователями, и удаляет временные файлы, на которые они ссылаются.
+
+    Срок бездействия задаётся для каждой группы состояний в FSM_IDLE_MINUTES. Работает с хранилищами
+    sqlite, memory и redis; в Redis состояние удаляется, только если его не меняли после снимка,
+    поэтому очистку можно запускать в каждом процессе бота.
+    """
+
+    def __init__(self, idle_minutes: Dict[str, int] = FSM_IDLE_MINUTES,
+                 default_minutes: int = FSM_IDLE_DEFAULT_MINUTES,
+                 interval_minutes: float = STATE_REAPER_INTERVAL_MINUTES):
+        self.idle_minutes = dict(idle_minutes)
+        self.default_minutes = default_minutes
+        self.interval = interval_minutes * 60
+        self.storage: Optional[Any] = None
+        self._task: Optional[asyncio.Task] = None
+        self.reaped = 0
+        self.files_removed = 0
+        self.live_states: Dict[str, int] = {}
+        self.data_bytes = 0
+        self.media_bytes = 0
+
+    def idle_timeout(self, state: Optional[str]) -> float:
+        """Секунд бездействия до очистки состояния; 0 — не очищать."""
+        group = state.split(":", 1)[0] if state else ""
+        return self.idle_minutes.get(group, self.default_minutes) * 60
+
+    async def sweep(self) -> int:
+        """Очищает брошенные состояния, обновляет статистику и возвращает число очищенных."""
+        snapshot = await self.storage.snapshot()
+        now = time.time()
+        live_states = Counter()
+        reaped = data_bytes = 0
+        live_paths, live_refs = [], set()
+        expired_paths, expired_refs = [], {}
+        for key, state, data, touched in snapshot:
+            paths, refs = _temp_media(state, data)
+            timeout = self.idle_timeout(state)
+            if timeout and now - touched > timeout and await self._drop(key, touched):
+                reaped += 1
+                logger.debug(f"Состояние {state} ({key}) очищено после {(now - touched) / 60:.0f} мин бездействия")
+                expired_paths.extend(paths)
+                for ref in refs:
+                    expired_refs[ref] = max(timeout, expired_refs.get(ref, 0))
+                continue
+            live_states[state.split(":", 1)[0] if state else "без состояния"] += 1
+            data_bytes += len(str(state or "")) + len(dumps_state_data(data).encode("utf-8"))
+            live_paths.extend(paths)
+            live_refs.update(refs)
+        # Одно фото в спуле может держать и живой диалог другого пользователя
+        for ref in live_refs:
+            expired_refs.pop(ref, None)
+        removed = await asyncio.to_thread(self._remove_files, expired_paths, expired_refs)
+        media_bytes = await asyncio.to_thread(self._media_size, live_paths, live_refs)
+        self.reaped += reaped
+        self.files_removed += removed
+        self.live_states = dict(live_states)
+        self.data_bytes = data_bytes
+        self.media_bytes = media_bytes
+        if reaped:
+            logger.info(f"Очищено брошенных диалогов: {reaped}, удалено временных файлов: {removed}")
+        return reaped
+
+    async def _drop(self, key: Any, touched: float) -> bool:
+        """Удаляет брошенное состояние; False, если пользователь успел его изменить."""
+        if isinstance(self.storage, RedisStateScanner):
+            return await self.storage.drop_if_idle(key, touched)
+        # В памяти решение и удаление идут без переключения задач, пользователь не вклинится между ними
+        self.storage.drop(key)
+        return True
+
+    @staticmethod
+    def _remove_files(paths: List[str], refs: Dict[str, float]) -> int:
+        removed = sum(_remove_upload(path) for path in paths)
+        return removed + sum(blob_spool.discard(ref, idle) for ref, idle in refs.items())
+
+    @staticmethod
+    def _media_size(paths: List[str], refs) -> int:
+        return sum(_file_size(path) for path in paths) + sum(blob_spool.size(ref) for ref in refs)
+
+    async def run(self):
+        """Периодически очищает брошенные диалоги."""
+        while True:
+            try:
+                await self.sweep()
+            except Exception as e:
+                logger.error(f"Ошибка очистки брошенных диалогов: {str(e)}")
+            await asyncio.sleep(self.interval)
+
+    def start(self, storage: BaseStorage):
+        """Запускает очистку для хранилища диспетчера."""
+        if hasattr(storage, "redis"):
+            storage = RedisStateScanner(storage)
+            if not storage.enabled:
+                logger.warning("Без FSM_STATE_TTL время изменения состояний в Redis неизвестно, очистка не запускается")
+                return
+        elif not hasattr(storage, "snapshot"):
+            logger.info(f"{type(storage).__name__} не поддерживает очистку брошенных диалогов")
+            return
+        self.storage = storage
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        """Останавливает очистку."""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def get_stats(self) -> dict:
+        """Живые состояния по группам, их примерный объём и сколько очищено с запуска."""
+        return {
+            "states": self.live_states,
+            "data_bytes": self.data_bytes,
+            "media_bytes": self.media_bytes,
+            "reaped": self.reaped,
+            "files_removed": self.files_removed,
+        }
+
+state_reaper = StateReaper()
@@ -1,34 +1,137 @@
 import asyncio
-from datetime import datetime, timedelta
+import heapq
+from datetime import datetime
+from typing import List, Optional, Tuple
+from sqlalchemy import select, update, event
 from sqlalchemy.orm import Session
-from database import Booking, BookingStatus, Session as DBSession
-from config import SERVICES
+from database import Booking, BookingStatus, AsyncSessionLocal
 from utils import setup_logger
 
 logger = setup_logger(__name__)
 
-async def update_booking_statuses():
-    """Фоновая задача для обновления статуса записей на COMPLETED."""
-    while True:
+class CompletionScheduler:
+    """Переводит подтверждённые записи в COMPLETED точно по их end_at.
+
+    Ближайшие сроки хранятся в min-куче. Задача спит до вершины кучи и будится
+    раньше, если появляется более ранний срок.
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[datetime, int]] = []
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def arm(self, booking_id: int, end_at: datetime):
+        """Добавляет срок завершения записи (при подтверждении или переносе)."""
+        if end_at is None:
+            return
+        heapq.heappush(self._heap, (end_at, booking_id))
+        if self._heap[0] == (end_at, booking_id):
+            self._wakeup.set()
+        logger.debug(f"Завершение записи #{booking_id} запланировано на {end_at}")
+
+    async def _seed(self):
+        """Загружает сроки всех подтверждённых записей из БД."""
+        async with AsyncSessionLocal() as session:
+            rows = (await session.execute(
+                select(Booking.end_at, Booking.id).filter(Booking.status == BookingStatus.CONFIRMED)
+            )).all()
+        # Сроки, добавленные через arm() во время загрузки, сохраняются
+        self._heap.extend((row.end_at, row.id) for row in rows if row.end_at)
+        heapq.heapify(self._heap)
+        logger.info(f"Планировщик завершения записей: загружено сроков: {len(self._heap)}")
+
+    async def _complete_due(self):
+        """Одним UPDATE завершает все записи, чей срок наступил."""
+        now = datetime.now()
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            due.append(heapq.heappop(self._heap))
+        if not due:
+            return
         try:
-            with DBSession() as session:
-                bookings = session.query(Booking).filter(
-                    Booking.status == BookingStatus.CONFIRMED
-                ).all()
-                current_time = datetime.now()
-                for booking in bookings:
-                    booking_datetime = datetime.combine(booking.date, booking.time)
-                    service = next((s for s in SERVICES if s["name"] == booking.service_name), None)
-                    duration = service["duration_minutes"] if service else 60  # По умолчанию 60 минут для "Ремонт"
-                    end_time = booking_datetime + timedelta(minutes=duration)
-                    if current_time >= end_time:
-                        booking.status = BookingStatus.COMPLETED
-                        logger.info(f"Запись #{booking.id} обновлена до статуса COMPLETED")
-                session.commit()
-        except Exception as e:
-            logger.error(f"Ошибка обновления статусов записей: {str(e)}")
-        await asyncio.sleep(300)  # Проверка каждые 5 минут
+            async with AsyncSessionLocal() as session:
+                # Условие по end_at отсекает устаревшие элементы кучи после переноса записи
+                result = await session.execute(
+                    update(Booking)
+                    .where(Booking.id.in_({booking_id for _, booking_id in due}),
+                           Booking.status == BookingStatus.CONFIRMED, Booking.end_at <= now)
+                    .values(status=BookingStatus.COMPLETED)
+                )
+                await session.commit()
+        except BaseException:
+            # Сроки возвращаются в кучу, следующая попытка завершит эти записи
+            for item in due:
+                heapq.heappush(self._heap, item)
+            raise
+        if result.rowcount:
+            logger.info(f"Записи переведены в статус COMPLETED: {result.rowcount}")
+
+    async def run(self):
+        """Основной цикл планировщика."""
+        while True:
+            try:
+                await self._seed()
+                break
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка загрузки сроков завершения записей: {str(e)}")
+                await asyncio.sleep(5)
+        while True:
+            try:
+                self._wakeup.clear()
+                if self._heap:
+                    delay = (self._heap[0][0] - datetime.now()).total_seconds()
+                    if delay > 0:
+                        try:
+                            await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                            continue
+                        except asyncio.TimeoutError:
+                            pass
+                    await self._complete_due()
+                else:
+                    await self._wakeup.wait()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка обновления статусов записей: {str(e)}")
+                await asyncio.sleep(5)
+
+    def start(self):
+        """Запускает фоновую задачу планировщика."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        """Останавливает фоновую задачу планировщика."""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+completion_scheduler = CompletionScheduler()
+
+@event.listens_for(Session, "after_flush")
+def _collect_confirmed_bookings(session, flush_context):
+    """Запоминает подтверждённые или перенесённые записи текущей транзакции."""
+    armed = session.info.setdefault("completion_deadlines", {})
+    for obj in (*session.new, *session.dirty):
+        if isinstance(obj, Booking) and obj.status == BookingStatus.CONFIRMED and obj.end_at:
+            armed[obj.id] = obj.end_at
+
+@event.listens_for(Session, "after_commit")
+def _arm_after_commit(session):
+    for booking_id, end_at in session.info.pop("completion_deadlines", {}).items():
+        completion_scheduler.arm(booking_id, end_at)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_on_rollback(session):
+    session.info.pop("completion_deadlines", None)
 
 def start_status_updater():
     """Запускает фоновую задачу обновления статусов."""
-    asyncio.create_task(update_booking_statuses())
\ No newline at end of file
+    completion_scheduler.start()
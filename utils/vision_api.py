@@ -1,86 +1,185 @@
-import httpx
+import asyncio
 import base64
+import hashlib
 import json
-from config import YANDEX_FOLDER_ID, YANDEX_API_KEY, AI_PROMPT
+from typing import List, Optional, Tuple
+from config import YANDEX_FOLDER_ID, YANDEX_API_KEY, AI_PROMPT, VISION_MAX_CONCURRENCY
 from utils import setup_logger
+from utils.http_client import get_http_client
+from utils.gpt_helper import post_completion, PartialCallback
+from utils.diagnostic_cache import diagnostic_cache, image_key, recognition_key, text_key
+from utils.image_hash import dhash
+from utils.single_flight import SingleFlight
+from utils.resilience import vision_upstream, UpstreamUnavailable
 
 logger = setup_logger(__name__)
 
-async def analyze_images(image_data_list: list, user_comment: str) -> str:
-    """Анализирует изображения с помощью Yandex Vision и комментарий с помощью Yandex GPT."""
+# Одинаковые фото с одинаковым описанием, пришедшие одновременно, анализируются одним запросом
+vision_flight = SingleFlight("анализа фото")
+# Одно и то же фото распознаётся один раз, даже если описания к нему разные
+recognition_flight = SingleFlight("распознавания фото")
+
+def images_key(image_data_list: List[bytes], user_comment: str) -> str:
+    """Ключ запроса анализа по содержимому фото и нормализованному описанию."""
+    parts = [image_key(image_data) for image_data in image_data_list] + [text_key(user_comment or "")]
+    return f"vis:{hashlib.sha256('|'.join(parts).encode('utf-8')).hexdigest()}"
+
+async def _recognize_image(image_data: bytes, auth_header: dict, semaphore: asyncio.Semaphore) -> str:
+    """Распознаёт текст одного изображения; при ошибке выбрасывает UpstreamUnavailable."""
+    try:
+        logger.info("Обработка изображения с API Yandex Vision")
+        image_base64 = base64.b64encode(image_data).decode('utf-8')
+        request_body = {
+            "folderId": YANDEX_FOLDER_ID,
+            "analyze_specs": [
+                {
+                    "content": image_base64,
+                    "features": [
+                        {
+                            "type": "TEXT_DETECTION",
+                            "text_detection_config": {
+                                "language_codes": ["en", "ru"]
+                            }
+                        }
+                    ]
+                }
+            ]
+        }
+        logger.debug(f"Vision API -запрос тела: {json.dumps(request_body)[:200]}...")
+        client = get_http_client()
+        async with semaphore:
+            response = await vision_upstream.request(lambda: client.post(
+                "https://vision.api.cloud.yandex.net/vision/v1/batchAnalyze",
+                headers=auth_header,
+                json=request_body
+            ))
+        logger.debug(f"Статус ответа API Vision: {response.status_code}")
+        if response.status_code == 200:
+            result = response.json()
+            logger.debug(f"Ответ API Vision: {json.dumps(result)[:200]}...")
+            text = ""
+            for spec in result.get("results", [])[0].get("results", []):
+                for block in spec.get("textDetection", {}).get("pages", [])[0].get("blocks", []):
+                    for line in block.get("lines", []):
+                        text += " ".join([entity["text"] for entity in line["words"]]) + " "
+            if text.strip():
+                logger.info(f"Обнаруженный текст: {text[:100]}")
+                return text.strip()
+            logger.info("Нет текста, обнаруженного на изображении")
+            return "Текст не распознан"
+        logger.error(f"Ошибка API API Yandex Vision: {response.status_code} - {response.text}")
+        raise UpstreamUnavailable(f"Yandex Vision: HTTP {response.status_code}")
+    except UpstreamUnavailable:
+        raise
+    except Exception as e:
+        logger.error(f"Ошибка обработки изображения: {str(e)}")
+        raise UpstreamUnavailable(f"Yandex Vision: {str(e)}") from e
+
+async def _recognize_shared(image_data: bytes, phash: Optional[int], auth_header: dict,
+                            semaphore: asyncio.Semaphore) -> str:
+    """Распознаёт фото, присоединяясь к уже идущему распознаванию того же файла."""
+    return await recognition_flight.do(
+        image_key(image_data),
+        lambda _: _recognize_cached(image_data, phash, auth_header, semaphore)
+    )
+
+async def _recognize_cached(image_data: bytes, phash: Optional[int], auth_header: dict,
+                            semaphore: asyncio.Semaphore) -> str:
+    """Текст фото из кэша диагностики (та же копия или похожая по dHash) или от Yandex Vision."""
+    key = recognition_key(image_data)
+    cached = await diagnostic_cache.get(key)
+    if not cached and phash is not None:
+        cached = await diagnostic_cache.find_similar(phash)
+    if cached:
+        logger.info("Текст фото взят из кэша диагностики")
+        return cached
+    text = await _recognize_image(image_data, auth_header, semaphore)
+    await diagnostic_cache.set(key, text, phash)
+    return text
+
+async def analyze_images(image_data_list: list, user_comment: str, on_partial: Optional[PartialCallback] = None,
+                         phashes: Optional[List[Optional[int]]] = None) -> str:
+    """Анализирует изображения с помощью Yandex Vision и комментарий с помощью Yandex GPT.
+
+    Текст с фото кэшируется по каждому фото вместе с его перцептивным хешем, и похожие фото Vision
+    повторно не распознаёт; анализ GPT выполняется для текущего описания и кэшируется только
+    по точному совпадению фото и описания.
+    Фото, которые не удалось распознать, пропускаются; если недоступен GPT, выбрасывается UpstreamUnavailable.
+    """
+    return await vision_flight.do(
+        images_key(image_data_list, user_comment),
+        lambda publish: _analyze_images(image_data_list, user_comment, publish if on_partial else None, phashes),
+        on_partial
+    )
+
+def _safe_dhash(image_data: bytes) -> Optional[int]:
+    # Неразборчивое фото ищется в кэше только по точной копии, распознавание всё равно выполняется
+    try:
+        return dhash(image_data)
+    except Exception as e:
+        logger.warning(f"Не удалось вычислить dHash фото: {str(e)}")
+        return None
+
+async def _analyze_images(image_data_list: list, user_comment: str, on_partial: Optional[PartialCallback],
+                          phashes: Optional[List[Optional[int]]]) -> str:
+    """Выполняет анализ один раз на группу одинаковых запросов и наполняет кэш."""
+    cache_key = images_key(image_data_list, user_comment)
+    cached = await diagnostic_cache.get(cache_key)
+    if cached:
+        logger.info("Анализ фото с тем же описанием взят из кэша диагностики")
+        return cached
+    phashes = [
+        phash if phash is not None else await asyncio.to_thread(_safe_dhash, image_data)
+        for image_data, phash in zip(image_data_list, phashes or [None] * len(image_data_list))
+    ]
+    result, complete = await _run_analysis(image_data_list, user_comment, on_partial, phashes)
+    if complete:
+        # Результат без текста части фото не кэшируется, чтобы следующий запрос распознал их заново
+        await diagnostic_cache.set(cache_key, result)
+    return result
+
+async def _run_analysis(image_data_list: list, user_comment: str, on_partial: Optional[PartialCallback],
+                        phashes: List[Optional[int]]) -> Tuple[str, bool]:
+    """Распознаёт текст на фото и передаёт его вместе с комментарием в Yandex GPT.
+
+    Возвращает результат и признак того, что распознаны все фото.
+    """
     if not YANDEX_API_KEY or not YANDEX_FOLDER_ID:
         logger.error("YANDEX_API_KEY or YANDEX_FOLDER_ID is missing")
-        return await analyze_with_gpt_only(user_comment, "Ошибка: Yandex ключи не настроены.")
+        raise UpstreamUnavailable("Yandex ключи не настроены")
 
     # Шаг 1: Извлечение текста с изображений через Yandex Vision
-    text_results = []
     auth_header = {
         "Authorization": f"Api-Key {YANDEX_API_KEY.strip()}",
         "x-folder-id": YANDEX_FOLDER_ID,
         "Content-Type": "application/json"
     }
     logger.info(f"Использование ключа API Yandex: {YANDEX_API_KEY[:4]}...{YANDEX_API_KEY[-4:]}")
-    for image_data in image_data_list:
-        try:
-            logger.info("Обработка изображения с API Yandex Vision")
-            image_base64 = base64.b64encode(image_data).decode('utf-8')
-            request_body = {
-                "folderId": YANDEX_FOLDER_ID,
-                "analyze_specs": [
-                    {
-                        "content": image_base64,
-                        "features": [
-                            {
-                                "type": "TEXT_DETECTION",
-                                "text_detection_config": {
-                                    "language_codes": ["en", "ru"]
-                                }
-                            }
-                        ]
-                    }
-                ]
-            }
-            logger.debug(f"Vision API -запрос тела: {json.dumps(request_body)[:200]}...")
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    "https://vision.api.cloud.yandex.net/vision/v1/batchAnalyze",
-                    headers=auth_header,
-                    json=request_body
-                )
-                logger.debug(f"Статус ответа API Vision: {response.status_code}")
-                if response.status_code == 200:
-                    result = response.json()
-                    logger.debug(f"Ответ API Vision: {json.dumps(result)[:200]}...")
-                    text = ""
-                    for spec in result.get("results", [])[0].get("results", []):
-                        for block in spec.get("textDetection", {}).get("pages", [])[0].get("blocks", []):
-                            for line in block.get("lines", []):
-                                text += " ".join([entity["text"] for entity in line["words"]]) + " "
-                    if text.strip():
-                        text_results.append(text.strip())
-                        logger.info(f"Обнаруженный текст: {text[:100]}")
-                    else:
-                        logger.info("Нет текста, обнаруженного на изображении")
-                        text_results.append("Текст не распознан")
-                else:
-                    logger.error(f"Ошибка API API Yandex Vision: {response.status_code} - {response.text}")
-                    text_results.append(f"Ошибка Vision API: {response.status_code} - {response.text}")
-        except Exception as e:
-            logger.error(f"Ошибка обработки изображения: {str(e)}")
-            text_results.append(f"Ошибка обработки изображения: {str(e)}")
+    # Изображения распознаются параллельно, не более VISION_MAX_CONCURRENCY запросов одновременно
+    semaphore = asyncio.Semaphore(VISION_MAX_CONCURRENCY)
+    results = await asyncio.gather(
+        *(_recognize_shared(image_data, phash, auth_header, semaphore)
+          for image_data, phash in zip(image_data_list, phashes)),
+        return_exceptions=True
+    )
+    text_results = [result for result in results if isinstance(result, str)]
+    complete = len(text_results) == len(results)
+    if not complete:
+        logger.warning(f"Не распознано фото: {len(results) - len(text_results)} из {len(results)}")
 
     # Объединяем текст с изображений
     extracted_text = " ".join(text_results)[:200] if text_results else "Текст на изображениях не распознан"
 
     # Шаг 2: Анализ текста с изображений и комментария через Yandex GPT
-    return await analyze_with_gpt_only(user_comment, extracted_text)
+    return await analyze_with_gpt_only(user_comment, extracted_text, on_partial), complete
 
-async def analyze_with_gpt_only(user_comment: str, extracted_text: str) -> str:
-    """Анализирует комментарий и извлечённый текст через Yandex GPT."""
+async def analyze_with_gpt_only(user_comment: str, extracted_text: str,
+                                on_partial: Optional[PartialCallback] = None) -> str:
+    """Анализирует комментарий и извлечённый текст через Yandex GPT; при ошибке выбрасывает UpstreamUnavailable."""
     try:
         if not YANDEX_API_KEY or not YANDEX_FOLDER_ID:
             logger.error("Yandex_api_key или yandex_folder_id отсутствует")
-            return f"Распознанное фото: {extracted_text}\nАнализ недоступен: Yandex ключи не настроены."
+            raise UpstreamUnavailable("Yandex ключи не настроены")
         logger.info("Отправка извлеченного текста и комментария пользователя в Yandex GPT")
         auth_header = {
             "Authorization": f"Api-Key {YANDEX_API_KEY.strip()}",
@@ -92,33 +191,33 @@ async def analyze_with_gpt_only(user_comment: str, extracted_text: str) -> str:
             f"Текст с изображений: {extracted_text}\n"
             f"Комментарий пользователя: {user_comment if user_comment else 'Нет комментария'}"
         )
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                "https://llm.api.cloud.yandex.net/foundationModels/v1/completion",
-                headers=auth_header,
-                json={
-                    "modelUri": f"gpt://{YANDEX_FOLDER_ID}/yandexgpt",
-                    "completionOptions": {
-                        "stream": False,
-                        "temperature": 0.6,
-                        "maxTokens": 500
-                    },
-                    "messages": [
-                        {
-                            "role": "user",
-                            "text": prompt
-                        }
-                    ]
-                }
-            )
-            if response.status_code == 200:
-                gpt_result = response.json()["result"]["alternatives"][0]["message"]["text"]
-                logger.info(f"Yandex GPT response: {gpt_result[:100]}")
-                combined_result = f"Распознанное фото: {extracted_text}\nАнализ: {gpt_result}"
-                return combined_result[:700]
-            else:
-                logger.error(f"Yandex GPT API error: {response.status_code} - {response.text}")
-                return f"Распознанное фото: {extracted_text}\nАнализ недоступен (ошибка {response.status_code})"
+        status_code, gpt_result = await post_completion(
+            headers=auth_header,
+            body={
+                "modelUri": f"gpt://{YANDEX_FOLDER_ID}/yandexgpt",
+                "completionOptions": {
+                    "stream": False,
+                    "temperature": 0.6,
+                    "maxTokens": 500
+                },
+                "messages": [
+                    {
+                        "role": "user",
+                        "text": prompt
+                    }
+                ]
+            },
+            on_partial=on_partial
+        )
+        if status_code == 200:
+            logger.info(f"Yandex GPT response: {gpt_result[:100]}")
+            combined_result = f"Распознанное фото: {extracted_text}\nАнализ: {gpt_result}"
+            return combined_result[:700]
+        else:
+            logger.error(f"Yandex GPT API error: {status_code} - {gpt_result}")
+            raise UpstreamUnavailable(f"Yandex GPT: HTTP {status_code}")
+    except UpstreamUnavailable:
+        raise
     except Exception as e:
         logger.error(f"Ошибка Yandex GPT API: {str(e)}")
-        return f"Распознанное фото: {extracted_text}\nАнализ недоступен: {str(e)}"
\ No newline at end of file
+        raise UpstreamUnavailable(f"Yandex GPT: {str(e)}") from e
\ No newline at end of file
@@ -0,0 +1,154 @@
+import asyncio
+import signal
+import time
+from collections import deque
+from typing import Any, Dict, Tuple
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.methods import TelegramMethod
+from aiogram.types import Update
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler
+from config import (WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_SECRET, WEBHOOK_MAX_CONNECTIONS,
+                    WEBHOOK_REPLY_TIMEOUT, WEBHOOK_DRAIN_TIMEOUT)
+from middlewares import WebhookReplyMiddleware, webhook_reply
+from utils import setup_logger
+
+logger = setup_logger(__name__)
+
+class WebhookRequestHandler(SimpleRequestHandler):
+    """Принимает апдейты от Telegram, обрабатывает их в фоне и возвращает ответ на callback в теле ответа.
+
+    Telegram получает ответ, как только обработчик ответил на callback или закончил работу, но не позже
+    reply_timeout секунд; обработка при этом продолжается. Во время остановки новые апдейты получают 503,
+    и Telegram повторит их позже.
+    """
+
+    def __init__(self, dispatcher: Dispatcher, bot: Bot, secret_token: str = WEBHOOK_SECRET,
+                 reply_timeout: float = WEBHOOK_REPLY_TIMEOUT, drain_timeout: float = WEBHOOK_DRAIN_TIMEOUT):
+        super().__init__(dispatcher, bot, handle_in_background=False, secret_token=secret_token)
+        self.reply_timeout = reply_timeout
+        self.drain_timeout = drain_timeout
+        self.draining = False
+        self.updates = 0
+        self.inline_replies = 0
+        self.unauthorized = 0
+        self.refused = 0
+        self._response_times = deque(maxlen=1000)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if not self.verify_secret(request.headers.get("X-Telegram-Bot-Api-Secret-Token", ""), self.bot):
+            self.unauthorized += 1
+            logger.warning(f"Запрос к вебхуку с неверным секретом от {request.remote}")
+            return web.Response(body="Unauthorized", status=401)
+        if self.draining:
+            self.refused += 1
+            return web.Response(body="Shutting down", status=503)
+        return await self._handle_request(self.bot, request)
+
+    __call__ = handle
+
+    async def _handle_request(self, bot: Bot, request: web.Request) -> web.Response:
+        started = time.perf_counter()
+        update = Update.model_validate(await request.json(loads=bot.session.json_loads), context={"bot": bot})
+        self.updates += 1
+        reply = asyncio.get_running_loop().create_future()
+        # Задача копирует контекст, поэтому WebhookReplyMiddleware видит future своего апдейта
+        token = webhook_reply.set(reply)
+        try:
+            task = asyncio.create_task(self._process_update(bot, update, reply))
+        finally:
+            webhook_reply.reset(token)
+        self._background_feed_update_tasks.add(task)
+        task.add_done_callback(self._background_feed_update_tasks.discard)
+        await asyncio.wait({task, reply}, timeout=self.reply_timeout, return_when=asyncio.FIRST_COMPLETED)
+        method = None
+        if reply.done():
+            method = reply.result()
+        else:
+            # Дальше обработчик отвечает обычными запросами к Bot API
+            reply.cancel()
+        if method is not None:
+            self.inline_replies += 1
+        self._response_times.append(time.perf_counter() - started)
+        return web.Response(body=self._build_response_writer(bot=bot, result=method))
+
+    async def _process_update(self, bot: Bot, update: Update, reply: asyncio.Future):
+        try:
+            result = await self.dispatcher.feed_update(bot, update, **self.data)
+        except Exception as e:
+            logger.error(f"Ошибка обработки апдейта {update.update_id}: {str(e)}")
+            return
+        if not isinstance(result, TelegramMethod):
+            return
+        if reply.done():
+            await self.dispatcher.silent_call_request(bot=bot, result=result)
+        else:
+            reply.set_result(result)
+
+    async def drain(self) -> int:
+        """Перестаёт принимать апдейты и ждёт обработки принятых; возвращает число недождавшихся."""
+        self.draining = True
+        tasks = set(self._background_feed_update_tasks)
+        if not tasks:
+            return 0
+        logger.info(f"Ожидание обработки {len(tasks)} апдейтов перед остановкой")
+        _, pending = await asyncio.wait(tasks, timeout=self.drain_timeout)
+        if pending:
+            logger.warning(f"Не дождались обработки {len(pending)} апдейтов за {self.drain_timeout:.0f} с")
+        return len(pending)
+
+    def get_stats(self) -> dict:
+        """Принятые апдейты, ответы в теле вебхука, отказы и время ответа Telegram."""
+        times = sorted(self._response_times)
+        return {
+            "updates": self.updates,
+            "in_progress": len(self._background_feed_update_tasks),
+            "inline_replies": self.inline_replies,
+            "unauthorized": self.unauthorized,
+            "refused": self.refused,
+            "response_avg_ms": round(sum(times) / len(times) * 1000, 1) if times else 0,
+            "response_p95_ms": round(times[int(len(times) * 0.95)] * 1000, 1) if times else 0,
+        }
+
+def create_webhook_app(dispatcher: Dispatcher, bot: Bot, **options: Any) -> Tuple[web.Application, WebhookRequestHandler]:
+    """Создаёт aiohttp-приложение с обработчиком вебхука на WEBHOOK_PATH."""
+    bot.session.middleware(WebhookReplyMiddleware())
+    handler = WebhookRequestHandler(dispatcher, bot, **options)
+    app = web.Application()
+    handler.register(app, path=WEBHOOK_PATH)
+    return app, handler
+
+async def run_webhook(dispatcher: Dispatcher, bot: Bot):
+    """Принимает апдейты через вебхук до SIGINT/SIGTERM, затем дожидается принятых и останавливает бота."""
+    app, handler = create_webhook_app(dispatcher, bot)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    workflow_data: Dict[str, Any] = {"dispatcher": dispatcher, "bots": [bot], **dispatcher.workflow_data, "bot": bot}
+    await dispatcher.emit_startup(**workflow_data)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            # Windows: остановка по Ctrl+C через KeyboardInterrupt
+            pass
+    try:
+        await web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT).start()
+        logger.info(f"Вебхук слушает {WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+        if WEBHOOK_URL:
+            await bot.set_webhook(
+                f"{WEBHOOK_URL.rstrip('/')}{WEBHOOK_PATH}",
+                secret_token=WEBHOOK_SECRET,
+                allowed_updates=dispatcher.resolve_used_update_types(),
+                max_connections=WEBHOOK_MAX_CONNECTIONS
+            )
+            logger.info(f"Вебхук зарегистрирован: {WEBHOOK_URL.rstrip('/')}{WEBHOOK_PATH}")
+        else:
+            logger.warning("WEBHOOK_URL не задан, вебхук в Telegram не регистрируется")
+        await stop.wait()
+    finally:
+        logger.info("Остановка вебхука")
+        await handler.drain()
+        await dispatcher.emit_shutdown(**workflow_data)
+        await runner.cleanup()